@@ -0,0 +1,57 @@
+"""
+Asyncio engine shared by the scenario scripts
+Probes every node concurrently and keeps many requests in flight per client
+"""
+
+import asyncio
+import time
+import redis.asyncio as aioredis
+
+ASYNC_CONCURRENCY = 16  # In-flight requests (pipelines) per scenario phase
+
+async def connect_redis_async(host, port, name, **kwargs):
+    """Connect to Redis instance using redis.asyncio"""
+    kwargs.setdefault('decode_responses', True)
+    try:
+        client = aioredis.Redis(host=host, port=port, **kwargs)
+        await client.ping()
+        print(f"✓ Connected to {name} at {host}:{port} (async)")
+        return client
+    except Exception as e:
+        print(f"✗ Failed to connect to {name}: {e}")
+        return None
+
+async def snapshot(calls):
+    """Await one coroutine per node concurrently, return ({name: result}, spread_ms)"""
+    async def timed(name, coro):
+        try:
+            result = await coro
+        except Exception as e:
+            result = e
+        return name, result, time.perf_counter_ns()
+    
+    done = await asyncio.gather(*(timed(name, coro) for name, coro in calls.items()))
+    results = {name: result for name, result, _ in done}
+    finished = [finished_ns for _, _, finished_ns in done]
+    # How far apart the node replies arrived, i.e. how "simultaneous" the snapshot is
+    spread_ms = (max(finished) - min(finished)) / 1_000_000 if finished else 0.0
+    return results, spread_ms
+
+async def run_bounded(jobs, concurrency=ASYNC_CONCURRENCY):
+    """Run coroutine factories with at most `concurrency` in flight, results in job order"""
+    # Workers pull lazily from the iterator so millions of jobs never exist at once
+    pending = enumerate(jobs)
+    results = {}
+    
+    async def worker():
+        for index, job in pending:
+            results[index] = await job()
+    
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return [results[index] for index in range(len(results))]
+
+async def close_all(clients):
+    """Close every async client that was opened"""
+    for client in clients:
+        if client is not None:
+            await client.aclose()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Multi-process load generator for Redis Cluster
+Each worker process owns its own RedisCluster client and a disjoint key
+partition, and streams counters plus latency histogram deltas back to the
+parent. Running it for several worker counts gives a throughput-vs-workers
+scaling curve that is not capped by one client's GIL.
+"""
+
+import multiprocessing as mp
+import queue
+import time
+from redis.cluster import RedisCluster
+from latency_histogram import LatencyHistogram, format_summary
+from payload import DEFAULT_VALUE_SIZE, PayloadGenerator
+
+WORKER_COUNTS = [1, 2, 4, 8]
+LOAD_KEYS = 100000  # Keys written per scaling point, split across the workers
+LOAD_BATCH_SIZE = 1  # 1 sends single SETs, larger values use cluster pipelines
+REPORT_INTERVAL = 1.0  # seconds between worker progress messages
+START_TIMEOUT = 30  # seconds to wait for every worker to connect
+LOAD_VALUE_SIZE = DEFAULT_VALUE_SIZE  # Bytes per value
+
+def load_worker(worker_id, num_workers, num_keys, nodes, batch_size, key_prefix, results, go):
+    """Worker process: write keys worker_id, worker_id + num_workers, ... and stream progress"""
+    try:
+        cluster = RedisCluster(
+            host=nodes[0]['host'], port=nodes[0]['port'],
+            decode_responses=True, socket_timeout=30
+        )
+    except Exception as e:
+        results.put({'worker': worker_id, 'type': 'failed', 'error': str(e)})
+        return
+    
+    results.put({'worker': worker_id, 'type': 'ready'})
+    go.wait()
+    
+    indexes = range(worker_id, num_keys, num_workers)
+    # A pipeline holds at most batch_size values, so that many buffers are enough
+    payload = PayloadGenerator(LOAD_VALUE_SIZE, ring=batch_size)
+    ops = errors = 0
+    histogram = LatencyHistogram()  # delta since the last progress message
+    last_report = time.perf_counter()
+    
+    def report(kind):
+        nonlocal histogram, ops, errors
+        results.put({
+            'worker': worker_id, 'type': kind,
+            'ops': ops, 'errors': errors, 'histogram': histogram.to_dict()
+        })
+        histogram = LatencyHistogram()
+        ops = errors = 0
+    
+    for start in range(0, len(indexes), batch_size):
+        chunk = indexes[start:start + batch_size]
+        op_start = time.perf_counter_ns()
+        try:
+            if batch_size == 1:
+                i = chunk[0]
+                cluster.set(f"{key_prefix}{i}", payload.buffer(i))
+            else:
+                pipe = cluster.pipeline()
+                for i in chunk:
+                    pipe.set(f"{key_prefix}{i}", payload.buffer(i))
+                pipe.execute()
+            ops += len(chunk)
+        except Exception:
+            errors += len(chunk)
+        histogram.record_ns(time.perf_counter_ns() - op_start)
+        
+        if time.perf_counter() - last_report >= REPORT_INTERVAL:
+            report('progress')
+            last_report = time.perf_counter()
+    
+    report('done')
+    cluster.close()
+
+def stop_workers(workers, go):
+    """Release workers waiting on the start event, then terminate and reap them"""
+    go.set()
+    for worker in workers:
+        worker.terminate()
+    for worker in workers:
+        worker.join(timeout=5)
+
+def run_load(num_workers, nodes, num_keys=LOAD_KEYS, batch_size=LOAD_BATCH_SIZE, key_prefix='key'):
+    """Run one load point with num_workers processes, return aggregated throughput and latency"""
+    ctx = mp.get_context('spawn')
+    results = ctx.Queue()
+    go = ctx.Event()
+    workers = [
+        ctx.Process(
+            target=load_worker,
+            args=(worker_id, num_workers, num_keys, nodes, batch_size, key_prefix, results, go),
+            daemon=True
+        )
+        for worker_id in range(num_workers)
+    ]
+    for worker in workers:
+        worker.start()
+    
+    # Start the clock only once every worker has its cluster client
+    ready = set()
+    while len(ready) < num_workers:
+        try:
+            message = results.get(timeout=START_TIMEOUT)
+        except queue.Empty:
+            stop_workers(workers, go)
+            missing = sorted(set(range(num_workers)) - ready)
+            raise TimeoutError(f"Workers {missing} did not start within {START_TIMEOUT}s")
+        if message['type'] == 'failed':
+            stop_workers(workers, go)
+            raise ConnectionError(f"Worker {message['worker']} could not connect: {message['error']}")
+        ready.add(message['worker'])
+    
+    histogram = LatencyHistogram()
+    ops = errors = 0
+    timeline = []
+    done = 0
+    start = time.perf_counter()
+    go.set()
+    
+    while done < num_workers:
+        try:
+            message = results.get(timeout=REPORT_INTERVAL)
+        except queue.Empty:
+            if not any(worker.is_alive() for worker in workers):
+                break
+            continue
+        
+        ops += message['ops']
+        errors += message['errors']
+        histogram.merge(LatencyHistogram.from_dict(message['histogram']))
+        if message['type'] == 'done':
+            done += 1
+        
+        elapsed = time.perf_counter() - start
+        if not timeline or elapsed - timeline[-1]['elapsed_sec'] >= REPORT_INTERVAL:
+            timeline.append({'elapsed_sec': round(elapsed, 3), 'ops': ops, 'errors': errors})
+            print(f"    [{elapsed:6.1f}s] {ops:8d} ops ({ops/elapsed:,.0f} ops/sec)")
+    
+    duration = time.perf_counter() - start
+    for worker in workers:
+        worker.join(timeout=5)
+    
+    return {
+        'workers': num_workers,
+        'finished_workers': done,
+        'ops': ops,
+        'errors': errors,
+        'duration': duration,
+        'ops_per_sec': ops / duration if duration else 0.0,
+        'latency': histogram.summary(),
+        'timeline': timeline
+    }
+
+def scaling_curve(nodes, worker_counts=WORKER_COUNTS, num_keys=LOAD_KEYS, batch_size=LOAD_BATCH_SIZE):
+    """Run run_load() for each worker count, adding speedup and efficiency vs the first point"""
+    curve = []
+    for num_workers in worker_counts:
+        print(f"\n  {num_workers} worker(s), {num_keys} keys, batch size {batch_size}:")
+        point = run_load(num_workers, nodes, num_keys, batch_size)
+        baseline = curve[0] if curve else point
+        per_worker_baseline = baseline['ops_per_sec'] / baseline['workers']
+        point['speedup'] = point['ops_per_sec'] / baseline['ops_per_sec'] if baseline['ops_per_sec'] else 0.0
+        point['efficiency'] = point['ops_per_sec'] / (per_worker_baseline * num_workers) if per_worker_baseline else 0.0
+        curve.append(point)
+    return curve
+
+def print_scaling_curve(curve):
+    """Table of throughput, speedup, efficiency and tail latency per worker count"""
+    print(f"\n{'Workers':>8s} {'Ops/sec':>12s} {'Speedup':>8s} {'Effic.':>7s} {'Errors':>7s}  Latency")
+    for point in curve:
+        print(
+            f"{point['workers']:8d} {point['ops_per_sec']:12,.0f} {point['speedup']:7.2f}x "
+            f"{point['efficiency']*100:6.1f}% {point['errors']:7d}  {format_summary(point['latency'])}"
+        )
+
+if __name__ == "__main__":
+    from scenario3_cluster_sharding import CLUSTER_NODES
+    print_scaling_curve(scaling_curve(CLUSTER_NODES))
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+Run comparison over scenario result files
+Loads many scenarioN_results_*.jsonl (or legacy .json) files, reading only
+the final result record of each, groups runs by scenario and config, and
+reports the median of every metric with a distribution-free confidence
+interval. With a baseline and a candidate set, a Mann-Whitney U test flags
+significant regressions and improvements per metric.
+    
+    python compare_results.py scenario1_results_*.jsonl
+    python compare_results.py --baseline before/*.jsonl --candidate after/*.jsonl
+"""
+
+import argparse
+import json
+import math
+import sys
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from result_sink import load_result
+
+CONFIDENCE = 0.95
+ALPHA = 0.05  # Mann-Whitney significance level
+MIN_CHANGE = 0.05  # ...and the median must move by at least 5% to count as a regression
+EXACT_U_MAX_CELLS = 2500  # exact U distribution up to n1 * n2 cells (no ties), normal approximation above
+LOAD_THREADS = 8
+
+# Measurements scenario 1 keeps in its config; they differ every run and must not split groups
+NON_CONFIG_KEYS = {'write_duration', 'read_duration'}
+
+def _get(data, *path):
+    """Value at a nested key path, None if any level is missing"""
+    for key in path:
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    return data
+
+# Metric extractors: yield (metric, value, higher_is_better) from one result record
+
+def replication_metrics(result):
+    """Scenario 1: write rate, p99 and convergence per batch size and WAIT setting"""
+    for run in result.get('batch_size_results') or []:
+        tag = f"[batch={run['batch_size']}]"
+        yield f"writes_per_sec{tag}", run.get('writes_per_sec'), True
+        yield f"write_p99_ms{tag}", _get(run, 'latency', 'write', 'p99_ms'), False
+        converged = list((run.get('time_to_convergence_ms') or {}).values())
+        if converged and None not in converged:
+            yield f"convergence_ms{tag}", max(converged), False
+        immediate = run.get('immediate_results') or {}
+        yield f"immediate_missing{tag}", sum(replica.get('missing', 0) for replica in immediate.values()), False
+    for run in result.get('wait_sweep') or []:
+        tag = f"[wait={run['numreplicas']},batch={run['batch_size']}]"
+        yield f"writes_per_sec{tag}", run.get('writes_per_sec'), True
+        yield f"write_p99_ms{tag}", _get(run, 'latency', 'p99_ms'), False
+        yield f"immediate_missing{tag}", run.get('immediate_missing'), False
+    yield from payload_metrics(result)
+
+def failover_metrics(result):
+    """Scenario 2: failover duration, write unavailability and lost writes"""
+    completed = [event for event in result.get('failover_events') or [] if 'duration_milliseconds' in event]
+    if completed:
+        yield 'failover_ms', completed[0]['duration_milliseconds'], False
+    availability = result.get('write_availability') or {}
+    yield 'unavailability_ms', availability.get('unavailability_ms'), False
+    yield 'write_error_rate', availability.get('error_rate'), False
+    yield 'lost_acknowledged_writes', availability.get('lost_acknowledged_writes'), False
+    yield 'write_p99_ms', _get(result, 'latency', 'write', 'p99_ms'), False
+
+def sharding_metrics(result):
+    """Scenario 3: read/write rates, read routing policies and the skewed workload"""
+    yield 'write_keys_per_sec', _get(result, 'write_stats', 'keys_per_sec'), True
+    yield 'write_p99_ms', _get(result, 'write_stats', 'latency', 'p99_ms'), False
+    yield 'read_keys_per_sec', _get(result, 'read_stats', 'keys_per_sec'), True
+    yield 'read_p99_ms', _get(result, 'read_stats', 'latency', 'p99_ms'), False
+    for policy, routing in (result.get('read_routing') or {}).items():
+        yield f"reads_per_sec[{policy}]", routing.get('reads_per_sec'), True
+        yield f"stale_rate[{policy}]", _get(routing, 'stale', 'stale_rate'), False
+    yield 'skewed_ops_per_sec', _get(result, 'skewed_workload', 'run', 'ops_per_sec'), True
+    yield from payload_metrics(result)
+
+def resharding_metrics(result):
+    """Scenario 4: per-phase rate and p99, migration and cache recovery time"""
+    for phase, stats in (result.get('phases') or {}).items():
+        yield f"ops_per_sec[{phase}]", stats.get('ops_per_sec'), True
+        yield f"p99_ms[{phase}]", _get(stats, 'latency', 'p99_ms'), False
+    yield 'migration_seconds', _get(result, 'migration', 'duration'), False
+    yield 'cache_recovery_seconds', result.get('cache_recovery_seconds'), False
+
+def resync_metrics(result):
+    """Scenario 5: reconnect, catch-up and throughput dip per backlog and outage"""
+    for run in result.get('runs') or []:
+        tag = f"[backlog={run['backlog_size']},outage={run['outage_seconds']:g}]"
+        yield f"reconnect_ms{tag}", run.get('reconnect_ms'), False
+        yield f"catch_up_ms{tag}", run.get('catch_up_ms'), False
+        yield f"throughput_dip{tag}", run.get('throughput_dip'), False
+
+def payload_metrics(result):
+    """MB/sec per value size of a payload sweep"""
+    for size in _get(result, 'payload_sweep', 'sizes') or []:
+        yield f"payload_mb_per_sec[{size['size']}]", size.get('mb_per_sec'), True
+
+SCENARIO_METRICS = {
+    'Replication Lag & Consistency': replication_metrics,
+    'Redis Sentinel Failover': failover_metrics,
+    'Redis Cluster Sharding': sharding_metrics,
+    'Redis Cluster Resharding': resharding_metrics,
+    'Replica Resync': resync_metrics
+}
+
+# Loading
+
+def load_runs(paths, threads=LOAD_THREADS):
+    """[(path, result)] for every file with a result record; reads only the end of each .jsonl"""
+    def load(path):
+        try:
+            return path, load_result(path)
+        except (OSError, ValueError) as e:
+            print(f"⚠ Skipping {path}: {e}", file=sys.stderr)
+            return path, None
+    
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        loaded = list(executor.map(load, paths))
+    runs = []
+    for path, result in loaded:
+        if result is None:
+            print(f"⚠ Skipping {path}: no result record (run crashed or still running)", file=sys.stderr)
+        elif result.get('scenario') not in SCENARIO_METRICS:
+            print(f"⚠ Skipping {path}: unknown scenario {result.get('scenario')!r}", file=sys.stderr)
+        else:
+            runs.append((path, result))
+    return runs
+
+def config_key(result):
+    """Canonical JSON of the run's config, runs with equal keys are repeats of each other"""
+    config = {key: value for key, value in (result.get('config') or {}).items() if key not in NON_CONFIG_KEYS}
+    return json.dumps(config, sort_keys=True, default=str)
+
+def collect_metrics(runs):
+    """{metric: ([values...], higher_is_better)} over runs of one scenario"""
+    metrics = {}
+    for _, result in runs:
+        for metric, value, higher in SCENARIO_METRICS[result['scenario']](result):
+            if isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value):
+                metrics.setdefault(metric, ([], higher))[0].append(float(value))
+    return metrics
+
+# Statistics
+
+def median(values):
+    """Median of a non-empty sequence, the mean of the middle two for even lengths"""
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    return ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2
+
+def median_ci(values, confidence=CONFIDENCE):
+    """(low, high, coverage): order-statistic interval for the median, no distribution assumed
+    
+    With few runs no interval reaches the requested confidence; the widest
+    one (min..max) is returned with the coverage it actually has.
+    """
+    ordered = sorted(values)
+    n = len(ordered)
+    if n == 1:
+        return ordered[0], ordered[0], 0.0
+    # P(Binomial(n, 0.5) < k) for k = 0..n
+    below = [0.0]
+    for k in range(n):
+        below.append(below[-1] + math.comb(n, k) / 2 ** n)
+    # Interval [x(k), x(n-k+1)] (1-based) covers the median with probability 1 - 2 P(X < k),
+    # take the narrowest one that still reaches the confidence, min..max if none does
+    k = 1
+    for candidate in range(1, n // 2 + 1):
+        if below[candidate] <= (1 - confidence) / 2:
+            k = candidate
+    return ordered[k - 1], ordered[n - k], 1 - 2 * below[k]
+
+def _u_exact_distribution(n1, n2):
+    """Number of rank orderings giving each U value, for samples of n1 and n2 without ties"""
+    # counts[i][j] is the distribution for sizes (i, j), built up one observation at a time
+    previous = [[1] for _ in range(n2 + 1)]  # i = 0: U is always 0
+    for i in range(1, n1 + 1):
+        current = [[1]]  # j = 0: U is always 0
+        for j in range(1, n2 + 1):
+            # The largest observation is from sample 1 (adds j to U) or from sample 2
+            with_first = [0] * j + previous[j]
+            without = current[j - 1]
+            size = max(len(with_first), len(without))
+            current.append([
+                (with_first[u] if u < len(with_first) else 0) + (without[u] if u < len(without) else 0)
+                for u in range(size)
+            ])
+        previous = current
+    return previous[n2]
+
+def mann_whitney(first, second):
+    """Two-sided Mann-Whitney U test, return (U of the first sample, p-value)"""
+    n1, n2 = len(first), len(second)
+    combined = sorted([(value, 0) for value in first] + [(value, 1) for value in second])
+    ranks = [0.0] * len(combined)
+    tie_term = 0.0
+    i = 0
+    while i < len(combined):
+        j = i
+        while j + 1 < len(combined) and combined[j + 1][0] == combined[i][0]:
+            j += 1
+        for position in range(i, j + 1):
+            ranks[position] = (i + j) / 2 + 1  # average rank of the tie group
+        tied = j - i + 1
+        tie_term += tied ** 3 - tied
+        i = j + 1
+    rank_sum = sum(rank for rank, (_, group) in zip(ranks, combined) if group == 0)
+    u = rank_sum - n1 * (n1 + 1) / 2
+    
+    if tie_term == 0 and n1 * n2 <= EXACT_U_MAX_CELLS:
+        counts = _u_exact_distribution(n1, n2)
+        total = sum(counts)
+        extreme = min(u, n1 * n2 - u)
+        p = 2 * sum(counts[:int(extreme) + 1]) / total
+        return u, min(1.0, p)
+    
+    mean = n1 * n2 / 2
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1)))
+    if variance <= 0:
+        return u, 1.0  # every value identical
+    z = (abs(u - mean) - 0.5) / math.sqrt(variance)  # continuity correction
+    return u, min(1.0, math.erfc(max(z, 0.0) / math.sqrt(2)))
+
+def summarize(values):
+    """Median, its confidence interval and the range of one metric's values"""
+    low, high, coverage = median_ci(values)
+    return {
+        'runs': len(values),
+        'median': median(values),
+        'ci_low': low,
+        'ci_high': high,
+        'ci_coverage': coverage,
+        'min': min(values),
+        'max': max(values)
+    }
+
+# Reports
+
+def group_report(runs):
+    """{scenario: [{'config': ..., 'runs': [...], 'metrics': {metric: summary}}]}"""
+    groups = defaultdict(list)
+    for path, result in runs:
+        groups[(result['scenario'], config_key(result))].append((path, result))
+    report = defaultdict(list)
+    for (scenario, config), members in sorted(groups.items()):
+        report[scenario].append({
+            'config': json.loads(config),
+            'runs': [path for path, _ in members],
+            'metrics': {
+                metric: {**summarize(values), 'higher_is_better': higher}
+                for metric, (values, higher) in sorted(collect_metrics(members).items())
+            }
+        })
+    return dict(report)
+
+def compare(baseline_runs, candidate_runs, alpha=ALPHA, min_change=MIN_CHANGE):
+    """Per scenario and metric: both summaries, relative median change, p-value and verdict"""
+    by_scenario = defaultdict(lambda: ([], []))
+    for path, result in baseline_runs:
+        by_scenario[result['scenario']][0].append((path, result))
+    for path, result in candidate_runs:
+        by_scenario[result['scenario']][1].append((path, result))
+    
+    report = {}
+    for scenario, (baseline, candidate) in sorted(by_scenario.items()):
+        if not baseline or not candidate:
+            continue
+        before = collect_metrics(baseline)
+        after = collect_metrics(candidate)
+        config_changes = {}
+        baseline_configs = {config_key(result) for _, result in baseline}
+        candidate_configs = {config_key(result) for _, result in candidate}
+        if len(baseline_configs) == 1 and len(candidate_configs) == 1 and baseline_configs != candidate_configs:
+            old, new = json.loads(baseline_configs.pop()), json.loads(candidate_configs.pop())
+            config_changes = {
+                key: {'baseline': old.get(key), 'candidate': new.get(key)}
+                for key in sorted(set(old) | set(new)) if old.get(key) != new.get(key)
+            }
+        
+        metrics = {}
+        for metric in sorted(set(before) & set(after)):
+            (old_values, higher), (new_values, _) = before[metric], after[metric]
+            old_summary, new_summary = summarize(old_values), summarize(new_values)
+            change = (
+                (new_summary['median'] - old_summary['median']) / abs(old_summary['median'])
+                if old_summary['median'] else None
+            )
+            _, p_value = mann_whitney(old_values, new_values)
+            verdict = 'unchanged'
+            if p_value < alpha and change is not None and abs(change) >= min_change:
+                better = change > 0 if higher else change < 0
+                verdict = 'improved' if better else 'regressed'
+            metrics[metric] = {
+                'baseline': old_summary,
+                'candidate': new_summary,
+                'change': change,
+                'p_value': p_value,
+                'higher_is_better': higher,
+                'verdict': verdict
+            }
+        report[scenario] = {
+            'baseline_runs': len(baseline),
+            'candidate_runs': len(candidate),
+            'config_changes': config_changes,
+            'metrics': metrics
+        }
+    return report
+
+def _fmt(value):
+    """Compact number for the report tables, '-' for None"""
+    if value is None:
+        return '-'
+    if abs(value) >= 1000:
+        return f"{value:.0f}"
+    return f"{value:.4g}"
+
+def print_group_report(report):
+    """Table of every metric's median and interval per scenario and config group"""
+    for scenario, groups in report.items():
+        print("\n" + "="*70)
+        print(f"{scenario}: {sum(len(group['runs']) for group in groups)} runs in {len(groups)} config groups")
+        print("="*70)
+        for i, group in enumerate(groups, 1):
+            print(f"\nGroup {i}: {len(group['runs'])} runs")
+            if len(groups) > 1:
+                # Only what distinguishes this group from the others
+                varying = {
+                    key for key in group['config']
+                    if any(other['config'].get(key) != group['config'][key] for other in groups)
+                }
+                for key in sorted(varying):
+                    print(f"  {key} = {group['config'][key]}")
+            print(f"  {'Metric':<42} {'Median':>10} {'CI low':>10} {'CI high':>10} {'Cover':>6} {'Runs':>5}")
+            for metric, summary in group['metrics'].items():
+                print(
+                    f"  {metric:<42} {_fmt(summary['median']):>10} {_fmt(summary['ci_low']):>10} "
+                    f"{_fmt(summary['ci_high']):>10} {summary['ci_coverage']:6.0%} {summary['runs']:5d}"
+                )
+
+def print_comparison(report):
+    """Table of baseline vs candidate medians with change, p-value and verdict"""
+    marks = {'regressed': '✗ REGRESSED', 'improved': '✓ improved', 'unchanged': ''}
+    for scenario, comparison in report.items():
+        print("\n" + "="*70)
+        print(f"{scenario}: {comparison['baseline_runs']} baseline vs {comparison['candidate_runs']} candidate runs")
+        print("="*70)
+        for key, change in comparison['config_changes'].items():
+            print(f"  config {key}: {change['baseline']} → {change['candidate']}")
+        print(f"\n  {'Metric':<42} {'Baseline':>10} {'Candidate':>10} {'Change':>8} {'p':>7}")
+        for metric, result in comparison['metrics'].items():
+            change = f"{result['change']:+.1%}" if result['change'] is not None else '-'
+            print(
+                f"  {metric:<42} {_fmt(result['baseline']['median']):>10} {_fmt(result['candidate']['median']):>10} "
+                f"{change:>8} {result['p_value']:7.3f}  {marks[result['verdict']]}"
+            )
+
+def parse_args():
+    """Command line options"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('files', nargs='*', help="result files to summarize per scenario and config")
+    parser.add_argument('--baseline', nargs='+', default=[], help="result files of the reference runs")
+    parser.add_argument('--candidate', nargs='+', default=[], help="result files of the runs to check")
+    parser.add_argument('--alpha', type=float, default=ALPHA, help="significance level of the Mann-Whitney test")
+    parser.add_argument('--min-change', type=float, default=MIN_CHANGE, help="smallest relative median change to flag")
+    parser.add_argument('--json', metavar='PATH', help="also write the report as JSON")
+    return parser.parse_args()
+
+def main():
+    """Summarize or compare the given result files, exit 1 on significant regressions"""
+    args = parse_args()
+    if bool(args.baseline) != bool(args.candidate):
+        print("✗ --baseline and --candidate are needed together", file=sys.stderr)
+        return 2
+    if args.baseline:
+        report = compare(load_runs(args.baseline), load_runs(args.candidate), args.alpha, args.min_change)
+        print_comparison(report)
+        regressions = sum(
+            1 for comparison in report.values()
+            for result in comparison['metrics'].values() if result['verdict'] == 'regressed'
+        )
+        print(f"\n{regressions} significant regression(s) (p < {args.alpha:g}, change ≥ {args.min_change:.0%})")
+    elif args.files:
+        report = group_report(load_runs(args.files))
+        print_group_report(report)
+        regressions = 0
+    else:
+        print("✗ No result files given", file=sys.stderr)
+        return 2
+    
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"\n✓ Report saved to {args.json}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,359 @@
+"""
+Failover-aware buffered write path
+Writes go straight to the master while it answers. Once it stops answering
+they queue in a bounded buffer, and a flusher thread retries with a backoff
+that follows the sentinel failover events: short while the outage may be a
+blip, slow while sentinels are failing over, immediate on +switch-master.
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from datetime import datetime
+from latency_histogram import LatencyHistogram, format_summary
+from sentinel_events import SentinelEventWatcher, FAILOVER_CHANNELS
+from sentinel_pool import FAILOVER_ERRORS
+
+BUFFER_CAPACITY = 2000  # Queued writes, e.g. 100 writes/sec for 20 s
+BUFFER_MAX_AGE = 15.0  # seconds a write may wait before it is dropped (down-after 5 s + failover-timeout 10 s)
+OVERFLOW_POLICY = 'drop_oldest'  # 'drop_oldest' keeps the newest writes, 'reject' refuses new ones
+REPLAY_BATCH_SIZE = 100  # Queued writes per pipeline when replaying
+
+BACKOFF_INITIAL = 0.01  # seconds before the first retry
+BACKOFF_MAX = 0.5  # retry interval cap while no sentinel has reported the master down
+FAILOVER_PROBE_INTERVAL = 1.0  # retry interval once sentinels report the master down, +switch-master wakes earlier
+
+SIZING_WINDOW = 5.0  # seconds the buffer should cover: down-after-milliseconds of the docker setup
+
+class BufferedOp:
+    """One queued write and the future its caller holds"""
+    
+    __slots__ = ('seq', 'command', 'submitted_ns', 'future')
+    
+    def __init__(self, seq, command):
+        self.seq = seq
+        self.command = command
+        self.submitted_ns = time.perf_counter_ns()
+        self.future = Future()
+
+class BufferDropped(Exception):
+    """A buffered write was dropped (buffer full or waited longer than the max age)"""
+
+class FailoverWriteBuffer:
+    """Write path that rides through a sentinel failover
+    
+    submit() returns a Future resolved with the command's reply, or with
+    BufferDropped if the write was dropped. Order is preserved: while anything
+    is queued, new writes queue behind it instead of going direct.
+    """
+    
+    def __init__(self, connections, sentinel_hosts, master_name, capacity=BUFFER_CAPACITY,
+                 max_age=BUFFER_MAX_AGE, overflow=OVERFLOW_POLICY, replay_batch_size=REPLAY_BATCH_SIZE):
+        if overflow not in ('drop_oldest', 'reject'):
+            raise ValueError(f"Unknown overflow policy {overflow!r}")
+        self.connections = connections  # SentinelConnectionManager
+        self.capacity = capacity
+        self.max_age_ns = int(max_age * 1_000_000_000)
+        self.overflow = overflow
+        self.replay_batch_size = replay_batch_size
+        
+        self.state = 'direct'  # 'direct' or 'buffering' while the master is unreachable
+        self.failover_in_progress = False  # sentinels reported the master down and no switch yet
+        self.queue = deque()
+        self.high_water_mark = 0
+        self.counts = {'submitted': 0, 'direct': 0, 'replayed': 0, 'failed': 0, 'retries': 0}
+        self.drops = {'overflow': 0, 'expired': 0}
+        self.direct_latency = LatencyHistogram()
+        self.buffered_latency = LatencyHistogram()  # submit -> acknowledged by a master, for queued writes
+        self.outages = []  # one entry per buffering period
+        self.transitions = []  # state changes with the reason
+        
+        self._seq = 0
+        self._backoff = BACKOFF_INITIAL
+        self._start_ns = time.perf_counter_ns()
+        self._switched_to = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        
+        self.watcher = SentinelEventWatcher(sentinel_hosts, master_name, channels=FAILOVER_CHANNELS)
+        for channel in ('+sdown', '+odown', '+try-failover', '+elected-leader'):
+            self.watcher.on(channel, self._on_master_down)
+        self.watcher.on('+switch-master', self._on_switch_master)
+    
+    def start(self):
+        """Subscribe to sentinel events and start the flusher thread"""
+        self.watcher.start()
+        self._thread = threading.Thread(target=self._flush_loop, name='failover-buffer', daemon=True)
+        self._thread.start()
+        return self
+    
+    def set(self, key, value):
+        """SET key to value through the buffer"""
+        return self.submit('SET', key, value)
+    
+    def submit(self, *command):
+        """Send a write now if the master is healthy, otherwise queue it"""
+        with self._lock:
+            self._seq += 1
+            op = BufferedOp(self._seq, command)
+            self.counts['submitted'] += 1
+            direct = self.state == 'direct' and not self.queue
+        
+        if direct:
+            try:
+                reply = self.connections.master().execute_command(*command)
+            except FAILOVER_ERRORS as e:
+                self.connections.invalidate(f"{type(e).__name__}: {e}")
+                with self._lock:
+                    self._enter('buffering', f"{type(e).__name__} on direct write")
+            except Exception as e:
+                with self._lock:
+                    self.counts['failed'] += 1
+                op.future.set_exception(e)
+                return op.future
+            else:
+                self.direct_latency.record_ns(time.perf_counter_ns() - op.submitted_ns)
+                self.counts['direct'] += 1
+                op.future.set_result(reply)
+                return op.future
+        
+        self._enqueue(op)
+        return op.future
+    
+    def _enqueue(self, op):
+        """Queue a write, dropping the oldest one or this one when the buffer is full"""
+        dropped = None
+        with self._lock:
+            # Only the first queued write wakes the flusher, later ones must not cut its backoff short
+            wake = not self.queue
+            if len(self.queue) >= self.capacity:
+                if self.overflow == 'reject':
+                    dropped = op
+                else:
+                    dropped = self.queue.popleft()
+            if dropped is not op:
+                self.queue.append(op)
+            self.high_water_mark = max(self.high_water_mark, len(self.queue))
+            if self.outages:
+                self.outages[-1]['max_depth'] = max(self.outages[-1]['max_depth'], len(self.queue))
+            if dropped is not None:
+                self.drops['overflow'] += 1
+        if dropped is not None:
+            dropped.future.set_exception(BufferDropped(f"buffer full ({self.capacity} writes)"))
+        if wake:
+            self._wake.set()
+    
+    def _enter(self, state, reason):
+        """Switch state (caller holds the lock), opening an outage when leaving 'direct'"""
+        if state == self.state:
+            return
+        offset_ms = self._record(state, reason)
+        if state == 'buffering':
+            self._backoff = BACKOFF_INITIAL
+            self.outages.append({'start_ms': offset_ms, 'end_ms': None, 'duration_ms': None, 'max_depth': len(self.queue)})
+        elif self.outages:
+            outage = self.outages[-1]
+            outage['end_ms'] = offset_ms
+            outage['duration_ms'] = offset_ms - outage['start_ms']
+        self.state = state
+    
+    def _record(self, state, reason):
+        """Log a state change or sentinel event (caller holds the lock), return its offset in ms"""
+        offset_ms = (time.perf_counter_ns() - self._start_ns) / 1_000_000
+        self.transitions.append({
+            'offset_ms': offset_ms,
+            'timestamp': datetime.now().strftime('%H:%M:%S.%f')[:-3],
+            'state': state,
+            'reason': reason
+        })
+        return offset_ms
+    
+    # Sentinel events, called from the watcher's listener threads
+    
+    def _on_master_down(self, event):
+        """Sentinels report the master down, retry at the slow failover interval"""
+        if not event['for_master']:
+            return
+        with self._lock:
+            # Retrying the old master quickly is pointless now, slow down until the switch
+            if not self.failover_in_progress:
+                self.failover_in_progress = True
+                self._record(self.state, f"{event['channel']} from {event['sentinel']}, retrying every {FAILOVER_PROBE_INTERVAL:g}s")
+    
+    def _on_switch_master(self, event):
+        """A new master was promoted, replay the queue against it right away"""
+        if not event['for_master']:
+            return
+        new_master = event['data'].split()[3:5]
+        with self._lock:
+            # Every sentinel announces the switch, the first one triggers the replay
+            if new_master == self._switched_to:
+                return
+            self._switched_to = new_master
+            self.failover_in_progress = False
+            self._backoff = BACKOFF_INITIAL
+            self._record(self.state, f"+switch-master to {':'.join(new_master)}, replaying {len(self.queue)} writes")
+        # The connection manager may not have rebuilt its pool yet, force a fresh lookup
+        self.connections.invalidate(f"+switch-master from {event['sentinel']}")
+        self._wake.set()
+    
+    # Flusher
+    
+    def _retry_delay(self):
+        """Seconds until the next replay attempt (caller holds the lock)"""
+        if self.failover_in_progress:
+            return FAILOVER_PROBE_INTERVAL
+        delay = self._backoff
+        self._backoff = min(self._backoff * 2, BACKOFF_MAX)
+        return delay
+    
+    def _expire(self, now_ns):
+        """Drop queued writes older than max_age (caller holds the lock)"""
+        expired = []
+        while self.queue and now_ns - self.queue[0].submitted_ns > self.max_age_ns:
+            expired.append(self.queue.popleft())
+        self.drops['expired'] += len(expired)
+        return expired
+    
+    def _flush_loop(self):
+        """Replay queued writes in order, backing off while the master is unreachable"""
+        delay = None
+        while not self._stop.is_set():
+            self._wake.wait(delay)
+            self._wake.clear()
+            
+            with self._lock:
+                expired = self._expire(time.perf_counter_ns())
+                batch = list(self.queue)[:self.replay_batch_size]
+            for op in expired:
+                op.future.set_exception(BufferDropped(f"waited longer than {self.max_age_ns / 1e9:g}s"))
+            if not batch:
+                with self._lock:
+                    if not self.queue:
+                        self._enter('direct', 'buffer drained')
+                delay = None
+                continue
+            
+            try:
+                pipe = self.connections.master().pipeline(transaction=False)
+                for op in batch:
+                    pipe.execute_command(*op.command)
+                replies = pipe.execute(raise_on_error=False)
+            except FAILOVER_ERRORS as e:
+                self.connections.invalidate(f"{type(e).__name__}: {e}")
+                replies = []
+            except Exception as e:
+                # Not an outage, retrying would loop forever: fail the batch with the error
+                with self._lock:
+                    self._record(self.state, f"{type(e).__name__} on replay, failing {len(batch)} writes: {e}")
+                replies = [e] * len(batch)
+            
+            # A READONLY reply means the node was demoted, the rest of the batch stays queued
+            done = 0
+            for op, reply in zip(batch, replies):
+                if isinstance(reply, FAILOVER_ERRORS):
+                    break
+                done += 1
+            # Other error replies were answered by a master, they leave the queue as failed writes
+            failed = sum(1 for reply in replies[:done] if isinstance(reply, Exception))
+            now_ns = time.perf_counter_ns()
+            
+            with self._lock:
+                for _ in range(done):
+                    self.queue.popleft()
+                self.counts['replayed'] += done - failed
+                self.counts['failed'] += failed
+                if done < len(batch):
+                    self.counts['retries'] += 1
+                    delay = self._retry_delay()
+                else:
+                    self._backoff = BACKOFF_INITIAL
+                    delay = 0 if self.queue else None
+                    if not self.queue:
+                        self._enter('direct', 'buffer drained')
+            
+            for op, reply in zip(batch[:done], replies):
+                if isinstance(reply, Exception):
+                    op.future.set_exception(reply)
+                else:
+                    self.buffered_latency.record_ns(now_ns - op.submitted_ns)
+                    op.future.set_result(reply)
+    
+    def drain(self, timeout=None):
+        """Wait until the queue is empty, return True if it drained"""
+        deadline = time.perf_counter() + timeout if timeout is not None else None
+        while True:
+            with self._lock:
+                if not self.queue:
+                    return True
+            if deadline is not None and time.perf_counter() >= deadline:
+                return False
+            self._wake.set()
+            time.sleep(0.01)
+    
+    def close(self):
+        """Stop the flusher and the event watcher, failing whatever is still queued"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self.watcher.stop()
+        with self._lock:
+            left = list(self.queue)
+            self.queue.clear()
+        for op in left:
+            op.future.set_exception(BufferDropped("buffer closed"))
+    
+    def report(self, window=SIZING_WINDOW):
+        """Counters, added latency, queue high-water mark and buffer sizing for a window of `window` seconds"""
+        elapsed = (time.perf_counter_ns() - self._start_ns) / 1e9
+        rate = self.counts['submitted'] / elapsed if elapsed else 0.0
+        direct = self.direct_latency.summary()
+        buffered = self.buffered_latency.summary()
+        return {
+            'capacity': self.capacity,
+            'max_age_seconds': self.max_age_ns / 1e9,
+            'overflow_policy': self.overflow,
+            **self.counts,
+            'drops': dict(self.drops),
+            'dropped': sum(self.drops.values()),
+            'queue_high_water_mark': self.high_water_mark,
+            'outages': self.outages,
+            'transitions': self.transitions,
+            'direct_latency': direct,
+            'buffered_latency': buffered,
+            # What buffering cost on top of a typical direct write
+            'added_latency_ms': {
+                key: buffered[key] - direct.get('p50_ms', 0.0)
+                for key in ('p50_ms', 'p99_ms', 'max_ms') if key in buffered
+            },
+            'submit_rate': rate,
+            'buffer_seconds_at_rate': self.capacity / rate if rate else None,
+            'sizing_window_seconds': window,
+            'capacity_needed_for_window': int(rate * window + 0.5)
+        }
+
+def print_buffer_report(report):
+    """Human readable summary of FailoverWriteBuffer.report()"""
+    print(f"  Writes submitted:        {report['submitted']} ({report['submit_rate']:.0f}/sec)")
+    print(f"  Direct / replayed:       {report['direct']} / {report['replayed']}")
+    print(f"  Dropped:                 {report['dropped']} (overflow {report['drops']['overflow']}, "
+          f"expired {report['drops']['expired']}), failed {report['failed']}")
+    print(f"  Queue high-water mark:   {report['queue_high_water_mark']} of {report['capacity']} "
+          f"({report['overflow_policy']}, max age {report['max_age_seconds']:g}s)")
+    for outage in report['outages']:
+        duration = f"{outage['duration_ms']:.1f} ms" if outage['duration_ms'] is not None else "not drained"
+        print(f"    buffered from +{outage['start_ms'] / 1000:.2f}s: {duration}, max depth {outage['max_depth']}")
+    for transition in report['transitions']:
+        print(f"    [{transition['timestamp']}] {transition['state']}: {transition['reason']}")
+    print(f"  Direct write latency:    {format_summary(report['direct_latency'])}")
+    if report['buffered_latency'].get('count'):
+        added = report['added_latency_ms']
+        print(f"  Buffered write latency:  {format_summary(report['buffered_latency'])}")
+        print(f"  Added by buffering:      p50 {added['p50_ms']:.1f} ms, p99 {added['p99_ms']:.1f} ms, max {added['max_ms']:.1f} ms")
+    if report['buffer_seconds_at_rate'] is not None:
+        print(f"  Buffer covers {report['buffer_seconds_at_rate']:.1f}s at this rate; a {report['sizing_window_seconds']:g}s "
+              f"window needs {report['capacity_needed_for_window']} writes of capacity")
@@ -0,0 +1,233 @@
+"""
+Continuous write load for failover tests
+Issues sequence-numbered SETs at a fixed rate from a background thread,
+follows the master through a failover via a SentinelConnectionManager (or
+a FailoverWriteBuffer), then audits the new master for acknowledged writes
+that did not survive.
+"""
+
+import threading
+import time
+from datetime import datetime
+from latency_histogram import LatencyHistogram, format_summary
+from sentinel_pool import FAILOVER_ERRORS
+
+LOAD_RATE = 100  # Target writes per second
+AUDIT_CHUNK_SIZE = 1000
+
+class FailoverLoadGenerator:
+    """Background writer that keeps writing to whichever node is currently master"""
+    
+    def __init__(self, connections, rate=LOAD_RATE, key_prefix=None, writer=None):
+        self.connections = connections  # SentinelConnectionManager
+        self.writer = writer  # FailoverWriteBuffer, None writes directly and reports failures as errors
+        self.rate = rate
+        self.key_prefix = key_prefix or f"failover_load:{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        # One record per attempt: (seq, sent_offset_ns, latency_ns, error or None, master)
+        self.attempts = []
+        self.master_changes = []
+        self._master = None
+        self._start_ns = None
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def key(self, seq):
+        """Redis key written for a sequence number"""
+        return f"{self.key_prefix}:{seq}"
+    
+    def start(self):
+        """Start writing in a daemon thread"""
+        self._start_ns = time.perf_counter_ns()
+        self._thread = threading.Thread(target=self._run, name='failover-load', daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        """Stop writing and wait for the in-flight write to finish"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.connections.connection_kwargs['socket_timeout'] * 3 + 1)
+        if self.writer:
+            # Buffered writes complete out of submission order, the report expects seq order
+            self.writer.drain(self.writer.max_age_ns / 1_000_000_000)
+            self.attempts.sort(key=lambda attempt: attempt[0])
+    
+    def _track_master(self):
+        """Record when the connection manager starts pointing at a different master"""
+        address = self.connections.master_address
+        master = f"{address[0]}:{address[1]}" if address else None
+        if master != self._master:
+            self.master_changes.append({
+                'offset_ms': (time.perf_counter_ns() - self._start_ns) / 1_000_000,
+                'timestamp': datetime.now().strftime('%H:%M:%S.%f')[:-3],
+                'master': master
+            })
+            self._master = master
+    
+    def _run(self):
+        """Paced write loop, a failover error invalidates the pool so the next write re-resolves"""
+        interval_ns = 1_000_000_000 // self.rate
+        next_send = time.perf_counter_ns()
+        seq = 0
+        
+        while not self._stop.is_set():
+            now = time.perf_counter_ns()
+            if now < next_send:
+                time.sleep((next_send - now) / 1_000_000_000)
+            elif now - next_send > interval_ns:
+                # Fell behind (e.g. a timed-out write), restart the schedule instead of bursting
+                next_send = now
+            next_send += interval_ns
+            
+            seq += 1
+            sent_ns = time.perf_counter_ns()
+            if self.writer:
+                self._track_master()
+                future = self.writer.set(self.key(seq), f"{seq}:{time.time_ns()}")
+                future.add_done_callback(lambda future, seq=seq, sent_ns=sent_ns: self._record_buffered(seq, sent_ns, future))
+                continue
+            error = None
+            try:
+                client = self.connections.master()
+                self._track_master()
+                client.set(self.key(seq), f"{seq}:{time.time_ns()}")
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                if isinstance(e, FAILOVER_ERRORS):
+                    self.connections.invalidate(error)
+            latency_ns = time.perf_counter_ns() - sent_ns
+            self.attempts.append((seq, sent_ns - self._start_ns, latency_ns, error, self._master))
+    
+    def _record_buffered(self, seq, sent_ns, future):
+        """Record a buffered write once the buffer acknowledged or dropped it"""
+        latency_ns = time.perf_counter_ns() - sent_ns
+        error = future.exception()
+        error = f"{type(error).__name__}: {error}" if error is not None else None
+        self.attempts.append((seq, sent_ns - self._start_ns, latency_ns, error, self._master))
+    
+    def audit(self, client, chunk_size=AUDIT_CHUNK_SIZE):
+        """Sequence numbers that were acknowledged but are missing on client's node"""
+        acked = [seq for seq, _, _, error, _ in self.attempts if error is None]
+        lost = []
+        for start in range(0, len(acked), chunk_size):
+            chunk = acked[start:start + chunk_size]
+            values = client.mget([self.key(seq) for seq in chunk])
+            lost.extend(seq for seq, value in zip(chunk, values) if value is None)
+        return lost
+    
+    def cleanup(self, client, chunk_size=AUDIT_CHUNK_SIZE):
+        """Delete every key the run may have written from client's node, return how many existed"""
+        last_seq = max((attempt[0] for attempt in self.attempts), default=0)
+        deleted = 0
+        for start in range(1, last_seq + 1, chunk_size):
+            deleted += client.delete(*[self.key(seq) for seq in range(start, min(start + chunk_size, last_seq + 1))])
+        return deleted
+    
+    def unavailability_windows(self):
+        """Spans from the first failed write to the next successful one"""
+        windows = []
+        first_failure = None
+        for seq, offset_ns, latency_ns, error, _ in self.attempts:
+            if error is not None and first_failure is None:
+                first_failure = (seq, offset_ns)
+            elif error is None and first_failure is not None:
+                windows.append({
+                    'first_failed_seq': first_failure[0],
+                    'recovered_seq': seq,
+                    'start_ms': first_failure[1] / 1_000_000,
+                    'duration_ms': (offset_ns + latency_ns - first_failure[1]) / 1_000_000
+                })
+                first_failure = None
+        if first_failure is not None:
+            windows.append({
+                'first_failed_seq': first_failure[0],
+                'recovered_seq': None,
+                'start_ms': first_failure[1] / 1_000_000,
+                'duration_ms': None
+            })
+        return windows
+    
+    def error_timeline(self):
+        """Attempts, errors and error rate per second of the run"""
+        buckets = {}
+        for _, offset_ns, _, error, _ in self.attempts:
+            second = offset_ns // 1_000_000_000
+            attempts, errors = buckets.get(second, (0, 0))
+            buckets[second] = (attempts + 1, errors + (error is not None))
+        return [
+            {'second': second, 'attempts': attempts, 'errors': errors, 'error_rate': errors / attempts}
+            for second, (attempts, errors) in sorted(buckets.items())
+        ]
+    
+    def latency_summary(self, start_ns=None, end_ns=None):
+        """Percentiles of successful write latency, optionally within an offset range"""
+        histogram = LatencyHistogram()
+        for _, offset_ns, latency_ns, error, _ in self.attempts:
+            if error is None and (start_ns is None or offset_ns >= start_ns) and (end_ns is None or offset_ns <= end_ns):
+                histogram.record_ns(latency_ns)
+        return histogram.summary()
+    
+    def report(self, audit_client=None):
+        """Availability, error, latency and durability summary of the run"""
+        total = len(self.attempts)
+        errors = sum(1 for attempt in self.attempts if attempt[3] is not None)
+        windows = self.unavailability_windows()
+        
+        # Transition: from one second before the first failure to one second after recovery
+        transition = None
+        if windows:
+            start_ns = int(windows[0]['start_ms'] * 1_000_000) - 1_000_000_000
+            end_ns = None
+            if windows[-1]['duration_ms'] is not None:
+                end_ns = int((windows[-1]['start_ms'] + windows[-1]['duration_ms']) * 1_000_000) + 1_000_000_000
+            transition = self.latency_summary(start_ns, end_ns)
+        
+        error_types = {}
+        for attempt in self.attempts:
+            if attempt[3] is not None:
+                error_type = attempt[3].split(':', 1)[0]
+                error_types[error_type] = error_types.get(error_type, 0) + 1
+        
+        lost = self.audit(audit_client) if audit_client is not None else None
+        return {
+            'key_prefix': self.key_prefix,
+            'target_rate': self.rate,
+            'attempts': total,
+            'acknowledged': total - errors,
+            'errors': errors,
+            'error_rate': errors / total if total else 0.0,
+            'error_types': error_types,
+            'unavailability_ms': max((w['duration_ms'] or 0 for w in windows), default=0.0),
+            'unavailability_windows': windows,
+            'latency_overall': self.latency_summary(),
+            'latency_transition': transition,
+            'master_changes': self.master_changes,
+            'lost_acknowledged_writes': len(lost) if lost is not None else None,
+            'lost_seq_sample': lost[:100] if lost else [],
+            'error_timeline': self.error_timeline()
+        }
+
+def print_load_report(report):
+    """Human readable summary of FailoverLoadGenerator.report()"""
+    print(f"  Writes attempted:        {report['attempts']} @ {report['target_rate']}/sec target")
+    print(f"  Acknowledged:            {report['acknowledged']}")
+    print(f"  Errors:                  {report['errors']} ({report['error_rate']*100:.2f}%)")
+    for error_type, count in report['error_types'].items():
+        print(f"    {error_type}: {count}")
+    print(f"  Longest unavailability:  {report['unavailability_ms']:.1f} ms")
+    for window in report['unavailability_windows']:
+        duration = f"{window['duration_ms']:.1f} ms" if window['duration_ms'] is not None else "not recovered"
+        print(f"    from seq {window['first_failed_seq']} at +{window['start_ms']/1000:.2f}s: {duration}")
+    
+    print(f"  Write latency overall:   {format_summary(report['latency_overall'])}")
+    if report['latency_transition']:
+        print(f"  Write latency failover:  {format_summary(report['latency_transition'])}")
+    
+    if report['lost_acknowledged_writes'] is not None:
+        print(f"  Lost acknowledged writes: {report['lost_acknowledged_writes']}")
+    
+    noisy = [bucket for bucket in report['error_timeline'] if bucket['errors']]
+    if noisy:
+        print("  Error rate per second:")
+        for bucket in noisy:
+            print(f"    +{bucket['second']:4d}s  {bucket['errors']:5d}/{bucket['attempts']:<5d} ({bucket['error_rate']*100:.0f}%)")
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Vectorized Redis Cluster hash slot calculator
+Computes CRC16 (XMODEM) slots for millions of keys at once using NumPy,
+including hash tag ({...}) extraction. Run directly for a verification
+against scenario3's scalar get_key_slot() and a micro-benchmark.
+"""
+
+import itertools
+import time
+import numpy as np
+
+TOTAL_SLOTS = 16384
+CHUNK_SIZE = 1_000_000  # Keys per vectorized pass, bounds the padded byte matrix
+
+BENCHMARK_KEYS = 1_000_000
+
+def _build_crc16_table():
+    """Precompute the CRC16-CCITT (XMODEM, poly 0x1021) lookup table"""
+    table = np.zeros(256, dtype=np.uint16)
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+            crc &= 0xFFFF
+        table[i] = crc
+    return table
+
+CRC16_TABLE = _build_crc16_table()
+
+def _to_byte_matrix(keys):
+    """Pack keys into a zero-padded (n, width) uint8 matrix plus their byte lengths"""
+    if isinstance(keys, np.ndarray) and keys.dtype.kind in 'SU':
+        if keys.dtype.kind == 'U':
+            keys = np.char.encode(keys, 'utf-8')
+        # Fixed-width bytes arrays cannot represent trailing NUL bytes, they count as padding
+        lengths = np.char.str_len(keys).astype(np.int64)
+    else:
+        keys = list(keys)
+        # Lengths from the keys themselves, so trailing NUL bytes are not lost as padding
+        lengths = np.fromiter(map(len, keys), dtype=np.int64, count=len(keys))
+        try:
+            # One C-level conversion; NumPy encodes str as ASCII, so char counts are byte counts
+            keys = np.array(keys, dtype=f"S{max(int(lengths.max()) if len(keys) else 0, 1)}")
+        except UnicodeEncodeError:
+            keys = [key.encode('utf-8') if isinstance(key, str) else bytes(key) for key in keys]
+            lengths = np.fromiter(map(len, keys), dtype=np.int64, count=len(keys))
+            keys = np.array(keys, dtype=f"S{max(int(lengths.max()), 1)}")
+    
+    keys = np.ascontiguousarray(keys)
+    return keys.view(np.uint8).reshape(len(keys), keys.dtype.itemsize), lengths
+
+def _hashed_span(matrix, lengths):
+    """Vectorized hash tag extraction, return (start, length) of the bytes to hash"""
+    start = np.zeros(len(matrix), dtype=np.int64)
+    length = lengths
+    
+    is_open = matrix == ord('{')
+    if not is_open.any():
+        return start, length
+    
+    # Hash tag: first '{' and the first '}' after it, only if the tag is non-empty
+    cols = np.arange(matrix.shape[1])
+    in_key = cols[None, :] < lengths[:, None]
+    is_open &= in_key
+    has_open = is_open.any(axis=1)
+    open_pos = is_open.argmax(axis=1)
+    
+    is_close = (matrix == ord('}')) & in_key & (cols[None, :] > open_pos[:, None])
+    has_close = is_close.any(axis=1)
+    close_pos = is_close.argmax(axis=1)
+    
+    tagged = has_open & has_close & (close_pos > open_pos + 1)
+    start = np.where(tagged, open_pos + 1, start)
+    length = np.where(tagged, close_pos - open_pos - 1, lengths)
+    return start, length
+
+def _slots_from_matrix(matrix, lengths):
+    """Table-driven CRC16 over every row of a byte matrix at once"""
+    n, width = matrix.shape
+    start, length = _hashed_span(matrix, lengths)
+    crc = np.zeros(n, dtype=np.uint16)
+
+    # Rows sharing (start, length) hash the same columns, so each group runs unmasked
+    group_key = start * (width + 1) + length
+    order = np.argsort(group_key, kind='stable')
+    boundaries = np.flatnonzero(np.diff(group_key[order])) + 1
+
+    for rows in np.split(order, boundaries):
+        if len(rows) == 0:
+            continue
+        offset = start[rows[0]]
+        columns = np.ascontiguousarray(matrix[rows, offset:offset + length[rows[0]]].T)
+
+        group_crc = np.zeros(len(rows), dtype=np.uint16)
+        for column in columns:
+            group_crc = (group_crc << 8) ^ CRC16_TABLE[(group_crc >> 8) ^ column]
+        crc[rows] = group_crc
+
+    return crc % TOTAL_SLOTS
+
+def key_slots(keys, chunk_size=CHUNK_SIZE):
+    """Hash slots for an iterable or array of keys, returned as a uint16 NumPy array"""
+    if isinstance(keys, np.ndarray):
+        chunks = (keys[start:start + chunk_size] for start in range(0, len(keys), chunk_size))
+    else:
+        iterator = iter(keys)
+        chunks = iter(lambda: list(itertools.islice(iterator, chunk_size)), [])
+    
+    results = [_slots_from_matrix(*_to_byte_matrix(chunk)) for chunk in chunks]
+    if not results:
+        return np.zeros(0, dtype=np.uint16)
+    return np.concatenate(results)
+
+def benchmark(num_keys=BENCHMARK_KEYS):
+    """Verify key_slots() against scenario3's get_key_slot() and compare throughput"""
+    from scenario3_cluster_sharding import get_key_slot
+    
+    keys = [f"key{i}" for i in range(num_keys)]
+    # Mix in hash-tagged and edge-case keys so the tag extraction is exercised
+    keys += [f"{{user{i}}}:email" for i in range(0, num_keys, 10)]
+    keys += ['{}', '{}{a}', 'a{b}c{d}', '{a', 'a}', '', 'ключ{тег}']
+    
+    print(f"Benchmarking {len(keys)} keys...\n")
+    
+    start = time.perf_counter()
+    scalar = [get_key_slot(key) for key in keys]
+    scalar_duration = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    vector = key_slots(keys)
+    vector_duration = time.perf_counter() - start
+    
+    array_keys = np.array([key.encode('utf-8') for key in keys], dtype=object).astype('S')
+    start = time.perf_counter()
+    vector_array = key_slots(array_keys)
+    array_duration = time.perf_counter() - start
+    
+    mismatches = int(np.count_nonzero(vector != np.array(scalar))) + int(np.count_nonzero(vector_array != vector))
+    
+    print(f"  Scalar get_key_slot():   {scalar_duration:.3f}s ({len(keys)/scalar_duration:,.0f} keys/sec)")
+    print(f"  key_slots(list):         {vector_duration:.3f}s ({len(keys)/vector_duration:,.0f} keys/sec)")
+    print(f"  key_slots(bytes array):  {array_duration:.3f}s ({len(keys)/array_duration:,.0f} keys/sec)")
+    print(f"  Mismatches vs scalar:    {mismatches}")
+    
+    if mismatches:
+        print("\n✗ Vectorized slots differ from the scalar implementation")
+    else:
+        print("\n✓ Vectorized slots match the scalar implementation")
+    return mismatches == 0
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,155 @@
+"""
+Log-bucketed latency histogram (HDR style)
+Fixed memory regardless of sample count, O(1) recording and exact merging,
+so every operation can be recorded and per-worker histograms combined.
+"""
+
+import math
+import time
+
+SUB_BUCKET_BITS = 7  # 64 linear sub-buckets per power of two, < 1.6% relative error
+MAX_TRACKABLE_NS = 1 << 40  # ~18 minutes, larger values land in the top bucket
+PERCENTILES = (50, 90, 99, 99.9)
+
+class LatencyHistogram:
+    """Counts of nanosecond latencies in log-linear buckets"""
+    
+    def __init__(self, sub_bucket_bits=SUB_BUCKET_BITS, max_value_ns=MAX_TRACKABLE_NS):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.half_count = 1 << (sub_bucket_bits - 1)
+        self.counts = [0] * (self._index(max_value_ns) + 1)
+        self.count = 0
+        self.total_ns = 0
+        self.min_ns = None
+        self.max_ns = 0
+    
+    def _index(self, value_ns):
+        """Bucket index: exact below 2**sub_bucket_bits, then half_count buckets per power of two"""
+        shift = value_ns.bit_length() - self.sub_bucket_bits
+        if shift <= 0:
+            return value_ns
+        return shift * self.half_count + (value_ns >> shift)
+    
+    def _bucket_bounds(self, index):
+        """Lowest and highest nanosecond value that map to a bucket index"""
+        if index < 2 * self.half_count:
+            return index, index
+        shift = index // self.half_count - 1
+        low = (index - shift * self.half_count) << shift
+        return low, low + (1 << shift) - 1
+    
+    def record_ns(self, value_ns, count=1):
+        """Record a latency in nanoseconds, optionally for several operations at once"""
+        value_ns = max(int(value_ns), 0)
+        index = min(self._index(value_ns), len(self.counts) - 1)
+        self.counts[index] += count
+        self.count += count
+        self.total_ns += value_ns * count
+        if self.min_ns is None or value_ns < self.min_ns:
+            self.min_ns = value_ns
+        if value_ns > self.max_ns:
+            self.max_ns = value_ns
+    
+    def record(self, seconds, count=1):
+        """Record a latency measured in seconds (time.perf_counter() deltas)"""
+        self.record_ns(seconds * 1_000_000_000, count)
+    
+    def time(self):
+        """Context manager recording the duration of its block"""
+        return _Timer(self)
+    
+    def merge(self, other):
+        """Add another histogram's counts into this one, return self"""
+        if other.sub_bucket_bits != self.sub_bucket_bits or len(other.counts) != len(self.counts):
+            raise ValueError("Cannot merge histograms with different bucket layouts")
+        for index, bucket_count in enumerate(other.counts):
+            if bucket_count:
+                self.counts[index] += bucket_count
+        self.count += other.count
+        self.total_ns += other.total_ns
+        if other.min_ns is not None and (self.min_ns is None or other.min_ns < self.min_ns):
+            self.min_ns = other.min_ns
+        self.max_ns = max(self.max_ns, other.max_ns)
+        return self
+    
+    def percentile_ns(self, pct):
+        """Value at a percentile, the upper bound of its bucket capped by the exact max"""
+        if not self.count:
+            return None
+        target = max(1, math.ceil(pct / 100 * self.count))
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                return min(self._bucket_bounds(index)[1], self.max_ns)
+        return self.max_ns
+    
+    def summary(self):
+        """count, min, mean, p50/p90/p99/p99.9 and max in milliseconds"""
+        if not self.count:
+            return {'count': 0}
+        result = {
+            'count': self.count,
+            'min_ms': self.min_ns / 1_000_000,
+            'mean_ms': self.total_ns / self.count / 1_000_000
+        }
+        for pct in PERCENTILES:
+            result[f"p{pct:g}_ms".replace('.', '')] = self.percentile_ns(pct) / 1_000_000
+        result['max_ms'] = self.max_ns / 1_000_000
+        return result
+    
+    def to_dict(self):
+        """Sparse JSON form, can be turned back into a histogram with from_dict()"""
+        return {
+            'sub_bucket_bits': self.sub_bucket_bits,
+            'buckets': len(self.counts),
+            'counts': {str(index): bucket_count for index, bucket_count in enumerate(self.counts) if bucket_count},
+            'count': self.count,
+            'total_ns': self.total_ns,
+            'min_ns': self.min_ns,
+            'max_ns': self.max_ns
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a histogram serialized with to_dict()"""
+        histogram = cls(sub_bucket_bits=data['sub_bucket_bits'])
+        histogram.counts = [0] * data['buckets']
+        for index, bucket_count in data['counts'].items():
+            histogram.counts[int(index)] = bucket_count
+        histogram.count = data['count']
+        histogram.total_ns = data['total_ns']
+        histogram.min_ns = data['min_ns']
+        histogram.max_ns = data['max_ns']
+        return histogram
+
+class _Timer:
+    """with histogram.time(): ... records the block's perf_counter_ns duration"""
+    
+    def __init__(self, histogram):
+        self.histogram = histogram
+    
+    def __enter__(self):
+        self.start_ns = time.perf_counter_ns()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.histogram.record_ns(time.perf_counter_ns() - self.start_ns)
+        return False
+
+def merge_all(histograms):
+    """Merge an iterable of histograms into a new one"""
+    merged = LatencyHistogram()
+    for histogram in histograms:
+        merged.merge(histogram)
+    return merged
+
+def format_summary(summary):
+    """One-line percentile summary for console output"""
+    if not summary.get('count'):
+        return "no samples"
+    return (
+        f"p50 {summary['p50_ms']:.3f} ms, p90 {summary['p90_ms']:.3f} ms, "
+        f"p99 {summary['p99_ms']:.3f} ms, p99.9 {summary['p999_ms']:.3f} ms, "
+        f"max {summary['max_ms']:.3f} ms (n={summary['count']})"
+    )
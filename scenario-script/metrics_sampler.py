@@ -0,0 +1,246 @@
+"""
+Background INFO sampler
+Polls INFO stats/memory/replication/persistence on every node concurrently
+at a fixed interval while a scenario runs, keeping a few fields per sample in
+a fixed-size ring buffer per node, so client-side slowdowns can be lined up
+with server-side state (ops/sec, memory, replication offsets, rewrites).
+"""
+
+import threading
+import time
+from collections import deque
+import redis
+from redis.backoff import NoBackoff
+from redis.retry import Retry
+
+SAMPLE_INTERVAL = 1.0  # seconds between samples of each node
+RING_SIZE = 3600  # samples kept per node (an hour at 1 s), older ones are overwritten
+SAMPLE_TIMEOUT = 0.5  # socket timeout per INFO, a stuck node misses ticks instead of piling up polls
+INFO_SECTIONS = ('stats', 'memory', 'replication', 'persistence')
+
+# Fields kept per sample, everything else in the INFO reply is discarded right away
+SAMPLE_FIELDS = (
+    'instantaneous_ops_per_sec',
+    'used_memory',
+    'master_repl_offset',
+    'slave_repl_offset',
+    'connected_slaves',
+    'aof_rewrite_in_progress',
+    'rdb_bgsave_in_progress',
+)
+
+class NodeSampler:
+    """One node's polling thread and its ring buffer of samples"""
+    
+    def __init__(self, name, schedule, interval, capacity):
+        host, port = name.rsplit(':', 1)
+        self.name = name
+        # Only this node's thread uses the client, so its pool never holds more than one connection.
+        # No retries: a failed poll is recorded and the next tick tries again
+        self.client = redis.Redis(
+            host=host, port=int(port), socket_timeout=SAMPLE_TIMEOUT, socket_connect_timeout=SAMPLE_TIMEOUT,
+            retry=Retry(NoBackoff(), 0)
+        )
+        self.schedule = schedule
+        self.interval = interval
+        # (tick, offset s, wall time, poll ms, role, master, *SAMPLE_FIELDS) or (tick, offset s, wall time, error)
+        self.ring = deque(maxlen=capacity)
+        self.samples = 0
+        self.errors = 0
+        self.missed_ticks = 0  # ticks skipped because the previous poll overran the interval
+        self.poll_ms_total = 0.0
+        self._sections = INFO_SECTIONS  # fall back to plain INFO on servers without multi-section INFO
+    
+    def info(self):
+        """INFO for the sampled sections, plain INFO on servers that take only one section"""
+        if self._sections:
+            try:
+                return self.client.info(*self._sections)
+            except redis.ResponseError:
+                self._sections = ()  # Redis < 7 takes a single section, plain INFO has all four
+        return self.client.info()
+    
+    def poll(self, tick):
+        """Take one sample into the ring buffer, or record the error if the node did not answer"""
+        start_ns = time.perf_counter_ns()
+        offset = (start_ns - self.schedule.start_ns) / 1e9
+        try:
+            info = self.info()
+        except Exception as e:
+            self.errors += 1
+            self.ring.append((tick, offset, time.time(), f"{type(e).__name__}: {e}"))
+            return
+        poll_ms = (time.perf_counter_ns() - start_ns) / 1e6
+        self.poll_ms_total += poll_ms
+        self.samples += 1
+        
+        master = None
+        if info.get('role') == 'slave':
+            master = f"{info.get('master_host')}:{info.get('master_port')}"
+        self.ring.append(
+            (tick, offset, time.time(), poll_ms, info.get('role'), master)
+            + tuple(info.get(field) for field in SAMPLE_FIELDS)
+        )
+    
+    def run(self, stop):
+        """Poll on the shared schedule until stop is set, skipping ticks a slow poll overran"""
+        tick = 0
+        while not stop.is_set():
+            self.poll(tick)
+            # Next tick on the shared schedule, so every node is sampled at the same moments
+            elapsed = (time.perf_counter_ns() - self.schedule.start_ns) / 1e9
+            next_tick = max(tick + 1, int(elapsed / self.interval) + 1)
+            self.missed_ticks += next_tick - tick - 1
+            tick = next_tick
+            stop.wait(max(0.0, tick * self.interval - elapsed))
+        self.client.close()
+    
+    def timeline(self):
+        """Samples still in the ring buffer as dicts, oldest first"""
+        records = []
+        for entry in self.ring:
+            record = {'node': self.name, 'tick': entry[0], 'offset_s': entry[1], 'timestamp': entry[2]}
+            if len(entry) == 4:
+                record['error'] = entry[3]
+            else:
+                record.update(poll_ms=entry[3], role=entry[4], master=entry[5])
+                record.update(zip(SAMPLE_FIELDS, entry[6:]))
+            records.append(record)
+        return records
+
+class MetricsSampler:
+    """Samples INFO on every node from one thread per node, on a shared schedule
+    
+    Nodes are 'host:port' names. Each thread keeps its own connection and
+    sleeps between polls, so sampling costs one INFO round trip per node per
+    interval and nothing on the scenario's own threads.
+    """
+    
+    def __init__(self, nodes, interval=SAMPLE_INTERVAL, capacity=RING_SIZE):
+        self.interval = interval
+        self.capacity = capacity
+        self.start_ns = time.perf_counter_ns()
+        self.started_at = time.time()
+        self.nodes = [NodeSampler(name, self, interval, capacity) for name in dict.fromkeys(nodes)]
+        self._stop = threading.Event()
+        self._threads = []
+    
+    def start(self):
+        """Start one polling thread per node, resetting the schedule to now"""
+        self.start_ns = time.perf_counter_ns()
+        self.started_at = time.time()
+        for node in self.nodes:
+            thread = threading.Thread(target=node.run, args=(self._stop,), name=f"metrics-{node.name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+    
+    def stop(self):
+        """Stop the polling threads and wait for them to close their connections"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=SAMPLE_TIMEOUT * 2 + 1)
+        self._threads = []
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, exc_type, exc, traceback):
+        self.stop()
+        return False
+    
+    def timeline(self):
+        """Every node's buffered samples merged in time order"""
+        records = [record for node in self.nodes for record in node.timeline()]
+        records.sort(key=lambda record: (record['tick'], record['node']))
+        return records
+    
+    def export(self, sink, record_type='metrics_sample'):
+        """Stream the timeline into a ResultSink, one record per node sample"""
+        for record in self.timeline():
+            sink.write(record_type, **record)
+    
+    def summary(self):
+        """Per-node ranges over the timeline, plus replica lag in bytes at matching ticks"""
+        timeline = self.timeline()
+        master_offsets = {}  # (tick, master name) -> master_repl_offset
+        tick_masters = {}  # tick -> masters sampled at that tick
+        for record in timeline:
+            if record.get('role') == 'master' and record.get('master_repl_offset') is not None:
+                master_offsets[(record['tick'], record['node'])] = record['master_repl_offset']
+                tick_masters.setdefault(record['tick'], []).append(record['node'])
+        
+        def master_of(record):
+            # Replicas report their master by its internal address (e.g. a docker IP), with a
+            # single master sampled at that tick it can only be that one
+            if (record['tick'], record['master']) in master_offsets:
+                return record['master']
+            masters = tick_masters.get(record['tick'], [])
+            return masters[0] if len(masters) == 1 else None
+        
+        nodes = {}
+        for node in self.nodes:
+            samples = [record for record in timeline if record['node'] == node.name and 'error' not in record]
+            ops = [record['instantaneous_ops_per_sec'] for record in samples if record['instantaneous_ops_per_sec'] is not None]
+            memory = [record['used_memory'] for record in samples if record['used_memory'] is not None]
+            lag = []
+            for record in samples:
+                master = master_of(record) if record['role'] == 'slave' else None
+                if master and record['slave_repl_offset'] is not None:
+                    lag.append(master_offsets[(record['tick'], master)] - record['slave_repl_offset'])
+            roles = [record['role'] for record in samples]
+            nodes[node.name] = {
+                'samples': node.samples,
+                'errors': node.errors,
+                'missed_ticks': node.missed_ticks,
+                'overwritten': max(0, node.samples + node.errors - self.capacity),
+                'mean_poll_ms': node.poll_ms_total / node.samples if node.samples else None,
+                'roles': list(dict.fromkeys(roles)),  # more than one means the node changed role mid-run
+                'ops_per_sec_max': max(ops) if ops else None,
+                'ops_per_sec_mean': sum(ops) / len(ops) if ops else None,
+                'used_memory_min': min(memory) if memory else None,
+                'used_memory_max': max(memory) if memory else None,
+                'repl_lag_bytes_max': max(lag) if lag else None,
+                'rewrite_samples': sum(
+                    1 for record in samples if record['aof_rewrite_in_progress'] or record['rdb_bgsave_in_progress']
+                )
+            }
+        return {
+            'interval': self.interval,
+            'ring_size': self.capacity,
+            'started_at': self.started_at,
+            'duration': (time.perf_counter_ns() - self.start_ns) / 1e9,
+            'nodes': nodes
+        }
+
+def start_sampling(nodes, interval=SAMPLE_INTERVAL):
+    """Started MetricsSampler for the nodes, or None when interval is 0 (sampling disabled)"""
+    if not interval:
+        return None
+    return MetricsSampler(nodes, interval).start()
+
+def finish_sampling(sampler, sink):
+    """Stop the sampler, stream its timeline into the sink and print the summary, return the summary"""
+    if sampler is None:
+        return None
+    sampler.stop()
+    sampler.export(sink)
+    summary = sampler.summary()
+    print_metrics_summary(summary)
+    return summary
+
+def print_metrics_summary(summary):
+    """Table of the sampled server-side metrics per node"""
+    print(f"\nServer metrics ({summary['interval']:g}s samples over {summary['duration']:.1f}s):")
+    print(f"  {'Node':<22} {'Role':<14} {'Samples':>7} {'Err':>4} {'Poll ms':>8} {'Ops/s max':>10} "
+          f"{'Mem max MB':>11} {'Lag max B':>10} {'Rewrite':>8}")
+    def show(value, spec):
+        return format(value, spec) if value is not None else '-'
+    
+    for name, node in summary['nodes'].items():
+        print(
+            f"  {name:<22} {'→'.join(node['roles']) or '-':<14} {node['samples']:7d} {node['errors']:4d} "
+            f"{show(node['mean_poll_ms'], '8.2f'):>8} {show(node['ops_per_sec_max'], '10d'):>10} "
+            f"{show(node['used_memory_max'] and node['used_memory_max'] / 1e6, '11.1f'):>11} "
+            f"{show(node['repl_lag_bytes_max'], '10d'):>10} {node['rewrite_samples']:8d}"
+        )
@@ -0,0 +1,141 @@
+"""
+Preallocated value payloads
+Builds values from a random ASCII body generated once per size, with only a
+fixed-width sequence/timestamp header formatted per write, and sweeps value
+sizes to find where write throughput becomes bandwidth-bound.
+"""
+
+import random
+import string
+import time
+from latency_histogram import LatencyHistogram
+
+HEADER_FORMAT = b'%012d:%019d:'  # sequence number, time.time_ns() at build time
+HEADER_SIZE = len(HEADER_FORMAT % (0, 0))
+# Smallest power of two above the header. Scenario1/3 values used to be ~28 B f"value_{i}_{time}"
+# strings, so absolute numbers are not comparable with runs from before PayloadGenerator
+DEFAULT_VALUE_SIZE = 64
+BODY_ALPHABET = (string.ascii_letters + string.digits).encode()  # ASCII so decode_responses clients can read it back
+
+SWEEP_SIZES = [64, 256, 1024, 4096, 16384, 65536, 262144, 1048576]  # 64 B .. 1 MB
+SWEEP_BYTES = 64 * 1024 * 1024  # Bytes written per size, so large values get as much traffic as small ones
+SWEEP_MAX_OPS = 20000  # ...capped for small values
+SWEEP_MIN_OPS = 32
+SWEEP_BATCH_BYTES = 4 * 1024 * 1024  # Pipeline batches stop at this many payload bytes
+SWEEP_MAX_BATCH = 100  # ...or this many commands
+BANDWIDTH_BOUND_GAIN = 1.1  # Bandwidth-bound once a bigger size raises MB/s by less than this factor
+
+class PayloadGenerator:
+    """Values of a fixed size: a per-write header in front of a body generated once
+    
+    value() returns standalone bytes (one copy of the body, no formatting of
+    it), safe to keep around. buffer() writes the header into one of `ring`
+    preallocated buffers and returns a memoryview of it, so nothing is copied;
+    the view is overwritten `ring` calls later and must be sent by then.
+    """
+    
+    def __init__(self, size=DEFAULT_VALUE_SIZE, ring=1, seed=0):
+        if size < HEADER_SIZE:
+            raise ValueError(f"Value size {size} is smaller than the {HEADER_SIZE} byte header")
+        self.size = size
+        rng = random.Random(seed)
+        self.body = bytes(rng.choices(BODY_ALPHABET, k=size - HEADER_SIZE))
+        self.ring = [bytearray(HEADER_SIZE) + self.body for _ in range(max(1, ring))]
+        self.views = [memoryview(buffer) for buffer in self.ring]
+        self._next = 0
+    
+    def header(self, seq):
+        return HEADER_FORMAT % (seq, time.time_ns())
+    
+    def value(self, seq):
+        """New bytes value for write number seq"""
+        return self.header(seq) + self.body
+    
+    def buffer(self, seq):
+        """Reused buffer for write number seq, valid until len(ring) more buffers are taken"""
+        slot = self._next
+        self._next = (slot + 1) % len(self.ring)
+        self.ring[slot][:HEADER_SIZE] = self.header(seq)
+        return self.views[slot]
+
+def sweep_plan(size, total_bytes=SWEEP_BYTES, max_ops=SWEEP_MAX_OPS, batch_bytes=SWEEP_BATCH_BYTES, max_batch=SWEEP_MAX_BATCH):
+    """(ops, batch size) for one sweep point"""
+    ops = max(SWEEP_MIN_OPS, min(max_ops, total_bytes // size))
+    batch = max(1, min(max_batch, batch_bytes // size))
+    return ops, batch
+
+def payload_sweep(write_batch, sizes=SWEEP_SIZES, after=None, total_bytes=SWEEP_BYTES, max_ops=SWEEP_MAX_OPS):
+    """Write values of every size and report ops/sec and MB/s per size
+    
+    write_batch(items) sends one batch of (seq, value) pairs, values are
+    zero-copy buffers from PayloadGenerator.buffer(). after(size, ops, result)
+    runs once per size after the writes (e.g. to wait for replicas and clean
+    up) and may return extra fields for that size's result.
+    """
+    results = []
+    for size in sizes:
+        ops, batch = sweep_plan(size, total_bytes, max_ops)
+        generator = PayloadGenerator(size, ring=batch)
+        latency = LatencyHistogram()
+        errors = 0
+        
+        start = time.perf_counter()
+        for batch_start in range(0, ops, batch):
+            items = [(seq, generator.buffer(seq)) for seq in range(batch_start, min(batch_start + batch, ops))]
+            op_start = time.perf_counter_ns()
+            try:
+                write_batch(items)
+            except Exception:
+                errors += len(items)
+                continue
+            latency.record_ns(time.perf_counter_ns() - op_start)
+        duration = time.perf_counter() - start
+        
+        written = ops - errors
+        result = {
+            'size': size,
+            'ops': ops,
+            'batch_size': batch,
+            'errors': errors,
+            'duration': duration,
+            'ops_per_sec': written / duration if duration else 0.0,
+            'mb_per_sec': written * size / duration / 1e6 if duration else 0.0,
+            'latency': latency.summary()
+        }
+        if after is not None:
+            result.update(after(size, ops, result) or {})
+        results.append(result)
+    
+    bound = None
+    for previous, current in zip(results, results[1:]):
+        if previous['mb_per_sec'] and current['mb_per_sec'] < previous['mb_per_sec'] * BANDWIDTH_BOUND_GAIN:
+            bound = current['size']
+            break
+    return {'sizes': results, 'bandwidth_bound_from': bound}
+
+def format_size(size):
+    for unit, scale in (('MB', 1 << 20), ('KB', 1 << 10)):
+        if size >= scale:
+            return f"{size / scale:g} {unit}"
+    return f"{size} B"
+
+def print_payload_sweep(sweep, extra_columns=()):
+    """Table of ops/sec and MB/s per value size; extra_columns are (title, key, format) tuples"""
+    header = f"  {'Size':>8} {'Ops':>7} {'Batch':>6} {'Ops/sec':>10} {'MB/s':>9} {'Batch p99 ms':>13}"
+    for title, key, spec in extra_columns:
+        header += f" {title:>{len(title) + 2}}"
+    print(header)
+    for result in sweep['sizes']:
+        line = (
+            f"  {format_size(result['size']):>8} {result['ops']:7d} {result['batch_size']:6d} "
+            f"{result['ops_per_sec']:10.0f} {result['mb_per_sec']:9.2f} {result['latency'].get('p99_ms', 0):13.3f}"
+        )
+        for title, key, spec in extra_columns:
+            value = result.get(key)
+            line += f" {(format(value, spec) if value is not None else '-'):>{len(title) + 2}}"
+        print(line)
+    if sweep['bandwidth_bound_from']:
+        print(f"  Bandwidth-bound from {format_size(sweep['bandwidth_bound_from'])} "
+              f"(MB/s grows less than {BANDWIDTH_BOUND_GAIN:.1f}x over the previous size)")
+    else:
+        print("  MB/s still growing at the largest size")
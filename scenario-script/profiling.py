@@ -0,0 +1,244 @@
+"""
+Phase-level profiling
+Wraps scenario phases with timers that split wall time into process CPU,
+server execution (INFO commandstats deltas) and what is left, the wire wait:
+network round trips, kernel and queueing. Each phase also collects the
+SLOWLOG entries and LATENCY LATEST events it caused, and optionally a
+cProfile or tracemalloc capture of the client side.
+"""
+
+import cProfile
+import os
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+import redis
+
+TOP_N = 15  # functions / allocation sites kept per phase
+SLOWLOG_FETCH = 128  # entries read per node at the end of a phase (slowlog-max-len default)
+SERVER_TIMEOUT = 5  # socket timeout for the INFO / SLOWLOG / LATENCY calls
+# The profiler's own calls and the metrics sampler's INFO polls are not phase work
+IGNORED_COMMANDS = {'info', 'slowlog', 'latency', 'config', 'ping', 'hello', 'client', 'command'}
+# On replicas these arrive through the replication stream and were already counted on the master
+REPLICATED_COMMANDS = {'set', 'setex', 'mset', 'del', 'unlink', 'incr', 'flushdb', 'flushall'}
+
+def process_cpu():
+    """User + system CPU seconds of this process, its threads and its waited-for children"""
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+class PhaseProfiler:
+    """Collects a breakdown per phase: with profiler.phase('write'): ...
+    
+    CPU is process-wide, not the phase thread's: the worker threads of the
+    threaded phases are counted, and so is whatever runs in the background
+    (metrics sampler, sentinel watchers), usually a small constant.
+    Server time is the sum of commandstats usec over every node, so phases
+    that keep several nodes or threads busy at once can add up to more than
+    their wall time; the wire wait is then reported as 0 and the phase is
+    flagged as overlapped. Writes on `replicas` are skipped, they are the
+    master's writes replayed. cProfile only sees the thread that runs the phase.
+    """
+    
+    def __init__(self, nodes, replicas=(), cprofile=False, tracemalloc_capture=False, top_n=TOP_N):
+        self.replicas = set(replicas)
+        self.cprofile = cprofile
+        self.tracemalloc = tracemalloc_capture
+        self.top_n = top_n
+        self.clients = {}
+        for name in dict.fromkeys(list(nodes) + list(replicas)):
+            host, port = name.rsplit(':', 1)
+            self.clients[name] = redis.Redis(
+                host=host, port=int(port), decode_responses=True, socket_timeout=SERVER_TIMEOUT
+            )
+        self.phases = []
+    
+    # Server side
+    
+    def _command_stats(self):
+        """node -> {command: (calls, usec)}, nodes that cannot be read are left out"""
+        stats = {}
+        for name, client in self.clients.items():
+            try:
+                info = client.info('commandstats')
+            except Exception:
+                continue
+            stats[name] = {
+                key[len('cmdstat_'):]: (int(value['calls']), int(value['usec']))
+                for key, value in info.items() if key.startswith('cmdstat_')
+            }
+        return stats
+    
+    def _slowlog_ids(self):
+        """node -> id of the newest SLOWLOG entry (-1 when empty)"""
+        ids = {}
+        for name, client in self.clients.items():
+            try:
+                entries = client.slowlog_get(1)
+            except Exception:
+                continue
+            ids[name] = entries[0]['id'] if entries else -1
+        return ids
+    
+    def _slowlog_since(self, ids):
+        """SLOWLOG entries newer than ids on each node, slowest first"""
+        entries = []
+        for name, client in self.clients.items():
+            if name not in ids:
+                continue
+            try:
+                fetched = client.slowlog_get(SLOWLOG_FETCH)
+            except Exception:
+                continue
+            for entry in fetched:
+                if entry['id'] <= ids[name]:
+                    continue
+                command = entry['command']
+                if isinstance(command, bytes):
+                    command = command.decode(errors='replace')
+                entries.append({
+                    'node': name,
+                    'id': entry['id'],
+                    'start_time': entry['start_time'],
+                    'duration_us': entry['duration'],
+                    'command': command[:120]
+                })
+        entries.sort(key=lambda entry: entry['duration_us'], reverse=True)
+        return entries
+    
+    def _latency_events_since(self, started_at):
+        """LATENCY LATEST events that fired during the phase (needs latency-monitor-threshold > 0)"""
+        events = []
+        for name, client in self.clients.items():
+            try:
+                latest = client.latency_latest()
+            except Exception:
+                continue
+            for event, timestamp, latest_ms, max_ms, *_ in latest:
+                if int(timestamp) >= int(started_at):
+                    events.append({
+                        'node': name, 'event': event, 'timestamp': int(timestamp),
+                        'latest_ms': int(latest_ms), 'max_ms': int(max_ms)
+                    })
+        return events
+    
+    # Client side
+    
+    def _top_functions(self, profile):
+        """The top_n functions by own time in a cProfile capture"""
+        stats = pstats.Stats(profile)
+        rows = []
+        for (filename, line, function), (calls, primitive, tottime, cumtime, _) in stats.stats.items():
+            rows.append({
+                'function': f"{os.path.basename(filename)}:{line}({function})",
+                'calls': calls,
+                'tottime': tottime,
+                'cumtime': cumtime
+            })
+        rows.sort(key=lambda row: row['tottime'], reverse=True)
+        return rows[:self.top_n]
+    
+    def _top_allocations(self, snapshot):
+        """The top_n allocation sites by size in a tracemalloc snapshot"""
+        return [
+            {'site': str(stat.traceback), 'size_kb': stat.size / 1024, 'count': stat.count}
+            for stat in snapshot.statistics('lineno')[:self.top_n]
+        ]
+    
+    @contextmanager
+    def phase(self, name):
+        """Time the enclosed block as one phase; the record is appended to self.phases"""
+        before = self._command_stats()
+        slowlog_ids = self._slowlog_ids()
+        started_at = time.time()
+        
+        profile = cProfile.Profile() if self.cprofile else None
+        started_tracing = self.tracemalloc and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if self.tracemalloc:
+            tracemalloc.reset_peak()
+        
+        cpu_start = process_cpu()
+        wall_start = time.perf_counter()
+        if profile:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile:
+                profile.disable()
+            wall = time.perf_counter() - wall_start
+            cpu = process_cpu() - cpu_start
+            
+            record = {'phase': name}
+            if self.tracemalloc:
+                _, peak = tracemalloc.get_traced_memory()
+                record['tracemalloc'] = {
+                    'peak_kb': peak / 1024,
+                    'top_allocations': self._top_allocations(tracemalloc.take_snapshot())
+                }
+                if started_tracing:
+                    tracemalloc.stop()
+            
+            after = self._command_stats()
+            server_nodes = {}
+            for node, commands in after.items():
+                calls = usec = 0
+                for command, (command_calls, command_usec) in commands.items():
+                    if command in IGNORED_COMMANDS or (node in self.replicas and command in REPLICATED_COMMANDS):
+                        continue
+                    previous_calls, previous_usec = before.get(node, {}).get(command, (0, 0))
+                    calls += command_calls - previous_calls
+                    usec += command_usec - previous_usec
+                server_nodes[node] = {'calls': calls, 'server_s': usec / 1e6}
+            server = sum(stats['server_s'] for stats in server_nodes.values())
+            
+            record.update({
+                'wall_s': wall,
+                'process_cpu_s': cpu,
+                'server_s': server,
+                'wire_wait_s': max(0.0, wall - cpu - server),
+                'overlapped': cpu + server > wall,
+                'process_cpu_share': cpu / wall if wall else 0.0,
+                'server_share': server / wall if wall else 0.0,
+                'server_nodes': server_nodes,
+                'unreachable_nodes': sorted(set(self.clients) - set(after)),
+                'slowlog': self._slowlog_since(slowlog_ids),
+                'latency_events': self._latency_events_since(started_at)
+            })
+            if profile:
+                record['cprofile'] = self._top_functions(profile)
+            self.phases.append(record)
+    
+    def close(self):
+        """Close the connection to every profiled node"""
+        for client in self.clients.values():
+            client.close()
+
+def profile_phase(profiler, name):
+    """profiler.phase(name), or a no-op context when profiling is off (profiler is None)"""
+    return profiler.phase(name) if profiler else nullcontext()
+
+def print_phase_profile(phases, show_functions=5):
+    """Table of where each phase's wall time went, then the slowest server commands and hottest functions"""
+    print(f"  {'Phase':<18} {'Wall s':>8} {'Process CPU':>11} {'Server':>8} {'Wire/wait':>10} {'Slowlog':>8}")
+    for phase in phases:
+        wall = phase['wall_s'] or 1.0
+        print(
+            f"  {phase['phase']:<18} {phase['wall_s']:8.2f} {phase['process_cpu_s'] / wall:11.1%} "
+            f"{phase['server_s'] / wall:8.1%} {phase['wire_wait_s'] / wall:10.1%} {len(phase['slowlog']):8d}"
+            + ("  (overlapped)" if phase['overlapped'] else '')
+        )
+    for phase in phases:
+        if phase['slowlog'] or phase['latency_events'] or phase.get('cprofile') or phase.get('tracemalloc'):
+            print(f"\n  {phase['phase']}:")
+        for entry in phase['slowlog'][:3]:
+            print(f"    slowlog {entry['node']}: {entry['duration_us'] / 1000:.2f} ms  {entry['command']}")
+        for event in phase['latency_events']:
+            print(f"    latency {event['node']}: {event['event']} latest {event['latest_ms']} ms, max {event['max_ms']} ms")
+        for row in phase.get('cprofile', [])[:show_functions]:
+            print(f"    {row['tottime']:8.3f}s self {row['cumtime']:8.3f}s total {row['calls']:9d}  {row['function']}")
+        if phase.get('tracemalloc'):
+            print(f"    tracemalloc peak {phase['tracemalloc']['peak_kb']:.0f} KB")
@@ -0,0 +1,229 @@
+"""
+Replica read routing for Redis Cluster
+Sends GETs to the replicas of the slot's master (READONLY connections)
+with random, round-robin or lowest-latency selection, and measures read
+throughput and stale-read rate against master-only reads.
+"""
+
+import random
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import redis
+from latency_histogram import LatencyHistogram, merge_all
+
+READ_POLICIES = ('master', 'random', 'round_robin', 'lowest_latency')
+LATENCY_EWMA_ALPHA = 0.2  # lowest_latency: weight of the newest sample in a node's latency estimate
+EXPLORE_EVERY = 50  # lowest_latency: every Nth read goes to a random candidate so estimates stay fresh
+STALE_RETRY_TIMEOUT = 1.0  # seconds to keep re-reading a stale key to measure how long it stayed stale
+
+class ReadRouter:
+    """Per-thread read router: picks a node for each slot and keeps per-node stats"""
+    
+    def __init__(self, slot_map, policy='master', include_master=False, seed=None):
+        if policy not in READ_POLICIES:
+            raise ValueError(f"Unknown read policy {policy!r}, expected one of {READ_POLICIES}")
+        self.slot_map = slot_map
+        self.policy = policy
+        self.include_master = include_master  # replica policies also send reads to the master
+        self.rng = random.Random(seed)
+        self.clients = {}
+        self.latency_ewma = {}  # node -> smoothed read latency in ms
+        self.node_reads = defaultdict(int)
+        self.node_latency = defaultdict(LatencyHistogram)
+        self.errors = 0
+        self._next = defaultdict(int)  # master -> round-robin position
+        self._reads = 0
+    
+    def candidates(self, master):
+        """Nodes allowed to serve reads for a master's slots"""
+        if self.policy == 'master':
+            return [master]
+        replicas = self.slot_map.replicas.get(master, [])
+        if not replicas:
+            return [master]
+        return [master] + replicas if self.include_master else replicas
+    
+    def node_for_slot(self, slot):
+        """Node to read slot from under the router's policy"""
+        master = self.slot_map.node_for_slot(slot)
+        nodes = self.candidates(master)
+        if len(nodes) == 1:
+            return nodes[0]
+        if self.policy == 'random':
+            return self.rng.choice(nodes)
+        if self.policy == 'round_robin':
+            position = self._next[master]
+            self._next[master] = position + 1
+            return nodes[position % len(nodes)]
+        
+        # lowest_latency: unmeasured nodes first, then the best estimate with occasional exploration
+        unmeasured = [node for node in nodes if node not in self.latency_ewma]
+        if unmeasured:
+            return unmeasured[0]
+        if self._reads % EXPLORE_EVERY == 0:
+            return self.rng.choice(nodes)
+        return min(nodes, key=self.latency_ewma.get)
+    
+    def client(self, name):
+        """Dedicated connection per node; replica connections are switched to READONLY once"""
+        if name not in self.clients:
+            host, port = name.rsplit(':', 1)
+            client = redis.Redis(
+                host=host, port=int(port), decode_responses=True, socket_timeout=10,
+                single_connection_client=True
+            )
+            if name not in self.slot_map.masters:
+                client.execute_command('READONLY')
+            self.clients[name] = client
+        return self.clients[name]
+    
+    def get(self, key, slot):
+        """GET key from the node picked for its slot, return (node, value)"""
+        node = self.node_for_slot(slot)
+        return node, self.get_from(node, key)
+    
+    def get_from(self, node, key):
+        """GET key from a given node, recording its latency"""
+        self._reads += 1
+        op_start = time.perf_counter_ns()
+        try:
+            value = self.client(node).get(key)
+        except Exception:
+            self.errors += 1
+            raise
+        elapsed = time.perf_counter_ns() - op_start
+        self.node_reads[node] += 1
+        self.node_latency[node].record_ns(elapsed)
+        
+        elapsed_ms = elapsed / 1e6
+        previous = self.latency_ewma.get(node)
+        self.latency_ewma[node] = elapsed_ms if previous is None else (
+            LATENCY_EWMA_ALPHA * elapsed_ms + (1 - LATENCY_EWMA_ALPHA) * previous
+        )
+        return value
+    
+    def master_client(self, slot):
+        """Connection to the slot's master, used for the writes of stale-read probes"""
+        return self.client(self.slot_map.node_for_slot(slot))
+    
+    def close(self):
+        """Close every node client this router opened"""
+        for client in self.clients.values():
+            client.close()
+
+def read_throughput(slot_map, keys, slots, policy, threads=4, include_master=False):
+    """Read every key once, split over `threads` routers, return throughput and per-node stats"""
+    def worker(worker_id):
+        router = ReadRouter(slot_map, policy, include_master, seed=worker_id)
+        missing = 0
+        try:
+            for i in range(worker_id, len(keys), threads):
+                try:
+                    if router.get(keys[i], slots[i])[1] is None:
+                        missing += 1
+                except Exception:
+                    pass
+        finally:
+            router.close()
+        return router, missing
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        routers = list(executor.map(worker, range(threads)))
+    duration = time.perf_counter() - start
+    
+    node_reads = defaultdict(int)
+    node_latency = defaultdict(LatencyHistogram)
+    for router, _ in routers:
+        for node, count in router.node_reads.items():
+            node_reads[node] += count
+            node_latency[node].merge(router.node_latency[node])
+    
+    reads = sum(node_reads.values())
+    return {
+        'policy': policy,
+        'threads': threads,
+        'reads': reads,
+        'duration': duration,
+        'reads_per_sec': reads / duration if duration else 0.0,
+        'errors': sum(router.errors for router, _ in routers),
+        'missing': sum(missing for _, missing in routers),
+        'latency': merge_all(node_latency.values()).summary(),
+        'node_reads': dict(node_reads),
+        'node_latency': {node: histogram.summary() for node, histogram in node_latency.items()}
+    }
+
+def stale_reads(slot_map, keys, slots, policy, include_master=False):
+    """Write a fresh token to each key on its master, read it straight back through the router
+    
+    A read that does not return the token is stale. Stale keys are re-read
+    until they catch up (up to STALE_RETRY_TIMEOUT) to measure how long the
+    replica lagged behind the write.
+    """
+    router = ReadRouter(slot_map, policy, include_master, seed=0)
+    stale = errors = never_caught_up = 0
+    stale_ms = LatencyHistogram()
+    
+    try:
+        for i, (key, slot) in enumerate(zip(keys, slots)):
+            token = f"stale_probe_{i}_{time.perf_counter_ns()}"
+            try:
+                router.master_client(slot).set(key, token)
+                written_ns = time.perf_counter_ns()
+                node, value = router.get(key, slot)
+                if value == token:
+                    continue
+                stale += 1
+                
+                # Keep reading the same node until the write shows up there
+                deadline = time.perf_counter() + STALE_RETRY_TIMEOUT
+                while time.perf_counter() < deadline:
+                    if router.get_from(node, key) == token:
+                        stale_ms.record_ns(time.perf_counter_ns() - written_ns)
+                        break
+                else:
+                    never_caught_up += 1
+            except Exception:
+                errors += 1
+    finally:
+        router.close()
+    
+    probes = len(keys)
+    return {
+        'policy': policy,
+        'probes': probes,
+        'stale': stale,
+        'stale_rate': stale / probes if probes else 0.0,
+        'errors': errors,
+        'never_caught_up': never_caught_up,
+        'stale_for': stale_ms.summary()
+    }
+
+def compare_read_policies(slot_map, keys, slots, policies=READ_POLICIES, threads=4, stale_probes=1000, include_master=False):
+    """Throughput and stale-read rate for each policy, with scaling relative to master-only reads"""
+    results = {}
+    for policy in policies:
+        throughput = read_throughput(slot_map, keys, slots, policy, threads, include_master)
+        probes = min(stale_probes, len(keys))
+        throughput['stale'] = stale_reads(slot_map, keys[:probes], slots[:probes], policy, include_master)
+        results[policy] = throughput
+    
+    baseline = results.get('master', {}).get('reads_per_sec')
+    for result in results.values():
+        result['scaling_vs_master'] = result['reads_per_sec'] / baseline if baseline else None
+    return results
+
+def print_read_policies(results):
+    """Table of read throughput, latency and stale-read rate per policy"""
+    print(f"  {'Policy':<15} {'Reads/sec':>10} {'vs master':>10} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'Stale':>8} {'Stale for p99 ms':>17} {'Nodes':>6}")
+    for policy, result in results.items():
+        scaling = result['scaling_vs_master']
+        stale = result['stale']
+        print(
+            f"  {policy:<15} {result['reads_per_sec']:10.0f} "
+            f"{(f'{scaling:.2f}x' if scaling else '-'):>10} "
+            f"{result['latency'].get('p50_ms', 0):8.3f} {result['latency'].get('p99_ms', 0):8.3f} "
+            f"{stale['stale_rate']:8.2%} {stale['stale_for'].get('p99_ms', 0):17.3f} {len(result['node_reads']):6d}"
+        )
@@ -0,0 +1,25 @@
+"""
+Local RESP stand-in for the scenario VPSes
+An asyncio server emulating a master with lagging replicas, a sentinel
+quorum and a Redis Cluster, so the scenarios can run on localhost.
+Start it with: python -m resp_emulator all
+"""
+
+from .protocol import RespError
+from .server import RespServer, KeyspaceServer
+from .replication import DataNode, ReplicationGroup
+from .sentinel import SentinelNode, SentinelGroup
+from .cluster import ClusterNodeServer, EmulatedCluster, key_slot
+
+__all__ = [
+    'RespError',
+    'RespServer',
+    'KeyspaceServer',
+    'DataNode',
+    'ReplicationGroup',
+    'SentinelNode',
+    'SentinelGroup',
+    'ClusterNodeServer',
+    'EmulatedCluster',
+    'key_slot',
+]
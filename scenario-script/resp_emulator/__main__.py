@@ -0,0 +1,57 @@
+"""
+Command line entry point: python -m resp_emulator [replication|cluster|all]
+"""
+
+import argparse
+import asyncio
+import signal
+from .replication import ReplicationGroup, REPLICA_DELAY_MS, REPLICA_JITTER_MS, REPLICA_DROP_RATE
+from .sentinel import SentinelGroup, DOWN_AFTER_MS, QUORUM
+from .cluster import EmulatedCluster, CLUSTER_REPLICA_DELAY_MS
+
+# Same ports as the docker setup on the VPSes
+MASTER_PORT = 6379
+REPLICA_PORTS = [6380, 6381]
+SENTINEL_PORTS = [26379, 26380, 26381]
+CLUSTER_PORTS = [7001, 7002, 7003, 7004, 7005, 7006]
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog='python -m resp_emulator', description=__doc__)
+    parser.add_argument('mode', nargs='?', choices=['replication', 'cluster', 'all'], default='all',
+                        help="replication = master/replicas + sentinels (scenario 1 and 2), cluster = scenario 3")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--delay-ms', type=float, default=REPLICA_DELAY_MS, help="replication delay per write")
+    parser.add_argument('--jitter-ms', type=float, default=REPLICA_JITTER_MS, help="extra random delay per write")
+    parser.add_argument('--drop-rate', type=float, default=REPLICA_DROP_RATE, help="fraction of writes replicas lose")
+    parser.add_argument('--down-after-ms', type=int, default=DOWN_AFTER_MS, help="sentinel down-after-milliseconds")
+    parser.add_argument('--quorum', type=int, default=QUORUM)
+    parser.add_argument('--cluster-delay-ms', type=float, default=CLUSTER_REPLICA_DELAY_MS,
+                        help="replication delay inside each cluster shard")
+    return parser.parse_args()
+
+async def main(args):
+    started = []
+    if args.mode in ('replication', 'all'):
+        group = ReplicationGroup(args.host, MASTER_PORT, REPLICA_PORTS, args.delay_ms, args.jitter_ms, args.drop_rate)
+        started.append(await group.start())
+        sentinels = SentinelGroup(group, args.host, SENTINEL_PORTS, down_after_ms=args.down_after_ms, quorum=args.quorum)
+        started.append(await sentinels.start())
+        print(f"Replication: master {args.host}:{MASTER_PORT}, replicas {REPLICA_PORTS} "
+              f"(delay {args.delay_ms}ms + 0..{args.jitter_ms}ms, drop rate {args.drop_rate})")
+        print(f"Sentinel: {SENTINEL_PORTS}, master name 'mymaster', down-after {args.down_after_ms}ms, quorum {args.quorum}")
+    if args.mode in ('cluster', 'all'):
+        cluster = EmulatedCluster(args.host, CLUSTER_PORTS, replica_delay_ms=args.cluster_delay_ms)
+        started.append(await cluster.start())
+        print(f"Cluster: masters {CLUSTER_PORTS[:3]}, replicas {CLUSTER_PORTS[3:]}")
+    print("Send SHUTDOWN to a node to kill it, Ctrl+C to stop the emulator")
+    
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+    for part in reversed(started):
+        await part.stop()
+
+if __name__ == '__main__':
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,355 @@
+"""
+Redis Cluster emulation
+Masters own hash slot ranges and answer MOVED for keys they do not own;
+slots in the middle of a migration answer ASK, so resharding behaves like
+the real thing. Replicas apply their master's writes after an optional
+delay and only serve reads on READONLY connections.
+"""
+
+import asyncio
+import binascii
+import random
+import time
+from .protocol import RespError, OK, SimpleString, encode_command
+from .server import KeyspaceServer
+
+TOTAL_SLOTS = 16384
+CLUSTER_REPLICA_DELAY_MS = 0.0  # Replication delay inside each shard, 0 applies on the next loop tick
+
+def key_slot(key):
+    """Hash slot of a key (bytes), honouring {hash tags}"""
+    start = key.find(b'{')
+    if start > -1:
+        end = key.find(b'}', start + 1)
+        if end > -1 and end != start + 1:
+            key = key[start + 1:end]
+    return binascii.crc_hqx(key, 0) % TOTAL_SLOTS
+
+class ClusterNodeServer(KeyspaceServer):
+    """One cluster node, master of some slots or replica of a master"""
+    
+    redis_mode = 'cluster'
+    
+    def __init__(self, host, port, cluster, master=None, name=None):
+        super().__init__(host, port, name)
+        self.cluster = cluster
+        self.node_id = f"{random.getrandbits(160):040x}"
+        self.master = master  # None on masters
+        self.replicas = []
+        self.repl_offset = 0
+        self.slot_keys = {}  # slot -> set of keys stored here, for COUNTKEYSINSLOT / GETKEYSINSLOT
+        self.migrating = {}  # slot -> target node
+        self.importing = {}  # slot -> source node
+        self._last_due = {}
+        if master is not None:
+            master.replicas.append(self)
+    
+    @property
+    def role(self):
+        return 'master' if self.master is None else 'slave'
+    
+    # Routing
+    
+    def _route(self, conn, keys, write):
+        """Raise MOVED / ASK / CROSSSLOT unless this node may serve keys"""
+        if not keys:
+            return
+        slots = {key_slot(key) for key in keys}
+        if len(slots) > 1:
+            raise RespError("CROSSSLOT Keys in request don't hash to the same slot")
+        slot = slots.pop()
+        owner = self.cluster.owners[slot]
+        shard_master = self.master or self
+        
+        if owner is shard_master:
+            if self.master is not None and (write or not conn.readonly):
+                raise RespError(f"MOVED {slot} {owner.host}:{owner.port}")
+            target = self.migrating.get(slot)
+            if target is not None and any(key not in self.data for key in keys):
+                # Keys already moved (or never here) are looked up on the importing node
+                raise RespError(f"ASK {slot} {target.host}:{target.port}")
+            return
+        if conn.asking and slot in shard_master.importing and self.master is None:
+            return
+        raise RespError(f"MOVED {slot} {owner.host}:{owner.port}")
+    
+    def check_write(self, conn, name, keys):
+        self._route(conn, keys, True)
+    
+    def check_read(self, conn, name, keys):
+        self._route(conn, keys, False)
+    
+    def apply_write(self, args):
+        reply = super().apply_write(args)
+        name = args[0].lower()
+        if name in (b'flushdb', b'flushall'):
+            self.slot_keys.clear()
+        elif name == b'mset':
+            for key in args[1::2]:
+                self._index(key)
+        else:
+            for key in args[1:2] if name in (b'set', b'setex', b'incr') else args[1:]:
+                self._index(key)
+        return reply
+    
+    def _index(self, key):
+        """Keep the slot -> keys index in step with self.data"""
+        slot = key_slot(key)
+        if key in self.data:
+            self.slot_keys.setdefault(slot, set()).add(key)
+        elif slot in self.slot_keys:
+            self.slot_keys[slot].discard(key)
+            if not self.slot_keys[slot]:
+                del self.slot_keys[slot]
+    
+    def write(self, conn, args, keys):
+        reply = super().write(conn, args, keys)
+        self.propagate(args)
+        return reply
+    
+    def propagate(self, args):
+        """Ship a write to this master's replicas after the cluster's replica delay"""
+        self.repl_offset += len(encode_command(args))
+        if not self.replicas:
+            return
+        loop = asyncio.get_running_loop()
+        offset = self.repl_offset
+        for replica in self.replicas:
+            due = max(loop.time() + self.cluster.replica_delay_ms / 1000, self._last_due.get(replica, 0))
+            self._last_due[replica] = due
+            loop.call_at(due, replica._replicate, args, offset)
+    
+    def _replicate(self, args, offset):
+        if self.alive:
+            self.apply_write(args)
+            self.repl_offset = max(self.repl_offset, offset)
+    
+    # Cluster commands
+    
+    def cmd_asking(self, conn):
+        conn.asking = True
+        return OK
+    
+    def cmd_readonly(self, conn):
+        conn.readonly = True
+        return OK
+    
+    def cmd_readwrite(self, conn):
+        conn.readonly = False
+        return OK
+    
+    def cmd_migrate(self, conn, host, port, key, db, timeout, *options):
+        """MIGRATE host port key|"" db timeout [COPY] [REPLACE] [KEYS key ...]"""
+        if self.master is not None:
+            raise RespError("READONLY You can't write against a read only replica.")
+        target = self.cluster.node_at(host.decode(), int(port))
+        if target is None:
+            raise RespError(f"IOERR error or timeout connecting to {host.decode()}:{int(port)}")
+        upper = [option.upper() for option in options]
+        keys = list(options[upper.index(b'KEYS') + 1:]) if b'KEYS' in upper else [key]
+        keys = [key for key in keys if key in self.data]
+        if not keys:
+            return SimpleString('NOKEY')
+        if b'REPLACE' not in upper and any(key in target.data for key in keys):
+            raise RespError("BUSYKEY Target key name already exists.")
+        
+        pairs = [item for key in keys for item in (key, self.data[key])]
+        target.apply_write([b'MSET', *pairs])
+        target.propagate([b'MSET', *pairs])
+        if b'COPY' not in upper:
+            self.apply_write([b'DEL', *keys])
+            self.propagate([b'DEL', *keys])
+        return OK
+    
+    def cmd_cluster(self, conn, subcommand, *args):
+        handler = getattr(self, f"_cluster_{subcommand.decode().lower().replace('-', '_')}", None)
+        if handler is None:
+            raise RespError(f"ERR unknown subcommand '{subcommand.decode()}'. Try CLUSTER HELP.")
+        return handler(*args)
+    
+    def _cluster_myid(self):
+        return self.node_id
+    
+    def _cluster_keyslot(self, key):
+        return key_slot(key)
+    
+    def _cluster_countkeysinslot(self, slot):
+        return len(self.slot_keys.get(int(slot), ()))
+    
+    def _cluster_getkeysinslot(self, slot, count):
+        return list(self.slot_keys.get(int(slot), ()))[:int(count)]
+    
+    def _cluster_slots(self):
+        reply = []
+        for start, end, master in self.cluster.slot_ranges():
+            reply.append([start, end] + [
+                [node.host, node.port, node.node_id] for node in [master] + master.replicas
+            ])
+        return reply
+    
+    def _cluster_shards(self):
+        reply = []
+        for master in self.cluster.masters:
+            slots = [bound for start, end, owner in self.cluster.slot_ranges() if owner is master for bound in (start, end)]
+            reply.append({
+                'slots': slots,
+                'nodes': [
+                    {
+                        'id': node.node_id,
+                        'port': node.port,
+                        'ip': node.host,
+                        'endpoint': node.host,
+                        'role': node.role,
+                        'replication-offset': node.repl_offset,
+                        'health': 'online' if node.alive else 'fail'
+                    }
+                    for node in [master] + master.replicas
+                ]
+            })
+        return reply
+    
+    def _node_line(self, node):
+        flags = ('myself,' if node is self else '') + node.role
+        if not node.alive:
+            flags += ',fail'
+        line = (
+            f"{node.node_id} {node.host}:{node.port}@{node.port + 10000} {flags} "
+            f"{node.master.node_id if node.master else '-'} 0 {int(time.time() * 1000)} "
+            f"{self.cluster.epoch} {'connected' if node.alive else 'disconnected'}"
+        )
+        if node.master is None:
+            for start, end, owner in self.cluster.slot_ranges():
+                if owner is node:
+                    line += f" {start}" if start == end else f" {start}-{end}"
+            for slot, target in sorted(node.migrating.items()):
+                line += f" [{slot}->-{target.node_id}]"
+            for slot, source in sorted(node.importing.items()):
+                line += f" [{slot}-<-{source.node_id}]"
+        return line
+    
+    def _cluster_nodes(self):
+        return '\n'.join(self._node_line(node) for node in self.cluster.nodes) + '\n'
+    
+    def _cluster_replicas(self, node_id):
+        master = self.cluster.node_by_id(node_id.decode())
+        if master is None:
+            raise RespError(f"ERR Unknown node {node_id.decode()}")
+        return [self._node_line(node) for node in master.replicas]
+    
+    _cluster_slaves = _cluster_replicas
+    
+    def _cluster_info(self):
+        assigned = sum(1 for owner in self.cluster.owners if owner is not None)
+        fields = {
+            'cluster_enabled': 1,
+            'cluster_state': 'ok' if assigned == TOTAL_SLOTS else 'fail',
+            'cluster_slots_assigned': assigned,
+            'cluster_slots_ok': assigned,
+            'cluster_slots_pfail': 0,
+            'cluster_slots_fail': 0,
+            'cluster_known_nodes': len(self.cluster.nodes),
+            'cluster_size': len(self.cluster.masters),
+            'cluster_current_epoch': self.cluster.epoch,
+            'cluster_my_epoch': self.cluster.epoch
+        }
+        return '\r\n'.join(f"{key}:{value}" for key, value in fields.items()) + '\r\n'
+    
+    def _cluster_setslot(self, slot, action, node_id=None):
+        """SETSLOT slot IMPORTING|MIGRATING|NODE node-id, or SETSLOT slot STABLE"""
+        slot = int(slot)
+        action = action.upper()
+        if action == b'STABLE':
+            self.migrating.pop(slot, None)
+            self.importing.pop(slot, None)
+            return OK
+        node = self.cluster.node_by_id(node_id.decode()) if node_id is not None else None
+        if node is None or node.master is not None:
+            raise RespError(f"ERR I don't know about node {node_id.decode() if node_id else ''}")
+        if action == b'MIGRATING':
+            if self.cluster.owners[slot] is not self:
+                raise RespError(f"ERR I'm not the owner of hash slot {slot}")
+            self.migrating[slot] = node
+        elif action == b'IMPORTING':
+            if self.cluster.owners[slot] is self:
+                raise RespError(f"ERR I'm already the owner of hash slot {slot}")
+            self.importing[slot] = node
+        elif action == b'NODE':
+            # The slot table is shared, so this acts as if the new config already propagated
+            self.cluster.assign(slot, node)
+            self.migrating.pop(slot, None)
+            node.importing.pop(slot, None)
+        else:
+            raise RespError("ERR Invalid CLUSTER SETSLOT action or number of arguments")
+        return OK
+    
+    def info_sections(self):
+        sections = super().info_sections()
+        if self.master is None:
+            sections['replication'] = {
+                'role': 'master',
+                'connected_slaves': len(self.replicas),
+                'master_repl_offset': self.repl_offset
+            }
+        else:
+            sections['replication'] = {
+                'role': 'slave',
+                'master_host': self.master.host,
+                'master_port': self.master.port,
+                'master_link_status': 'up' if self.master.alive else 'down',
+                'slave_repl_offset': self.repl_offset,
+                'master_repl_offset': self.repl_offset
+            }
+        sections['cluster'] = {'cluster_enabled': 1}
+        return sections
+
+class EmulatedCluster:
+    """Masters with evenly split slots plus replicas, all served from this process"""
+    
+    def __init__(self, host, ports, replicas_per_master=1, replica_delay_ms=CLUSTER_REPLICA_DELAY_MS):
+        num_masters = len(ports) // (1 + replicas_per_master)
+        if num_masters < 1:
+            raise ValueError("not enough ports for one master and its replicas")
+        self.replica_delay_ms = replica_delay_ms
+        self.epoch = 1
+        self.masters = [ClusterNodeServer(host, port, self) for port in ports[:num_masters]]
+        # Replicas follow the same layout as redis-cli --cluster create: 7004 -> 7001, 7005 -> 7002 ...
+        self.nodes = list(self.masters)
+        for i, port in enumerate(ports[num_masters:num_masters * (1 + replicas_per_master)]):
+            self.nodes.append(ClusterNodeServer(host, port, self, master=self.masters[i % num_masters]))
+        
+        self.owners = [None] * TOTAL_SLOTS
+        for i, master in enumerate(self.masters):
+            start = i * TOTAL_SLOTS // num_masters
+            end = (i + 1) * TOTAL_SLOTS // num_masters
+            self.owners[start:end] = [master] * (end - start)
+    
+    async def start(self):
+        for node in self.nodes:
+            await node.start()
+        return self
+    
+    async def stop(self):
+        for node in self.nodes:
+            await node.stop()
+    
+    def assign(self, slot, master):
+        """Give a slot to a master and bump the config epoch"""
+        self.owners[slot] = master
+        self.epoch += 1
+    
+    def slot_ranges(self):
+        """Contiguous (start, end, master) ranges of the slot table"""
+        ranges = []
+        start = 0
+        for slot in range(1, TOTAL_SLOTS + 1):
+            if slot == TOTAL_SLOTS or self.owners[slot] is not self.owners[start]:
+                if self.owners[start] is not None:
+                    ranges.append((start, slot - 1, self.owners[start]))
+                start = slot
+        return ranges
+    
+    def node_by_id(self, node_id):
+        return next((node for node in self.nodes if node.node_id == node_id), None)
+    
+    def node_at(self, host, port):
+        return next((node for node in self.nodes if node.port == port and node.host == host), None)
@@ -0,0 +1,68 @@
+"""
+RESP2 / RESP3 wire format: request parsing and reply encoding
+Replies are plain Python values; RESP3 only changes how None, dicts and
+pub/sub pushes go over the wire (redis-py >= 8 negotiates RESP3 via HELLO).
+"""
+
+class RespError(Exception):
+    """Reply sent to the client as a RESP error ('-ERR ...')"""
+
+class SimpleString(str):
+    """Reply sent as a RESP simple string ('+OK')"""
+
+OK = SimpleString('OK')
+QUEUED = SimpleString('QUEUED')
+PONG = SimpleString('PONG')
+
+class Push(list):
+    """Out-of-band message ('>' in RESP3, a plain array in RESP2)"""
+
+async def read_command(reader):
+    """Read one command (multibulk or inline) as a list of bytes, None on EOF"""
+    line = await reader.readline()
+    if not line:
+        return None
+    if line[:1] != b'*':
+        # Inline command, e.g. typed into telnet
+        return line.split()
+    
+    count = int(line[1:-2])
+    args = []
+    for _ in range(count):
+        header = await reader.readline()
+        if header[:1] != b'$':
+            raise RespError(f"Protocol error: expected '$', got {header[:1]!r}")
+        length = int(header[1:-2])
+        args.append((await reader.readexactly(length + 2))[:-2])
+    return args
+
+def encode(value, protocol=2):
+    """Encode a Python reply value as RESP bytes for the connection's protocol version"""
+    if value is None:
+        return b'_\r\n' if protocol == 3 else b'$-1\r\n'
+    if isinstance(value, RespError):
+        return b'-' + str(value).encode() + b'\r\n'
+    if isinstance(value, SimpleString):
+        return b'+' + value.encode() + b'\r\n'
+    if isinstance(value, bool):
+        return b':1\r\n' if value else b':0\r\n'
+    if isinstance(value, int):
+        return b':' + str(value).encode() + b'\r\n'
+    if isinstance(value, str):
+        value = value.encode()
+    if isinstance(value, (bytes, bytearray)):
+        return b'$' + str(len(value)).encode() + b'\r\n' + bytes(value) + b'\r\n'
+    if isinstance(value, dict):
+        if protocol == 3:
+            return b'%' + str(len(value)).encode() + b'\r\n' + b''.join(
+                encode(key, protocol) + encode(item, protocol) for key, item in value.items()
+            )
+        value = [item for pair in value.items() for item in pair]
+    if isinstance(value, (list, tuple)):
+        prefix = b'>' if protocol == 3 and isinstance(value, Push) else b'*'
+        return prefix + str(len(value)).encode() + b'\r\n' + b''.join(encode(item, protocol) for item in value)
+    return encode(str(value), protocol)
+
+def encode_command(args):
+    """Encode a command as a client would send it (used to size the replication stream)"""
+    return encode([arg if isinstance(arg, bytes) else str(arg).encode() for arg in args])
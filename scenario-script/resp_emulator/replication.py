@@ -0,0 +1,336 @@
+"""
+Master/replica emulation with configurable replication lag
+Writes on the master advance master_repl_offset by their RESP size and are
+applied on each replica after a delay (plus jitter), in order, optionally
+dropping a fraction of them to emulate divergence. Replicas pointed away
+from the master and back with REPLICAOF resync partially from the backlog
+or fully from a snapshot, like PSYNC.
+"""
+
+import asyncio
+import fnmatch
+import random
+import time
+from collections import deque
+from .protocol import RespError, SimpleString, OK, encode_command
+from .server import KeyspaceServer
+
+REPLICA_DELAY_MS = 5.0  # Base replication delay per write
+REPLICA_JITTER_MS = 2.0  # Uniform extra delay 0..jitter, order is still preserved
+REPLICA_DROP_RATE = 0.0  # Fraction of writes a replica silently never applies
+REPL_BACKLOG_SIZE = 1024 * 1024  # Same default as redis.conf repl-backlog-size
+RECONNECT_MS = 100.0  # Connect + PSYNC handshake after REPLICAOF points a replica back at the master
+FULL_SYNC_BASE_MS = 50.0  # Fixed cost of a full sync (fork, RDB header, replica flush)
+FULL_SYNC_MB_PER_SEC = 100.0  # RDB transfer and load rate
+FORK_MS_PER_GB = 10.0  # The master stalls for the fork, blocking every client
+
+class DataNode(KeyspaceServer):
+    """A data node that is either the master or a replica of its group"""
+    
+    def __init__(self, host, port, group, role, name=None):
+        super().__init__(host, port, name)
+        self.group = group
+        self.role = role  # 'master' or 'slave'
+        self.repl_offset = 0  # master_repl_offset on a master, slave_repl_offset on a replica
+        self.last_apply_at = time.monotonic()
+        self.link = 'up'  # replicas: 'up', 'down' (pointed elsewhere) or 'sync' (full sync running)
+        self.link_epoch = 0  # bumped when the link drops, writes in flight on the old link are lost
+        self.link_down_at = None
+        self.master_addr = None  # (host, port) a detached replica points at
+        self.replid = group.replid  # replication id this node's data belongs to
+        self.sync_buffer = []  # writes that arrive while a full sync is running
+    
+    def check_write(self, conn, name, keys):
+        if self.role != 'master':
+            raise RespError("READONLY You can't write against a read only replica.")
+    
+    def write(self, conn, args, keys):
+        reply = super().write(conn, args, keys)
+        self.group.propagate(self, args)
+        return reply
+    
+    async def cmd_wait(self, conn, numreplicas, timeout):
+        """WAIT numreplicas timeout: block until that many replicas acked the current offset"""
+        if self.role != 'master':
+            raise RespError("ERR WAIT cannot be used with replica instances.")
+        target = self.repl_offset
+        wanted = int(numreplicas)
+        deadline = time.monotonic() + int(timeout) / 1000 if int(timeout) else None
+        while True:
+            acked = sum(1 for replica in self.group.replicas_of(self) if replica.repl_offset >= target)
+            if acked >= wanted or (deadline is not None and time.monotonic() >= deadline):
+                return acked
+            await self.group.wait_for_apply(deadline)
+    
+    def cmd_role(self, conn):
+        if self.role == 'master':
+            return [b'master', self.repl_offset, [
+                [replica.host, str(replica.port), str(replica.repl_offset)]
+                for replica in self.group.replicas_of(self)
+            ]]
+        master = self.group.master
+        host, port = self.master_addr or (master.host, master.port)
+        state = {'up': b'connected' if master.alive else b'connect', 'sync': b'sync', 'down': b'connect'}[self.link]
+        return [b'slave', host, port, state, self.repl_offset]
+    
+    def cmd_replicaof(self, conn, host, port):
+        if host.upper() == b'NO' and port.upper() == b'ONE':
+            self.group.promote(self)
+            return OK
+        if self.role == 'master':
+            raise RespError("ERR REPLICAOF to another master is not supported by the emulator")
+        master = self.group.master
+        if (host.decode(), int(port)) == (master.host, master.port):
+            if self.link != 'down':
+                return SimpleString('OK Already connected to specified master')
+            self.group.reconnect(self)
+        else:
+            # Any other address is unreachable: the link drops and stays down
+            self.group.disconnect(self, (host.decode(), int(port)))
+        return OK
+    
+    cmd_slaveof = cmd_replicaof
+    
+    def cmd_config(self, conn, subcommand, *args):
+        subcommand = subcommand.upper()
+        if subcommand == b'GET' and args and fnmatch.fnmatch('repl-backlog-size', args[0].decode().lower()):
+            return {'repl-backlog-size': str(self.group.backlog_size)}
+        if subcommand == b'SET' and len(args) >= 2 and args[0].lower() == b'repl-backlog-size':
+            self.group.resize_backlog(int(args[1]))
+        return super().cmd_config(conn, subcommand, *args)
+    
+    def info_sections(self):
+        sections = super().info_sections()
+        if self.role == 'master':
+            replicas = [replica for replica in self.group.replicas_of(self) if replica.link != 'down']
+            replication = {'role': 'master', 'connected_slaves': len(replicas)}
+            for i, replica in enumerate(replicas):
+                lag = int(time.monotonic() - replica.last_apply_at)
+                state = 'online' if replica.link == 'up' else 'wait_bgsave'
+                replication[f"slave{i}"] = (
+                    f"ip={replica.host},port={replica.port},state={state},offset={replica.repl_offset},lag={lag}"
+                )
+            replication.update({
+                'master_failover_state': 'no-failover',
+                'master_replid': self.group.replid,
+                'master_repl_offset': self.repl_offset,
+                'repl_backlog_active': 1,
+                'repl_backlog_size': self.group.backlog_size,
+                'repl_backlog_first_byte_offset': self.group.backlog_first_byte(),
+                'repl_backlog_histlen': self.group.backlog_bytes
+            })
+            sections['stats'].update(self.group.sync_stats)
+            sections['persistence']['rdb_bgsave_in_progress'] = 1 if self.group.bgsaves else 0
+        else:
+            master = self.group.master
+            host, port = self.master_addr or (master.host, master.port)
+            link_up = self.link == 'up' and master.alive
+            replication = {
+                'role': 'slave',
+                'master_host': host,
+                'master_port': port,
+                'master_link_status': 'up' if link_up else 'down',
+                'master_last_io_seconds_ago': int(time.monotonic() - self.last_apply_at) if link_up else -1,
+                'master_sync_in_progress': 1 if self.link == 'sync' else 0,
+                'slave_read_repl_offset': self.repl_offset,
+                'slave_repl_offset': self.repl_offset,
+                'slave_priority': 100,
+                'slave_read_only': 1,
+                'replica_announced': 1,
+                'connected_slaves': 0,
+                'master_replid': self.replid,
+                'master_repl_offset': self.repl_offset
+            }
+            if self.link_down_at is not None:
+                replication['master_link_down_since_seconds'] = int(time.monotonic() - self.link_down_at)
+        sections['replication'] = replication
+        return sections
+
+class ReplicationGroup:
+    """One master and its replicas, all served from this process"""
+    
+    def __init__(self, host, master_port, replica_ports, delay_ms=REPLICA_DELAY_MS,
+                 jitter_ms=REPLICA_JITTER_MS, drop_rate=REPLICA_DROP_RATE, backlog_size=REPL_BACKLOG_SIZE):
+        self.delay_ms = delay_ms
+        self.jitter_ms = jitter_ms
+        self.drop_rate = drop_rate
+        self.backlog_size = backlog_size
+        self.backlog = deque()  # (end offset, size, args) of the latest writes, up to backlog_size bytes
+        self.backlog_bytes = 0
+        self.sync_stats = {'sync_full': 0, 'sync_partial_ok': 0, 'sync_partial_err': 0}
+        self.bgsaves = 0  # Full syncs whose snapshot is still in transit (rdb_bgsave_in_progress)
+        self.replid = f"{random.getrandbits(160):040x}"
+        self.master = DataNode(host, master_port, self, 'master', name='redis-master')
+        self.nodes = [self.master] + [
+            DataNode(host, port, self, 'slave', name=f"redis-replica-{i}")
+            for i, port in enumerate(replica_ports, 1)
+        ]
+        self.generation = 0  # bumped on promotion, writes shipped by an older master are discarded
+        self._last_due = {}  # replica -> loop time its previous write is applied at
+        self._applied = None
+        self.listeners = []  # callables(event, **details) notified of promotions
+    
+    async def start(self):
+        self._applied = asyncio.Event()
+        for node in self.nodes:
+            await node.start()
+        return self
+    
+    async def stop(self):
+        for node in self.nodes:
+            await node.stop()
+    
+    def replicas_of(self, master):
+        """Replicas currently following master"""
+        return [node for node in self.nodes if node is not master and node.role == 'slave']
+    
+    def propagate(self, master, args):
+        """Ship a write to every linked replica with the configured lag, preserving order"""
+        size = len(encode_command(args))
+        master.repl_offset += size
+        offset = master.repl_offset
+        self.backlog.append((offset, size, args))
+        self.backlog_bytes += size
+        self._trim_backlog()
+        for replica in self.replicas_of(master):
+            if replica.link == 'up':
+                self._ship(replica, args, offset)
+            elif replica.link == 'sync':
+                replica.sync_buffer.append((offset, args))
+    
+    def _ship(self, replica, args, offset):
+        loop = asyncio.get_running_loop()
+        due = loop.time() + (self.delay_ms + random.uniform(0, self.jitter_ms)) / 1000
+        due = max(due, self._last_due.get(replica, 0))
+        self._last_due[replica] = due
+        dropped = self.drop_rate and random.random() < self.drop_rate
+        loop.call_at(due, self._apply, replica, args, offset, dropped, self.generation, replica.link_epoch)
+    
+    def _apply(self, replica, args, offset, dropped, generation, link_epoch):
+        """Apply one replicated write (replica may have been promoted, detached or killed meanwhile)"""
+        if (replica.role != 'slave' or not replica.alive or generation != self.generation
+                or link_epoch != replica.link_epoch):
+            return
+        if not dropped:
+            replica.apply_write(args)
+        replica.repl_offset = max(replica.repl_offset, offset)
+        replica.last_apply_at = time.monotonic()
+        self._applied.set()
+    
+    # Backlog and resync
+    
+    def _trim_backlog(self):
+        while self.backlog and self.backlog_bytes > self.backlog_size:
+            self.backlog_bytes -= self.backlog.popleft()[1]
+    
+    def resize_backlog(self, size):
+        self.backlog_size = max(size, 16 * 1024)  # redis.conf minimum
+        self._trim_backlog()
+    
+    def backlog_first_byte(self):
+        """Offset of the oldest byte the backlog can still serve"""
+        if not self.backlog:
+            return self.master.repl_offset + 1
+        end, size, _ = self.backlog[0]
+        return end - size + 1
+    
+    def disconnect(self, replica, master_addr):
+        """Drop a replica's link; it keeps its data and offset for a later PSYNC"""
+        replica.master_addr = master_addr
+        if replica.link == 'down':
+            return
+        replica.link = 'down'
+        replica.link_epoch += 1
+        replica.link_down_at = time.monotonic()
+        replica.sync_buffer = []
+        self._last_due.pop(replica, None)
+    
+    def reconnect(self, replica):
+        """Point a detached replica back at the master, PSYNC runs after the handshake"""
+        replica.master_addr = None
+        loop = asyncio.get_running_loop()
+        loop.call_later(RECONNECT_MS / 1000, self._psync, replica, replica.link_epoch)
+    
+    def _psync(self, replica, link_epoch):
+        """Partial resync from the backlog when it still covers the replica, full sync otherwise"""
+        if replica.link != 'down' or link_epoch != replica.link_epoch or not self.master.alive:
+            return
+        master = self.master
+        continues = replica.replid == self.replid and replica.repl_offset <= master.repl_offset
+        if continues and replica.repl_offset + 1 >= self.backlog_first_byte():
+            self.sync_stats['sync_partial_ok'] += 1
+            replica.link = 'up'
+            replica.link_down_at = None
+            for offset, size, args in self.backlog:
+                if offset > replica.repl_offset:
+                    self._ship(replica, args, offset)
+            return
+        self.sync_stats['sync_partial_err'] += 1  # The replica asked for a partial resync and was denied
+        self.sync_stats['sync_full'] += 1
+        
+        # Fork: the whole master stalls, then the snapshot streams to the replica
+        snapshot = dict(master.data)
+        snapshot_bytes = sum(len(key) + len(value) for key, value in snapshot.items())
+        time.sleep(snapshot_bytes / 1e9 * FORK_MS_PER_GB / 1000)
+        replica.link = 'sync'
+        replica.sync_buffer = []
+        self.bgsaves += 1
+        transfer_ms = FULL_SYNC_BASE_MS + snapshot_bytes / 1e6 / FULL_SYNC_MB_PER_SEC * 1000
+        asyncio.get_running_loop().call_later(
+            transfer_ms / 1000, self._finish_full_sync, replica, snapshot, master.repl_offset, replica.link_epoch
+        )
+    
+    def _finish_full_sync(self, replica, snapshot, offset, link_epoch):
+        self.bgsaves -= 1
+        if replica.link != 'sync' or link_epoch != replica.link_epoch:
+            return
+        replica.data = snapshot
+        replica.repl_offset = offset
+        replica.replid = self.replid
+        replica.link = 'up'
+        replica.link_down_at = None
+        replica.last_apply_at = time.monotonic()
+        # Writes buffered on the master while the RDB was in transit
+        for offset, args in replica.sync_buffer:
+            self._ship(replica, args, offset)
+        replica.sync_buffer = []
+    
+    async def wait_for_apply(self, deadline=None):
+        """Sleep until any replica applies a write (or the deadline passes)"""
+        self._applied.clear()
+        timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+        try:
+            await asyncio.wait_for(self._applied.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+    
+    def promote(self, new_master):
+        """Make new_master the master; the others resync from it"""
+        old_master = self.master
+        new_master.role = 'master'
+        self.master = new_master
+        self.generation += 1
+        self._last_due = {}
+        self.replid = f"{random.getrandbits(160):040x}"
+        self.backlog.clear()
+        self.backlog_bytes = 0
+        for node in self.nodes:
+            node.replid = self.replid
+            node.link = 'up'
+            node.link_epoch += 1
+            node.link_down_at = None
+            node.master_addr = None
+            node.sync_buffer = []
+            if node is new_master:
+                continue
+            node.role = 'slave'
+            # Full resync: the replica becomes an exact copy of the new master
+            node.data = dict(new_master.data)
+            node.repl_offset = new_master.repl_offset
+        for listener in self.listeners:
+            listener('promoted', old_master=old_master, new_master=new_master)
+    
+    def best_replica(self):
+        """Live replica with the highest offset, the one sentinel would promote"""
+        candidates = [node for node in self.replicas_of(self.master) if node.alive and node.link == 'up']
+        return max(candidates, key=lambda node: node.repl_offset, default=None)
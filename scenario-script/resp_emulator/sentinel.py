@@ -0,0 +1,206 @@
+"""
+Sentinel quorum emulation
+Each SentinelNode answers the SENTINEL commands redis-py uses for discovery
+and publishes the failover channels. The SentinelGroup watches the master
+and, once it has been unreachable for down_after_ms (or on SENTINEL
+FAILOVER), walks the +sdown ... +switch-master sequence on every sentinel
+and promotes the replica with the highest offset.
+"""
+
+import asyncio
+import time
+from .protocol import RespError, OK
+from .server import RespServer
+
+DOWN_AFTER_MS = 5000  # Same as sentinel down-after-milliseconds in the docker setup
+FAILOVER_TIMEOUT_MS = 10000
+QUORUM = 2
+MONITOR_INTERVAL = 0.1  # seconds between master liveness checks
+EVENT_STAGGER = 0.05  # seconds between consecutive failover phases
+
+class SentinelNode(RespServer):
+    """One sentinel process of the quorum"""
+    
+    redis_mode = 'sentinel'
+    
+    def __init__(self, host, port, sentinels, name=None):
+        super().__init__(host, port, name)
+        self.sentinels = sentinels
+    
+    def _master_state(self):
+        master = self.sentinels.group.master
+        flags = 'master' if master.alive else 's_down,o_down,master'
+        return {
+            'name': self.sentinels.master_name,
+            'ip': master.host,
+            'port': master.port,
+            'runid': master.name,
+            'flags': flags,
+            'link-pending-commands': 0,
+            'link-refcount': 1,
+            'last-ping-sent': 0,
+            'last-ok-ping-reply': 0,
+            'last-ping-reply': 0,
+            'down-after-milliseconds': self.sentinels.down_after_ms,
+            'info-refresh': 0,
+            'role-reported': 'master',
+            'role-reported-time': 0,
+            'config-epoch': self.sentinels.epoch,
+            'num-slaves': len(self.sentinels.group.replicas_of(master)),
+            'num-other-sentinels': len(self.sentinels.nodes) - 1,
+            'quorum': self.sentinels.quorum,
+            'failover-timeout': FAILOVER_TIMEOUT_MS,
+            'parallel-syncs': 1
+        }
+    
+    def _replica_state(self, replica):
+        master = self.sentinels.group.master
+        return {
+            'name': f"{replica.host}:{replica.port}",
+            'ip': replica.host,
+            'port': replica.port,
+            'runid': replica.name,
+            'flags': 'slave' if replica.alive else 's_down,slave',
+            'master-link-status': 'ok' if master.alive else 'err',
+            'master-host': master.host,
+            'master-port': master.port,
+            'slave-priority': 100,
+            'slave-repl-offset': replica.repl_offset
+        }
+    
+    def cmd_sentinel(self, conn, subcommand, *args):
+        subcommand = subcommand.lower()
+        if args and subcommand not in (b'masters', b'myid') and args[0].decode() != self.sentinels.master_name:
+            if subcommand == b'get-master-addr-by-name':
+                return None
+            raise RespError("ERR No such master with that name")
+        if subcommand == b'get-master-addr-by-name':
+            master = self.sentinels.group.master
+            return [master.host, str(master.port)]
+        if subcommand == b'masters':
+            return [self._master_state()]
+        if subcommand == b'master':
+            return self._master_state()
+        if subcommand in (b'slaves', b'replicas'):
+            group = self.sentinels.group
+            return [self._replica_state(replica) for replica in group.replicas_of(group.master)]
+        if subcommand == b'sentinels':
+            return [
+                {'name': node.name, 'ip': node.host, 'port': node.port, 'runid': node.name, 'flags': 'sentinel'}
+                for node in self.sentinels.nodes if node is not self
+            ]
+        if subcommand == b'failover':
+            if self.sentinels.failing_over:
+                raise RespError("INPROG Failover already in progress")
+            if self.sentinels.group.best_replica() is None:
+                raise RespError("NOGOODSLAVE No suitable replica to promote")
+            self.sentinels.trigger_failover()
+            return OK
+        if subcommand == b'ckquorum':
+            usable = sum(1 for node in self.sentinels.nodes if node.alive)
+            return f"OK {usable} usable Sentinels. Quorum and failover authorization can be reached"
+        if subcommand == b'myid':
+            return self.name
+        raise RespError(f"ERR Unknown sentinel subcommand '{subcommand.decode()}'")
+    
+    def info_sections(self):
+        sections = super().info_sections()
+        master = self.sentinels.group.master
+        sections['sentinel'] = {
+            'sentinel_masters': 1,
+            'sentinel_tilt': 0,
+            'sentinel_running_scripts': 0,
+            'sentinel_scripts_queue_length': 0,
+            'master0': (
+                f"name={self.sentinels.master_name},status={'ok' if master.alive else 'odown'},"
+                f"address={master.host}:{master.port},"
+                f"slaves={len(self.sentinels.group.replicas_of(master))},sentinels={len(self.sentinels.nodes)}"
+            )
+        }
+        return sections
+
+class SentinelGroup:
+    """Sentinels monitoring one ReplicationGroup"""
+    
+    def __init__(self, group, host, ports, master_name='mymaster', down_after_ms=DOWN_AFTER_MS, quorum=QUORUM):
+        self.group = group
+        self.master_name = master_name
+        self.down_after_ms = down_after_ms
+        self.quorum = quorum
+        self.epoch = 0
+        self.failing_over = False
+        self.failovers = []  # (old address, new address, seconds taken) per completed failover
+        self.nodes = [SentinelNode(host, port, self, name=f"sentinel-{i}") for i, port in enumerate(ports, 1)]
+        self._monitor_task = None
+        self._failover_task = None
+    
+    async def start(self):
+        for node in self.nodes:
+            await node.start()
+        self._monitor_task = asyncio.get_running_loop().create_task(self._monitor())
+        return self
+    
+    async def stop(self):
+        for task in (self._monitor_task, self._failover_task):
+            if task is not None:
+                task.cancel()
+        for node in self.nodes:
+            await node.stop()
+    
+    def publish(self, channel, message):
+        """Publish an event on every live sentinel"""
+        for node in self.nodes:
+            if node.alive:
+                node.publish(channel, message)
+    
+    def trigger_failover(self, forced=True):
+        """Start a failover now (SENTINEL FAILOVER) unless one is running"""
+        if not self.failing_over:
+            self.failing_over = True
+            self._failover_task = asyncio.get_running_loop().create_task(self._failover(forced))
+    
+    async def _monitor(self):
+        """Declare the master down once it has been unreachable for down_after_ms"""
+        down_since = None
+        while True:
+            await asyncio.sleep(MONITOR_INTERVAL)
+            if self.failing_over or self.group.master.alive:
+                down_since = None
+                continue
+            if down_since is None:
+                down_since = time.monotonic()
+            elif (time.monotonic() - down_since) * 1000 >= self.down_after_ms:
+                down_since = None
+                self.trigger_failover(forced=False)
+    
+    async def _failover(self, forced):
+        started = time.monotonic()
+        old_master = self.group.master
+        address = f"{old_master.host} {old_master.port}"
+        try:
+            if not forced:
+                self.publish('+sdown', f"master {self.master_name} {address}")
+                await asyncio.sleep(EVENT_STAGGER)
+                self.publish('+odown', f"master {self.master_name} {address} #quorum {self.quorum}/{self.quorum}")
+                await asyncio.sleep(EVENT_STAGGER)
+            self.epoch += 1
+            self.publish('+new-epoch', str(self.epoch))
+            self.publish('+try-failover', f"master {self.master_name} {address}")
+            await asyncio.sleep(EVENT_STAGGER)
+            self.publish('+elected-leader', f"master {self.master_name} {address}")
+            await asyncio.sleep(EVENT_STAGGER)
+            
+            new_master = self.group.best_replica()
+            if new_master is None:
+                self.publish('-failover-abort-no-good-slave', f"master {self.master_name} {address}")
+                return
+            self.publish('+selected-slave', f"slave {new_master.host}:{new_master.port} {new_master.host} {new_master.port} @ {self.master_name} {address}")
+            self.group.promote(new_master)
+            await asyncio.sleep(EVENT_STAGGER)
+            self.publish(
+                '+switch-master',
+                f"{self.master_name} {old_master.host} {old_master.port} {new_master.host} {new_master.port}"
+            )
+            self.failovers.append((old_master.address, new_master.address, time.monotonic() - started))
+        finally:
+            self.failing_over = False
@@ -0,0 +1,529 @@
+"""
+Base asyncio RESP server with a small in-memory keyspace
+Subclasses add replication, sentinel and cluster behaviour by defining
+cmd_<name> handlers and overriding the routing / write hooks.
+"""
+
+import asyncio
+import fnmatch
+import inspect
+import itertools
+import time
+from collections import deque
+from .protocol import RespError, SimpleString, Push, OK, QUEUED, PONG, read_command, encode
+
+# name: (arity, flags, first key, last key, step), the subset of COMMAND that clients need
+COMMAND_TABLE = {
+    'get': (2, ['readonly', 'fast'], 1, 1, 1),
+    'set': (-3, ['write', 'denyoom'], 1, 1, 1),
+    'setex': (4, ['write', 'denyoom'], 1, 1, 1),
+    'mget': (-2, ['readonly', 'fast'], 1, -1, 1),
+    'mset': (-3, ['write', 'denyoom'], 1, -1, 2),
+    'del': (-2, ['write'], 1, -1, 1),
+    'unlink': (-2, ['write', 'fast'], 1, -1, 1),
+    'exists': (-2, ['readonly', 'fast'], 1, -1, 1),
+    'incr': (2, ['write', 'denyoom', 'fast'], 1, 1, 1),
+    'type': (2, ['readonly', 'fast'], 1, 1, 1),
+    'ping': (-1, ['fast'], 0, 0, 0),
+    'hello': (-1, ['noscript', 'loading', 'stale', 'fast'], 0, 0, 0),
+    'echo': (2, ['fast'], 0, 0, 0),
+    'info': (-1, ['loading', 'stale'], 0, 0, 0),
+    'dbsize': (1, ['readonly', 'fast'], 0, 0, 0),
+    'flushdb': (-1, ['write'], 0, 0, 0),
+    'flushall': (-1, ['write'], 0, 0, 0),
+    'keys': (2, ['readonly'], 0, 0, 0),
+    'wait': (3, [], 0, 0, 0),
+    'client': (-2, ['admin', 'noscript'], 0, 0, 0),
+    'command': (-1, ['loading', 'stale'], 0, 0, 0),
+    'config': (-2, ['admin', 'noscript'], 0, 0, 0),
+    'select': (2, ['loading', 'fast'], 0, 0, 0),
+    'multi': (1, ['noscript', 'fast'], 0, 0, 0),
+    'exec': (1, ['noscript'], 0, 0, 0),
+    'discard': (1, ['noscript', 'fast'], 0, 0, 0),
+    'subscribe': (-2, ['pubsub', 'noscript'], 0, 0, 0),
+    'unsubscribe': (-1, ['pubsub', 'noscript'], 0, 0, 0),
+    'psubscribe': (-2, ['pubsub', 'noscript'], 0, 0, 0),
+    'punsubscribe': (-1, ['pubsub', 'noscript'], 0, 0, 0),
+    'publish': (3, ['pubsub', 'fast'], 0, 0, 0),
+    'shutdown': (-1, ['admin', 'noscript'], 0, 0, 0),
+    'debug': (-2, ['admin', 'noscript'], 0, 0, 0),
+    'role': (1, ['noscript', 'fast'], 0, 0, 0),
+    'slowlog': (-2, ['admin'], 0, 0, 0),
+    'latency': (-2, ['admin'], 0, 0, 0),
+    'replicaof': (3, ['admin', 'noscript', 'stale'], 0, 0, 0),
+    'slaveof': (3, ['admin', 'noscript', 'stale'], 0, 0, 0),
+    'sentinel': (-2, ['admin', 'loading', 'stale'], 0, 0, 0),
+    'cluster': (-2, [], 0, 0, 0),
+    'asking': (1, ['fast'], 0, 0, 0),
+    'readonly': (1, ['loading', 'stale', 'fast'], 0, 0, 0),
+    'readwrite': (1, ['loading', 'stale', 'fast'], 0, 0, 0),
+    'migrate': (-6, ['write', 'movablekeys'], 3, 3, 1),
+}
+
+WRITE_COMMANDS = {name for name, spec in COMMAND_TABLE.items() if 'write' in spec[1]}
+TCP_BACKLOG = 511  # Same as redis.conf tcp-backlog
+BASE_MEMORY = 1024 * 1024  # used_memory of an empty instance, key and value bytes are added on top
+SLOWLOG_SLOWER_THAN_US = 10000  # Same defaults as redis.conf slowlog-log-slower-than / slowlog-max-len
+SLOWLOG_MAX_LEN = 128
+
+class _NoReply:
+    """Marker for commands whose replies were already pushed (SUBSCRIBE) or never come (SHUTDOWN)"""
+
+_NO_REPLY = _NoReply()
+
+class Connection:
+    """Per-client state"""
+    
+    _ids = itertools.count(1)
+    
+    def __init__(self, writer):
+        self.id = next(self._ids)
+        self.writer = writer
+        self.name = None
+        self.protocol = 2  # switched by HELLO
+        self.multi = None  # queued commands while inside MULTI
+        self.asking = False
+        self.readonly = False
+        self.channels = set()
+        self.patterns = set()
+    
+    def push(self, message):
+        """Write an out-of-band (pub/sub) message"""
+        if not self.writer.is_closing():
+            self.writer.write(encode(Push(message), self.protocol))
+
+class RespServer:
+    """asyncio RESP server; subclasses extend the cmd_* handlers"""
+    
+    redis_version = '7.2.4'
+    redis_mode = 'standalone'
+    
+    def __init__(self, host, port, name=None):
+        self.host = host
+        self.port = port
+        self.name = name or f"{host}:{port}"
+        self.alive = False
+        self.started_at = time.time()
+        self.connections = set()
+        self.commands_processed = 0
+        self._ops_sample = (time.monotonic(), 0)  # (when, commands_processed) for instantaneous_ops_per_sec
+        self._ops_per_sec = 0
+        self.command_stats = {}  # command -> [calls, nanoseconds], INFO commandstats
+        self.slowlog = deque(maxlen=SLOWLOG_MAX_LEN)
+        self._slowlog_ids = itertools.count()
+        self._server = None
+    
+    @property
+    def address(self):
+        return self.host, self.port
+    
+    async def start(self):
+        """Start listening"""
+        self._server = await asyncio.start_server(
+            self._serve, self.host, self.port, reuse_address=True, backlog=TCP_BACKLOG
+        )
+        self.alive = True
+        self.started_at = time.time()
+        return self
+    
+    async def stop(self):
+        """Stop listening and drop every client, like a killed process"""
+        self.alive = False
+        if self._server is not None:
+            self._server.close()
+        for conn in list(self.connections):
+            conn.writer.close()
+        if self._server is not None:
+            await self._server.wait_closed()
+            self._server = None
+    
+    async def _serve(self, reader, writer):
+        conn = Connection(writer)
+        self.connections.add(conn)
+        try:
+            while self.alive:
+                try:
+                    args = await read_command(reader)
+                except RespError as e:
+                    writer.write(encode(e))
+                    break
+                if args is None:
+                    break
+                if not args:
+                    continue
+                reply = await self.execute(conn, args)
+                if reply is not _NO_REPLY:
+                    writer.write(encode(reply, conn.protocol))
+                await writer.drain()
+                if args[0].upper() == b'QUIT':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections.discard(conn)
+            self.on_disconnect(conn)
+            writer.close()
+    
+    def on_disconnect(self, conn):
+        """Hook for subclasses tracking per-connection state"""
+    
+    async def execute(self, conn, args):
+        """Run one command and return its reply (errors become RespError replies)"""
+        name = args[0].decode(errors='replace').lower()
+        self.commands_processed += 1
+        
+        if conn.multi is not None and name not in ('exec', 'discard', 'multi', 'watch'):
+            conn.multi.append(args)
+            return QUEUED
+        if (conn.channels or conn.patterns) and name not in (
+            'subscribe', 'unsubscribe', 'psubscribe', 'punsubscribe', 'ping', 'quit'
+        ):
+            return RespError(f"ERR Can't execute '{name}': only (P|S)SUBSCRIBE / (P|S)UNSUBSCRIBE / PING / QUIT are allowed in this context")
+        
+        handler = getattr(self, f"cmd_{name.replace('-', '_')}", None)
+        if handler is None:
+            return RespError(f"ERR unknown command '{name}', with args beginning with: ")
+        try:
+            start_ns = time.perf_counter_ns()
+            reply = handler(conn, *args[1:])
+            # Blocking commands count only their synchronous part, like Redis
+            self.record_call(name, args, time.perf_counter_ns() - start_ns)
+            if inspect.isawaitable(reply):
+                reply = await reply
+            return reply
+        except RespError as e:
+            return e
+        except (TypeError, ValueError, IndexError) as e:
+            return RespError(f"ERR wrong number of arguments or invalid argument for '{name}' command ({e})")
+        finally:
+            if name != 'asking':
+                conn.asking = False
+    
+    def record_call(self, name, args, duration_ns):
+        """Account a command in commandstats and the slowlog"""
+        stats = self.command_stats.get(name)
+        if stats is None:
+            stats = self.command_stats[name] = [0, 0]
+        stats[0] += 1
+        stats[1] += duration_ns
+        if duration_ns >= SLOWLOG_SLOWER_THAN_US * 1000:
+            self.slowlog.appendleft([
+                next(self._slowlog_ids), int(time.time()), duration_ns // 1000, list(args[:32]), b'', b''
+            ])
+    
+    # Connection and server commands
+    
+    def cmd_ping(self, conn, message=None):
+        if (conn.channels or conn.patterns) and conn.protocol == 2:
+            return [b'pong', message or b'']
+        return message if message is not None else PONG
+    
+    def cmd_echo(self, conn, message):
+        return message
+    
+    def cmd_hello(self, conn, protover=None, *args):
+        if protover is not None:
+            if protover not in (b'2', b'3'):
+                raise RespError("NOPROTO unsupported protocol version")
+            conn.protocol = int(protover)
+        return {
+            'server': 'redis',
+            'version': self.redis_version,
+            'proto': conn.protocol,
+            'id': conn.id,
+            'mode': self.redis_mode,
+            'role': getattr(self, 'role', 'master'),
+            'modules': []
+        }
+    
+    def cmd_quit(self, conn):
+        return OK
+    
+    def cmd_select(self, conn, db):
+        if int(db) != 0:
+            raise RespError("ERR DB index is out of range")
+        return OK
+    
+    def cmd_client(self, conn, subcommand, *args):
+        subcommand = subcommand.upper()
+        if subcommand == b'SETNAME':
+            conn.name = args[0]
+            return OK
+        if subcommand == b'GETNAME':
+            return conn.name
+        if subcommand == b'ID':
+            return conn.id
+        return OK  # SETINFO, NO-EVICT, TRACKING ... accepted and ignored
+    
+    def cmd_command(self, conn, *args):
+        if args and args[0].upper() == b'COUNT':
+            return len(COMMAND_TABLE)
+        if args and args[0].upper() == b'DOCS':
+            return []
+        return [
+            [name, arity, flags, first, last, step]
+            for name, (arity, flags, first, last, step) in COMMAND_TABLE.items()
+        ]
+    
+    def cmd_config(self, conn, subcommand, *args):
+        if subcommand.upper() == b'GET':
+            return []
+        return OK
+    
+    def cmd_debug(self, conn, subcommand, *args):
+        if subcommand.upper() == b'SLEEP':
+            return self._debug_sleep(float(args[0]))
+        raise RespError("ERR DEBUG subcommand not supported by the emulator")
+    
+    async def _debug_sleep(self, seconds):
+        # Blocks this client only; the real server would block everyone
+        await asyncio.sleep(seconds)
+        return OK
+    
+    def cmd_shutdown(self, conn, *args):
+        """Emulates the node dying (docker stop): listener closed, clients dropped"""
+        asyncio.get_running_loop().create_task(self.stop())
+        return _NO_REPLY
+    
+    def cmd_slowlog(self, conn, subcommand, *args):
+        subcommand = subcommand.upper()
+        if subcommand == b'LEN':
+            return len(self.slowlog)
+        if subcommand == b'GET':
+            count = int(args[0]) if args else 10
+            return list(self.slowlog) if count < 0 else list(self.slowlog)[:count]
+        if subcommand == b'RESET':
+            self.slowlog.clear()
+        return OK
+    
+    def cmd_latency(self, conn, subcommand, *args):
+        if subcommand.upper() in (b'LATEST', b'HISTORY'):
+            return []
+        return OK
+    
+    def info_sections(self):
+        """Ordered {section: {field: value}} for INFO, extended by subclasses"""
+        return {
+            'server': {
+                'redis_version': self.redis_version,
+                'redis_mode': self.redis_mode,
+                'tcp_port': self.port,
+                'uptime_in_seconds': int(time.time() - self.started_at),
+                'emulator': 'resp_emulator'
+            },
+            'clients': {'connected_clients': len(self.connections)},
+            'stats': {
+                'total_commands_processed': self.commands_processed,
+                'instantaneous_ops_per_sec': self.instantaneous_ops_per_sec()
+            },
+            'commandstats': {
+                f"cmdstat_{name}": (
+                    f"calls={calls},usec={duration_ns // 1000},usec_per_call={duration_ns / 1000 / calls:.2f},"
+                    f"rejected_calls=0,failed_calls=0"
+                )
+                for name, (calls, duration_ns) in self.command_stats.items()
+            }
+        }
+    
+    def instantaneous_ops_per_sec(self):
+        """Command rate since the previous sample, resampled at most every 100 ms like serverCron"""
+        now = time.monotonic()
+        when, processed = self._ops_sample
+        if now - when >= 0.1:
+            self._ops_per_sec = int((self.commands_processed - processed) / (now - when))
+            self._ops_sample = (now, self.commands_processed)
+        return self._ops_per_sec
+    
+    def cmd_info(self, conn, *sections):
+        wanted = {section.decode().lower() for section in sections} - {'all', 'everything', 'default'}
+        everything = bool({section.lower() for section in sections} & {b'all', b'everything'})
+        lines = []
+        for section, fields in self.info_sections().items():
+            if wanted and section not in wanted:
+                continue
+            if not wanted and section == 'commandstats' and not everything:
+                continue  # Not part of the default sections
+            lines.append(f"# {section.capitalize()}")
+            lines.extend(f"{key}:{value}" for key, value in fields.items())
+            lines.append('')
+        return '\r\n'.join(lines)
+    
+    # Transactions
+    
+    def cmd_multi(self, conn):
+        if conn.multi is not None:
+            raise RespError("ERR MULTI calls can not be nested")
+        conn.multi = []
+        return OK
+    
+    def cmd_discard(self, conn):
+        if conn.multi is None:
+            raise RespError("ERR DISCARD without MULTI")
+        conn.multi = None
+        return OK
+    
+    async def cmd_exec(self, conn):
+        if conn.multi is None:
+            raise RespError("ERR EXEC without MULTI")
+        queued, conn.multi = conn.multi, None
+        return [await self.execute(conn, args) for args in queued]
+    
+    # Pub/sub
+    
+    def cmd_subscribe(self, conn, *channels):
+        for channel in channels:
+            conn.channels.add(channel)
+            conn.push([b'subscribe', channel, len(conn.channels) + len(conn.patterns)])
+        return _NO_REPLY
+    
+    def cmd_psubscribe(self, conn, *patterns):
+        for pattern in patterns:
+            conn.patterns.add(pattern)
+            conn.push([b'psubscribe', pattern, len(conn.channels) + len(conn.patterns)])
+        return _NO_REPLY
+    
+    def cmd_unsubscribe(self, conn, *channels):
+        for channel in channels or list(conn.channels) or [None]:
+            conn.channels.discard(channel)
+            conn.push([b'unsubscribe', channel, len(conn.channels) + len(conn.patterns)])
+        return _NO_REPLY
+    
+    def cmd_punsubscribe(self, conn, *patterns):
+        for pattern in patterns or list(conn.patterns) or [None]:
+            conn.patterns.discard(pattern)
+            conn.push([b'punsubscribe', pattern, len(conn.channels) + len(conn.patterns)])
+        return _NO_REPLY
+    
+    def publish(self, channel, message):
+        """Deliver a message to subscribers of this server, return the receiver count"""
+        if isinstance(channel, str):
+            channel = channel.encode()
+        if isinstance(message, str):
+            message = message.encode()
+        receivers = 0
+        for conn in list(self.connections):
+            if channel in conn.channels:
+                conn.push([b'message', channel, message])
+                receivers += 1
+            for pattern in conn.patterns:
+                if fnmatch.fnmatchcase(channel.decode(errors='replace'), pattern.decode(errors='replace')):
+                    conn.push([b'pmessage', pattern, channel, message])
+                    receivers += 1
+        return receivers
+    
+    def cmd_publish(self, conn, channel, message):
+        return self.publish(channel, message)
+
+class KeyspaceServer(RespServer):
+    """RespServer with string keys; every write goes through apply_write()"""
+    
+    def __init__(self, host, port, name=None):
+        super().__init__(host, port, name)
+        self.data = {}
+    
+    def check_write(self, conn, name, keys):
+        """Raise RespError to reject a write (READONLY replicas, cluster redirects)"""
+    
+    def check_read(self, conn, name, keys):
+        """Raise RespError to reject a read (cluster redirects)"""
+    
+    def apply_write(self, args):
+        """Apply a write command to the local data, return its reply"""
+        name = args[0].lower()
+        if name == b'set':
+            key, value, options = args[1], args[2], [arg.upper() for arg in args[3:]]
+            if b'NX' in options and key in self.data:
+                return None
+            if b'XX' in options and key not in self.data:
+                return None
+            old = self.data.get(key)
+            self.data[key] = value
+            return old if b'GET' in options else OK
+        if name == b'setex':
+            self.data[args[1]] = args[3]
+            return OK
+        if name == b'mset':
+            for i in range(1, len(args), 2):
+                self.data[args[i]] = args[i + 1]
+            return OK
+        if name in (b'del', b'unlink'):
+            removed = 0
+            for key in args[1:]:
+                if self.data.pop(key, None) is not None:
+                    removed += 1
+            return removed
+        if name == b'incr':
+            value = int(self.data.get(args[1], b'0')) + 1
+            self.data[args[1]] = str(value).encode()
+            return value
+        if name in (b'flushdb', b'flushall'):
+            self.data.clear()
+            return OK
+        raise RespError(f"ERR unsupported write {name!r}")
+    
+    def write(self, conn, args, keys):
+        """Validate and apply a client write; subclasses propagate it afterwards"""
+        self.check_write(conn, args[0].decode().lower(), keys)
+        return self.apply_write(args)
+    
+    def cmd_get(self, conn, key):
+        self.check_read(conn, 'get', [key])
+        return self.data.get(key)
+    
+    def cmd_mget(self, conn, *keys):
+        if not keys:
+            raise ValueError("no keys")
+        self.check_read(conn, 'mget', keys)
+        return [self.data.get(key) for key in keys]
+    
+    def cmd_exists(self, conn, *keys):
+        self.check_read(conn, 'exists', keys)
+        return sum(1 for key in keys if key in self.data)
+    
+    def cmd_type(self, conn, key):
+        self.check_read(conn, 'type', [key])
+        return SimpleString('string' if key in self.data else 'none')
+    
+    def cmd_dbsize(self, conn):
+        return len(self.data)
+    
+    def cmd_keys(self, conn, pattern):
+        pattern = pattern.decode(errors='replace')
+        return [key for key in self.data if fnmatch.fnmatchcase(key.decode(errors='replace'), pattern)]
+    
+    def cmd_set(self, conn, key, value, *options):
+        return self.write(conn, [b'SET', key, value, *options], [key])
+    
+    def cmd_setex(self, conn, key, seconds, value):
+        return self.write(conn, [b'SETEX', key, seconds, value], [key])
+    
+    def cmd_mset(self, conn, *pairs):
+        if not pairs or len(pairs) % 2:
+            raise ValueError("MSET needs key value pairs")
+        return self.write(conn, [b'MSET', *pairs], pairs[::2])
+    
+    def cmd_del(self, conn, *keys):
+        return self.write(conn, [b'DEL', *keys], keys)
+    
+    def cmd_unlink(self, conn, *keys):
+        return self.write(conn, [b'UNLINK', *keys], keys)
+    
+    def cmd_incr(self, conn, key):
+        return self.write(conn, [b'INCR', key], [key])
+    
+    def cmd_flushdb(self, conn, *args):
+        return self.write(conn, [b'FLUSHDB'], [])
+    
+    def cmd_flushall(self, conn, *args):
+        return self.write(conn, [b'FLUSHALL'], [])
+    
+    def info_sections(self):
+        sections = super().info_sections()
+        used_memory = BASE_MEMORY + sum(len(key) + len(value) for key, value in self.data.items())
+        sections['memory'] = {'used_memory': used_memory, 'used_memory_human': f"{used_memory / (1 << 20):.2f}M"}
+        sections['persistence'] = {
+            'loading': 0, 'rdb_bgsave_in_progress': 0, 'aof_enabled': 0,
+            'aof_rewrite_in_progress': 0, 'aof_rewrite_scheduled': 0
+        }
+        sections['keyspace'] = {'db0': f"keys={len(self.data)},expires=0,avg_ttl=0"} if self.data else {}
+        return sections
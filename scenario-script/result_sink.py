@@ -0,0 +1,147 @@
+"""
+Streaming result sink (JSON Lines)
+Every sample and event is appended as one JSON object per line and flushed
+periodically, so a crashed run still leaves its data on disk and memory does
+not grow with the number of keys. Collectors keep only running counts and a
+small sample for the final summary record.
+"""
+
+import json
+import os
+import time
+
+FLUSH_INTERVAL = 1.0  # seconds between flushes
+FLUSH_EVERY = 10000  # records between flushes, whichever comes first
+SAMPLE_SIZE = 10  # items kept in memory per collector for the summary
+TAIL_CHUNK = 64 * 1024  # bytes read per step when looking for the last record
+
+class ResultSink:
+    """Append-only JSON Lines writer with periodic flushes and per-type counters"""
+    
+    def __init__(self, path, scenario, flush_interval=FLUSH_INTERVAL, flush_every=FLUSH_EVERY):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_every = flush_every
+        self.counts = {}  # record type -> records written
+        self._file = open(path, 'w', encoding='utf-8')
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+        self.write('meta', scenario=scenario, started_at=time.time())
+    
+    def write(self, record_type, **fields):
+        """Append one record of the given type"""
+        fields['type'] = record_type
+        self._file.write(json.dumps(fields, default=str, separators=(',', ':')))
+        self._file.write('\n')
+        self.counts[record_type] = self.counts.get(record_type, 0) + 1
+        
+        self._unflushed += 1
+        if self._unflushed >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+    
+    def flush(self):
+        """Push buffered records to the OS"""
+        self._file.flush()
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+    
+    def collector(self, record_type, sample_size=SAMPLE_SIZE, **context):
+        """List-like collector that streams items instead of keeping them"""
+        return SampleCollector(self, record_type, sample_size, context)
+    
+    def close(self, result=None):
+        """Write the final summary record (the old single JSON document) and close the file"""
+        if result is not None:
+            self.write('result', record_counts=dict(self.counts), **result)
+        self.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, traceback):
+        if not self._file.closed:
+            self.close()
+        return False
+
+class SampleCollector:
+    """Drop-in for an ever-growing list: counts items, keeps the first few, streams all"""
+    
+    def __init__(self, sink, record_type, sample_size, context):
+        self.sink = sink
+        self.record_type = record_type
+        self.sample_size = sample_size
+        self.context = context  # extra fields written with every item
+        self.count = 0
+        self.sample = []
+    
+    def append(self, item):
+        """Stream one item (a dict is merged into the record, anything else goes under 'value')"""
+        self.count += 1
+        if len(self.sample) < self.sample_size:
+            self.sample.append(item)
+        if isinstance(item, dict):
+            self.sink.write(self.record_type, **self.context, **item)
+        else:
+            self.sink.write(self.record_type, **self.context, value=item)
+    
+    def extend(self, items):
+        """Stream every item of an iterable"""
+        for item in items:
+            self.append(item)
+    
+    def __len__(self):
+        return self.count
+    
+    def __bool__(self):
+        return self.count > 0
+
+def read_records(path, record_type=None):
+    """Yield records from a JSON Lines result file, optionally of one type only"""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            if record_type is not None and f'"type":"{record_type}"' not in line:
+                continue  # skip decoding records that are not wanted
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                break  # last line of a crashed run may be truncated
+            if record_type is None or record.get('type') == record_type:
+                yield record
+
+def read_last_record(path):
+    """Last line of a JSON Lines file decoded, reading backwards from the end instead of scanning the file"""
+    with open(path, 'rb') as f:
+        position = f.seek(0, os.SEEK_END)
+        tail = b''
+        chunk = TAIL_CHUNK
+        while position > 0:
+            step = min(chunk, position)
+            position -= step
+            f.seek(position)
+            tail = f.read(step) + tail
+            lines = tail.rstrip(b'\n').rsplit(b'\n', 1)
+            if len(lines) == 2 or position == 0:
+                try:
+                    return json.loads(lines[-1])
+                except json.JSONDecodeError:
+                    return None  # truncated by a crash
+            chunk *= 2  # the result record can be large, grow the steps
+    return None
+
+def load_result(path):
+    """Final summary of a run: the 'result' record of a .jsonl file or a legacy .json document"""
+    if path.endswith('.json'):
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    # The result record is written last, so normally only the end of the file is read
+    last = read_last_record(path)
+    if last is not None and last.get('type') == 'result':
+        return last
+    result = None
+    for record in read_records(path, 'result'):
+        result = record
+    return result
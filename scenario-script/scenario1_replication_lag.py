@@ -5,21 +5,62 @@ Tujuan: Mengamati konsistensi antara master dan replica
 Aspek: Eventual consistency, replication delay
 """
 
+import os
 import redis
 import time
 from datetime import datetime
-import json
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from async_engine import ASYNC_CONCURRENCY, connect_redis_async, snapshot, run_bounded, close_all
+from latency_histogram import LatencyHistogram, format_summary
+from result_sink import ResultSink
+from sync_state import SyncStateStore
+from payload import DEFAULT_VALUE_SIZE, SWEEP_SIZES, PayloadGenerator, payload_sweep, print_payload_sweep
+from metrics_sampler import SAMPLE_INTERVAL, start_sampling, finish_sampling
 
 # Configuration
-REDIS_MASTER_HOST = '134.209.106.37'  # IP VPS2
+VPS2_HOST = os.environ.get('REPLICATION_HOST', '134.209.106.37')  # 127.0.0.1 with python -m resp_emulator
+REDIS_MASTER_HOST = VPS2_HOST  # IP VPS2
 REDIS_MASTER_PORT = 6379
-REDIS_REPLICA_1_HOST = '134.209.106.37'  # IP VPS2
+REDIS_REPLICA_1_HOST = VPS2_HOST  # IP VPS2
 REDIS_REPLICA_1_PORT = 6380
-REDIS_REPLICA_2_HOST = '134.209.106.37'  # IP VPS2
+REDIS_REPLICA_2_HOST = VPS2_HOST  # IP VPS2
 REDIS_REPLICA_2_PORT = 6381
 
 NUM_WRITES = 1000
 
+# 'sync' uses blocking clients; 'async' drives all nodes concurrently via redis.asyncio
+EXECUTION_MODE = 'sync'
+
+# Write engine: 'single' (one SET per key), 'pipeline' or 'mset'
+WRITE_MODE = 'pipeline'
+BATCH_SIZES = [1, 10, 100, 1000]  # Each batch size gets its own write + immediate check run
+TRANSACTIONAL = False  # Wrap every batch in MULTI/EXEC
+VALUE_SIZE = DEFAULT_VALUE_SIZE  # Bytes per value, sequence/timestamp header included
+
+# Value size sweep (see payload.py): write throughput and replica catch-up per size, empty skips it
+PAYLOAD_SWEEP_SIZES = SWEEP_SIZES
+
+# Consistency cost: WAIT numreplicas after every batch (batch size 1 = after every write).
+# 0 is the asynchronous baseline (no WAIT sent); empty skips the sweep
+WAIT_NUMREPLICAS = [0, 1, 2]
+WAIT_BATCH_SIZES = [1, 10, 100]
+WAIT_TIMEOUT_MS = 1000  # A WAIT that returns fewer replicas than asked for counts as a timeout
+
+VERIFY_CHUNK_SIZE = 1000  # Keys fetched per MGET when verifying replicas
+
+CONVERGENCE_TIMEOUT = 30  # seconds to wait for replicas to reach the master offset
+CONVERGENCE_POLL_INTERVAL = 0.001  # seconds between INFO replication polls
+
+# Histogram samples are round trips, not single commands: p99 is the slowest batches/chunks
+LATENCY_UNIT = 'round_trip'  # write: pipeline/MSET batch, read: MGET chunk, probe: INFO replication
+
+SYNC_RECHECK_PASSES = 10  # Re-check passes over still-unsynced keys after the immediate check
+SYNC_RECHECK_INTERVAL = 0.05  # seconds between re-check passes
+
+# Server-side INFO timeline (see metrics_sampler.py), exported with the results; 0 disables it
+METRICS_SAMPLE_INTERVAL = SAMPLE_INTERVAL  # seconds
+
 def connect_redis(host, port, name):
     """Connect to Redis instance"""
     try:
@@ -31,79 +72,556 @@ def connect_redis(host, port, name):
         print(f"✗ Failed to connect to {name}: {e}")
         return None
 
-def run_scenario_1():
-    """Run replication lag and consistency test"""
-    print("\n" + "="*70)
-    print("SKENARIO 1: REPLICATION LAG & CONSISTENCY TEST")
-    print("="*70 + "\n")
+def write_batch(master, batch, mode=WRITE_MODE, transactional=TRANSACTIONAL):
+    """Send one batch of (key, value) pairs to the master"""
+    if mode == 'mset':
+        if transactional:
+            pipe = master.pipeline(transaction=True)
+            pipe.mset(dict(batch))
+            pipe.execute()
+        else:
+            master.mset(dict(batch))
+    elif mode == 'pipeline':
+        pipe = master.pipeline(transaction=transactional)
+        for key, value in batch:
+            pipe.set(key, value)
+        pipe.execute()
+    else:
+        for key, value in batch:
+            master.set(key, value)
+
+def write_keys(master, num_writes, batch_size, mode=WRITE_MODE, transactional=TRANSACTIONAL, latency=None, sync_state=None):
+    """Write test keys to master in batches, return duration in seconds"""
+    progress_step = max(num_writes // 10, 1)
+    batch = []
+    # One reusable buffer per batch slot, each batch is sent before its buffers come round again
+    payload = PayloadGenerator(VALUE_SIZE, ring=batch_size)
     
-    # Connect to Redis instances
-    master = connect_redis(REDIS_MASTER_HOST, REDIS_MASTER_PORT, "Master")
-    replica1 = connect_redis(REDIS_REPLICA_1_HOST, REDIS_REPLICA_1_PORT, "Replica 1")
-    replica2 = connect_redis(REDIS_REPLICA_2_HOST, REDIS_REPLICA_2_PORT, "Replica 2")
+    start_time = time.time()
+    for i in range(num_writes):
+        key = f"test_key:{i}"
+        value = payload.buffer(i)
+        batch.append((key, value))
+        
+        if len(batch) >= batch_size or i == num_writes - 1:
+            op_start = time.perf_counter_ns()
+            write_batch(master, batch, mode, transactional)
+            if latency is not None:
+                # One sample per round trip (a whole pipeline/MSET batch)
+                latency.record_ns(time.perf_counter_ns() - op_start)
+            if sync_state is not None:
+                sync_state.record_batch_written(i // batch_size)
+            batch = []
+        
+        if (i + 1) % progress_step == 0:
+            print(f"  Written {i + 1}/{num_writes} keys...")
     
-    if not all([master, replica1, replica2]):
-        print("\n✗ Cannot proceed: Failed to connect to all Redis instances")
-        return
+    return time.time() - start_time
+
+def check_consistency(master, replica1, replica2, num_writes, missing_keys=None, chunk_size=VERIFY_CHUNK_SIZE, latency=None, sync_state=None):
+    """Compare every test key on both replicas against the master using chunked MGET"""
+    results = {
+        'replica1': {'synced': 0, 'missing': 0, 'mismatched': 0},
+        'replica2': {'synced': 0, 'missing': 0, 'mismatched': 0}
+    }
+    replicas = {'replica1': replica1, 'replica2': replica2}
     
-    print(f"\nStarting test at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"Writing {NUM_WRITES} keys to master...\n")
+    for start in range(0, num_writes, chunk_size):
+        keys = [f"test_key:{i}" for i in range(start, min(start + chunk_size, num_writes))]
+        master_values = master.mget(keys)
+        
+        for replica_name, replica in replicas.items():
+            stats = results[replica_name]
+            op_start = time.perf_counter_ns()
+            replica_values = replica.mget(keys)
+            if latency is not None:
+                # One sample per MGET chunk
+                latency.record_ns(time.perf_counter_ns() - op_start)
+            if sync_state is not None:
+                mark_chunk_synced(sync_state, replica_name, range(start, start + len(keys)), master_values, replica_values)
+            
+            for key, master_value, replica_value in zip(keys, master_values, replica_values):
+                if replica_value is None:
+                    stats['missing'] += 1
+                    if missing_keys is not None:
+                        missing_keys[replica_name].append(key)
+                elif replica_value != master_value:
+                    stats['mismatched'] += 1
+                else:
+                    stats['synced'] += 1
     
-    # Clear any existing test keys
-    master.flushdb()
-    time.sleep(1)
+    return results
+
+def mark_chunk_synced(sync_state, replica_name, indexes, master_values, replica_values, t_ns=None):
+    """Record the keys of one MGET chunk whose replica value matches the master"""
+    sync_state.mark_synced(replica_name, [
+        index for index, master_value, replica_value in zip(indexes, master_values, replica_values)
+        if replica_value is not None and replica_value == master_value
+    ], t_ns)
+
+def recheck_unsynced(master, replicas, sync_state, chunk_size=VERIFY_CHUNK_SIZE):
+    """One re-check pass that only probes keys not yet seen synced, return pass stats"""
+    probed = 0
+    pass_start = time.perf_counter()
+    for replica_name, replica in replicas.items():
+        unsynced = sync_state.unsynced(replica_name)
+        probed += len(unsynced)
+        for start in range(0, len(unsynced), chunk_size):
+            indexes = unsynced[start:start + chunk_size].tolist()
+            keys = [f"test_key:{i}" for i in indexes]
+            master_values = master.mget(keys)
+            replica_values = replica.mget(keys)
+            mark_chunk_synced(sync_state, replica_name, indexes, master_values, replica_values)
+    return {
+        'probed_keys': probed,
+        'duration': time.perf_counter() - pass_start,
+        'remaining': {name: len(sync_state.unsynced(name)) for name in replicas}
+    }
+
+def recheck_until_synced(master, replicas, sync_state, passes=SYNC_RECHECK_PASSES, interval=SYNC_RECHECK_INTERVAL):
+    """Repeat re-check passes until every key is synced on every replica or passes run out"""
+    history = []
+    for _ in range(passes):
+        if not any(len(sync_state.unsynced(name)) for name in replicas):
+            break
+        time.sleep(interval)
+        history.append(recheck_unsynced(master, replicas, sync_state))
+    return history
+
+def get_repl_offset(client, field):
+    """Read master_repl_offset / slave_repl_offset from INFO replication"""
+    return int(client.info('replication').get(field, 0))
+
+def track_convergence(replicas, target_offset, start_ns, timeout=CONVERGENCE_TIMEOUT, poll_interval=CONVERGENCE_POLL_INTERVAL, latency=None):
+    """Poll replica offsets until every replica reaches target_offset (times relative to start_ns)"""
+    timeline = {name: [] for name in replicas}
+    converged_ms = {name: None for name in replicas}
+    pending = dict(replicas)
+    deadline_ns = start_ns + int(timeout * 1_000_000_000)
     
-    # Write data to master
-    start_time = time.time()
-    for i in range(NUM_WRITES):
-        key = f"test_key:{i}"
-        value = f"value_{i}_{datetime.now().timestamp()}"
-        master.set(key, value)
+    while pending:
+        for name, replica in list(pending.items()):
+            probe_start = time.perf_counter_ns()
+            offset = get_repl_offset(replica, 'slave_repl_offset')
+            if latency is not None:
+                latency.record_ns(time.perf_counter_ns() - probe_start)
+            elapsed_ms = (time.perf_counter_ns() - start_ns) / 1_000_000
+            
+            # Only keep a timeline sample when the replica offset moves
+            samples = timeline[name]
+            if not samples or samples[-1]['offset'] != offset:
+                samples.append({
+                    'elapsed_ms': round(elapsed_ms, 3),
+                    'offset': offset,
+                    'lag_bytes': max(target_offset - offset, 0)
+                })
+            
+            if offset >= target_offset:
+                converged_ms[name] = round(elapsed_ms, 3)
+                del pending[name]
         
-        if (i + 1) % 100 == 0:
-            print(f"  Written {i + 1}/{NUM_WRITES} keys...")
+        if not pending or time.perf_counter_ns() >= deadline_ns:
+            break
+        time.sleep(poll_interval)
+    
+    return {
+        'target_offset': target_offset,
+        'converged': not pending,
+        'time_to_convergence_ms': converged_ms,
+        'timeline': timeline
+    }
+
+def print_convergence(convergence):
+    """Display time-to-convergence per replica"""
+    print(f"Target master offset: {convergence['target_offset']}")
+    for replica_name, converged_ms in convergence['time_to_convergence_ms'].items():
+        if converged_ms is not None:
+            print(f"  {replica_name}: converged after {converged_ms:.3f} ms")
+        else:
+            last = convergence['timeline'][replica_name][-1]
+            print(f"  {replica_name}: ✗ not converged after {CONVERGENCE_TIMEOUT}s (lag {last['lag_bytes']} bytes)")
+
+def run_batch(master, replicas, batch_size, missing_keys, sync_state=None):
+    """Write one batch size run, then check replicas while tracking convergence"""
+    latency = {'write': LatencyHistogram(), 'read': LatencyHistogram(), 'probe': LatencyHistogram()}
     
-    write_duration = time.time() - start_time
+    # Write data to master
+    write_duration = write_keys(master, NUM_WRITES, batch_size, latency=latency['write'], sync_state=sync_state)
+    write_end_ns = time.perf_counter_ns()
+    target_offset = get_repl_offset(master, 'master_repl_offset')
     print(f"\n✓ Completed writing {NUM_WRITES} keys in {write_duration:.2f} seconds")
     print(f"  Average: {NUM_WRITES/write_duration:.2f} writes/sec\n")
     
-    # Immediately read from replicas
+    # Immediately read from replicas while tracking offsets in the background
     print("Reading from replicas immediately after write...\n")
     
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        convergence_future = executor.submit(
+            track_convergence, replicas, target_offset, write_end_ns, latency=latency['probe']
+        )
+        
+        read_start = time.time()
+        results = check_consistency(
+            master, replicas['replica1'], replicas['replica2'], NUM_WRITES, missing_keys,
+            latency=latency['read'], sync_state=sync_state
+        )
+        read_duration = time.time() - read_start
+        
+        convergence = convergence_future.result()
+    
+    run = {
+        'batch_size': batch_size,
+        'write_duration': write_duration,
+        'writes_per_sec': NUM_WRITES/write_duration,
+        'read_duration': read_duration,
+        'immediate_results': results,
+        'time_to_convergence_ms': convergence['time_to_convergence_ms'],
+        'latency_unit': LATENCY_UNIT,
+        'latency': {name: histogram.summary() for name, histogram in latency.items()}
+    }
+    return run, results, convergence
+
+async def connect_all_async():
+    """Open async clients to master and both replicas concurrently"""
+    return await asyncio.gather(
+        connect_redis_async(REDIS_MASTER_HOST, REDIS_MASTER_PORT, "Master"),
+        connect_redis_async(REDIS_REPLICA_1_HOST, REDIS_REPLICA_1_PORT, "Replica 1"),
+        connect_redis_async(REDIS_REPLICA_2_HOST, REDIS_REPLICA_2_PORT, "Replica 2")
+    )
+
+async def write_keys_async(master, num_writes, batch_size, concurrency=ASYNC_CONCURRENCY, latency=None, sync_state=None):
+    """Write test keys with up to `concurrency` pipelined batches in flight"""
+    # Batches in flight overlap, so every value gets its own bytes instead of a ring buffer
+    payload = PayloadGenerator(VALUE_SIZE)
+    
+    async def send_batch(start):
+        pipe = master.pipeline(transaction=TRANSACTIONAL)
+        batch = {
+            f"test_key:{i}": payload.value(i)
+            for i in range(start, min(start + batch_size, num_writes))
+        }
+        if WRITE_MODE == 'mset':
+            pipe.mset(batch)
+        else:
+            for key, value in batch.items():
+                pipe.set(key, value)
+        op_start = time.perf_counter_ns()
+        await pipe.execute()
+        if latency is not None:
+            latency.record_ns(time.perf_counter_ns() - op_start)
+        if sync_state is not None:
+            sync_state.record_batch_written(start // batch_size)
+    
+    start_time = time.time()
+    await run_bounded(
+        (lambda start=start: send_batch(start) for start in range(0, num_writes, batch_size)),
+        concurrency
+    )
+    return time.time() - start_time
+
+async def check_consistency_async(master, replica1, replica2, num_writes, missing_keys=None, chunk_size=VERIFY_CHUNK_SIZE, latency=None, sync_state=None):
+    """Chunked MGET verifier that reads master and replicas of each chunk simultaneously"""
     results = {
         'replica1': {'synced': 0, 'missing': 0, 'mismatched': 0},
         'replica2': {'synced': 0, 'missing': 0, 'mismatched': 0}
     }
+    max_spread_ms = 0.0
+    
+    async def verify_chunk(start):
+        nonlocal max_spread_ms
+        keys = [f"test_key:{i}" for i in range(start, min(start + chunk_size, num_writes))]
+        op_start = time.perf_counter_ns()
+        values, spread_ms = await snapshot({
+            'master': master.mget(keys),
+            'replica1': replica1.mget(keys),
+            'replica2': replica2.mget(keys)
+        })
+        if latency is not None:
+            # The three MGETs run concurrently, one sample per chunk covers the slowest
+            latency.record_ns(time.perf_counter_ns() - op_start)
+        max_spread_ms = max(max_spread_ms, spread_ms)
+        
+        for replica_name in ('replica1', 'replica2'):
+            if sync_state is not None:
+                mark_chunk_synced(
+                    sync_state, replica_name, range(start, start + len(keys)), values['master'], values[replica_name]
+                )
+            stats = results[replica_name]
+            for key, master_value, replica_value in zip(keys, values['master'], values[replica_name]):
+                if replica_value is None:
+                    stats['missing'] += 1
+                    if missing_keys is not None:
+                        missing_keys[replica_name].append(key)
+                elif replica_value != master_value:
+                    stats['mismatched'] += 1
+                else:
+                    stats['synced'] += 1
+    
+    await run_bounded(
+        (lambda start=start: verify_chunk(start) for start in range(0, num_writes, chunk_size))
+    )
+    print(f"  Max cross-node snapshot spread: {max_spread_ms:.3f} ms")
+    return results
+
+async def run_batch_async(replicas, batch_size, missing_keys, sync_state=None):
+    """Asyncio version of run_batch(); offsets are still tracked on the blocking clients"""
+    latency = {'write': LatencyHistogram(), 'read': LatencyHistogram(), 'probe': LatencyHistogram()}
+    clients = await connect_all_async()
+    try:
+        if not all(clients):
+            raise ConnectionError("Failed to connect to all Redis instances (async)")
+        master, replica1, replica2 = clients
+        
+        write_duration = await write_keys_async(master, NUM_WRITES, batch_size, latency=latency['write'], sync_state=sync_state)
+        write_end_ns = time.perf_counter_ns()
+        target_offset = int((await master.info('replication')).get('master_repl_offset', 0))
+        print(f"\n✓ Completed writing {NUM_WRITES} keys in {write_duration:.2f} seconds")
+        print(f"  Average: {NUM_WRITES/write_duration:.2f} writes/sec\n")
+        
+        print("Reading from replicas immediately after write...\n")
+        
+        loop = asyncio.get_running_loop()
+        convergence_future = loop.run_in_executor(
+            None, lambda: track_convergence(replicas, target_offset, write_end_ns, latency=latency['probe'])
+        )
+        
+        read_start = time.time()
+        results = await check_consistency_async(
+            master, replica1, replica2, NUM_WRITES, missing_keys,
+            latency=latency['read'], sync_state=sync_state
+        )
+        read_duration = time.time() - read_start
+        
+        convergence = await convergence_future
+    finally:
+        await close_all(clients)
+    
+    run = {
+        'batch_size': batch_size,
+        'write_duration': write_duration,
+        'writes_per_sec': NUM_WRITES/write_duration,
+        'read_duration': read_duration,
+        'immediate_results': results,
+        'time_to_convergence_ms': convergence['time_to_convergence_ms'],
+        'latency_unit': LATENCY_UNIT,
+        'latency': {name: histogram.summary() for name, histogram in latency.items()}
+    }
+    return run, results, convergence
+
+async def recheck_async():
+    """Run the after-convergence consistency check on the asyncio engine"""
+    clients = await connect_all_async()
+    try:
+        if not all(clients):
+            raise ConnectionError("Failed to connect to all Redis instances (async)")
+        return await check_consistency_async(*clients, NUM_WRITES)
+    finally:
+        await close_all(clients)
+
+def run_payload_sweep(master, replicas, sizes=PAYLOAD_SWEEP_SIZES):
+    """Pipelined SETs of each value size, then the time replicas need to catch up with them"""
+    def write_batch(items):
+        pipe = master.pipeline(transaction=False)
+        for seq, value in items:
+            pipe.set(f"payload_sweep:{seq}", value)
+        pipe.execute()
     
-    missing_keys = {'replica1': [], 'replica2': []}
+    def after(size, ops, result):
+        write_end_ns = time.perf_counter_ns()
+        convergence = track_convergence(replicas, get_repl_offset(master, 'master_repl_offset'), write_end_ns)
+        converged_ms = convergence['time_to_convergence_ms'].values()
+        replication_ms = max(converged_ms) if convergence['converged'] else None
+        
+        # Large values add up quickly, drop them before the next size
+        for start in range(0, ops, VERIFY_CHUNK_SIZE):
+            master.delete(*[f"payload_sweep:{seq}" for seq in range(start, min(start + VERIFY_CHUNK_SIZE, ops))])
+        
+        if replication_ms is None:
+            return {'replication_ms': None, 'replicated_mb_per_sec': None}
+        return {
+            'replication_ms': replication_ms,
+            # Write time plus catch-up: how fast the bytes actually reached every replica
+            'replicated_mb_per_sec': ops * size / (result['duration'] + replication_ms / 1000) / 1e6
+        }
     
-    read_start = time.time()
+    return payload_sweep(write_batch, sizes, after)
+
+def write_batch_wait(master, batch, numreplicas, timeout_ms=WAIT_TIMEOUT_MS, mode=WRITE_MODE, transactional=TRANSACTIONAL):
+    """Send one batch followed by WAIT numreplicas, return how many replicas acknowledged it"""
+    if mode == 'pipeline' and not transactional:
+        # WAIT rides in the batch's pipeline: still one round trip per batch
+        pipe = master.pipeline(transaction=False)
+        for key, value in batch:
+            pipe.set(key, value)
+        pipe.execute_command('WAIT', numreplicas, timeout_ms)
+        return pipe.execute()[-1]
+    write_batch(master, batch, mode, transactional)
+    return master.wait(numreplicas, timeout_ms)
+
+def run_wait_point(master, replicas, numreplicas, batch_size, num_writes=NUM_WRITES):
+    """Write num_writes keys with WAIT after every batch, then check the replicas right away"""
+    latency = LatencyHistogram()  # one sample per batch, WAIT included
+    payload = PayloadGenerator(VALUE_SIZE, ring=batch_size)
+    timeouts = 0
+    acked = {}  # replicas that acknowledged -> batches
     
-    for i in range(NUM_WRITES):
-        key = f"test_key:{i}"
-        master_value = master.get(key)
-        
-        # Check replica 1
-        replica1_value = replica1.get(key)
-        if replica1_value is None:
-            results['replica1']['missing'] += 1
-            missing_keys['replica1'].append(key)
-        elif replica1_value != master_value:
-            results['replica1']['mismatched'] += 1
+    start = time.perf_counter()
+    for batch_start in range(0, num_writes, batch_size):
+        batch = [
+            (f"test_key:{i}", payload.buffer(i))
+            for i in range(batch_start, min(batch_start + batch_size, num_writes))
+        ]
+        op_start = time.perf_counter_ns()
+        if numreplicas:
+            count = write_batch_wait(master, batch, numreplicas)
+            acked[count] = acked.get(count, 0) + 1
+            if count < numreplicas:
+                timeouts += 1
         else:
-            results['replica1']['synced'] += 1
-        
-        # Check replica 2
-        replica2_value = replica2.get(key)
-        if replica2_value is None:
-            results['replica2']['missing'] += 1
-            missing_keys['replica2'].append(key)
-        elif replica2_value != master_value:
-            results['replica2']['mismatched'] += 1
-        else:
-            results['replica2']['synced'] += 1
+            write_batch(master, batch)
+        latency.record_ns(time.perf_counter_ns() - op_start)
+    duration = time.perf_counter() - start
+    
+    results = check_consistency(master, replicas['replica1'], replicas['replica2'], num_writes)
+    return {
+        'numreplicas': numreplicas,
+        'batch_size': batch_size,
+        'writes': num_writes,
+        'duration': duration,
+        'writes_per_sec': num_writes / duration if duration else 0.0,
+        'latency': latency.summary(),
+        'wait_timeouts': timeouts,
+        'acked_replicas': acked,
+        'immediate_results': results,
+        'immediate_missing': sum(stats['missing'] for stats in results.values())
+    }
+
+def run_wait_sweep(master, replicas, numreplicas_values=WAIT_NUMREPLICAS, batch_sizes=WAIT_BATCH_SIZES):
+    """Every numreplicas x batch size point, compared with the asynchronous run of the same batch size"""
+    runs = []
+    for batch_size in batch_sizes:
+        for numreplicas in numreplicas_values:
+            master.flushdb()
+            time.sleep(1)  # Let the flush reach the replicas before counting missing keys
+            run = run_wait_point(master, replicas, numreplicas, batch_size)
+            print(
+                f"  WAIT {numreplicas} / batch {batch_size}: {run['writes_per_sec']:.0f} writes/sec, "
+                f"{run['immediate_missing']} missing right after, {run['wait_timeouts']} timeouts"
+            )
+            runs.append(run)
+    
+    baselines = {run['batch_size']: run for run in runs if run['numreplicas'] == 0}
+    for run in runs:
+        baseline = baselines.get(run['batch_size'])
+        if baseline is None:
+            run['throughput_vs_async'] = run['missing_drop'] = None
+            continue
+        run['throughput_vs_async'] = (
+            run['writes_per_sec'] / baseline['writes_per_sec'] if baseline['writes_per_sec'] else None
+        )
+        # Fraction of the asynchronous run's missing keys that WAIT got rid of
+        run['missing_drop'] = (
+            1 - run['immediate_missing'] / baseline['immediate_missing'] if baseline['immediate_missing'] else None
+        )
+    return runs
+
+def print_wait_sweep(runs):
+    """Consistency vs throughput table, one row per numreplicas x batch size"""
+    print(f"\n  {'WAIT':>4} {'Batch':>6} {'Writes/sec':>11} {'vs async':>9} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'Timeouts':>9} {'Missing':>8} {'Drop':>7}")
+    for run in runs:
+        scaling = f"{run['throughput_vs_async']:.2f}x" if run['throughput_vs_async'] is not None else '-'
+        drop = f"{run['missing_drop']:.1%}" if run['missing_drop'] is not None else '-'
+        print(
+            f"  {run['numreplicas']:4d} {run['batch_size']:6d} {run['writes_per_sec']:11.0f} {scaling:>9} "
+            f"{run['latency'].get('p50_ms', 0):8.3f} {run['latency'].get('p99_ms', 0):8.3f} "
+            f"{run['wait_timeouts']:9d} {run['immediate_missing']:8d} {drop:>7}"
+        )
+
+def print_consistency(results, total):
+    """Display synced/missing/mismatched counts per replica"""
+    for replica_name, stats in results.items():
+        print(f"\n{replica_name.upper()}:")
+        print(f"  ✓ Synced:      {stats['synced']:4d} ({stats['synced']/total*100:.1f}%)")
+        print(f"  ✗ Missing:     {stats['missing']:4d} ({stats['missing']/total*100:.1f}%)")
+        print(f"  ⚠ Mismatched:  {stats['mismatched']:4d} ({stats['mismatched']/total*100:.1f}%)")
+
+def run_scenario_1():
+    """Run replication lag and consistency test"""
+    print("\n" + "="*70)
+    print("SKENARIO 1: REPLICATION LAG & CONSISTENCY TEST")
+    print("="*70 + "\n")
+    
+    # Connect to Redis instances
+    master = connect_redis(REDIS_MASTER_HOST, REDIS_MASTER_PORT, "Master")
+    replica1 = connect_redis(REDIS_REPLICA_1_HOST, REDIS_REPLICA_1_PORT, "Replica 1")
+    replica2 = connect_redis(REDIS_REPLICA_2_HOST, REDIS_REPLICA_2_PORT, "Replica 2")
     
-    read_duration = time.time() - read_start
+    if not all([master, replica1, replica2]):
+        print("\n✗ Cannot proceed: Failed to connect to all Redis instances")
+        return
+    
+    replicas = {'replica1': replica1, 'replica2': replica2}
+    
+    # Batch size only matters when commands are grouped
+    batch_sizes = BATCH_SIZES if WRITE_MODE != 'single' else [1]
+    
+    print(f"\nStarting test at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Execution mode: {EXECUTION_MODE}")
+    print(f"Write mode: {WRITE_MODE} (transactional={TRANSACTIONAL}), batch sizes: {batch_sizes}")
+    
+    # Samples are streamed as they happen, the summary is appended as the last record
+    output_file = f"scenario1_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+    sink = ResultSink(output_file, 'Replication Lag & Consistency')
+    sampler = start_sampling([
+        f"{REDIS_MASTER_HOST}:{REDIS_MASTER_PORT}",
+        f"{REDIS_REPLICA_1_HOST}:{REDIS_REPLICA_1_PORT}",
+        f"{REDIS_REPLICA_2_HOST}:{REDIS_REPLICA_2_PORT}"
+    ], METRICS_SAMPLE_INTERVAL)
+    
+    batch_results = []
+    
+    for batch_size in batch_sizes:
+        print("\n" + "-"*70)
+        print(f"Writing {NUM_WRITES} keys to master (batch size {batch_size})...\n")
+        
+        # Clear any existing test keys
+        master.flushdb()
+        time.sleep(1)
+        
+        missing_keys = {
+            name: sink.collector('missing_key', replica=name, batch_size=batch_size)
+            for name in replicas
+        }
+        
+        sync_state = SyncStateStore(NUM_WRITES, replicas, batch_size)
+        
+        if EXECUTION_MODE == 'async':
+            run, results, convergence = asyncio.run(run_batch_async(replicas, batch_size, missing_keys, sync_state))
+        else:
+            run, results, convergence = run_batch(master, replicas, batch_size, missing_keys, sync_state)
+        
+        # Re-probe only the keys the immediate check did not see synced yet
+        run['recheck_passes'] = recheck_until_synced(master, replicas, sync_state)
+        run['key_convergence'] = sync_state.summary()
+        run['sync_state_bytes'] = sync_state.memory_bytes()
+        print(f"\nPer-key sync state ({sync_state.memory_bytes()/1024:.1f} KiB):")
+        for i, recheck in enumerate(run['recheck_passes'], 1):
+            print(f"  Pass {i}: probed {recheck['probed_keys']} keys in {recheck['duration']*1000:.1f} ms, remaining {recheck['remaining']}")
+        for name, stats in run['key_convergence'].items():
+            if 'p50_ms' in stats:
+                print(
+                    f"  {name}: {stats['synced']} synced, {stats['unsynced']} unsynced, "
+                    f"write→synced p50 {stats['p50_ms']:.3f} ms, p99 {stats['p99_ms']:.3f} ms, max {stats['max_ms']:.3f} ms"
+                )
+            else:
+                print(f"  {name}: no key observed synced")
+        
+        write_duration = run['write_duration']
+        read_duration = run['read_duration']
+        batch_results.append(run)
+        sink.write('batch_run', **run)
+        sink.write('convergence', batch_size=batch_size, **convergence)
     
     # Display Results
     print("="*70)
@@ -111,57 +629,81 @@ def run_scenario_1():
     print("="*70)
     
     print(f"\nTotal Keys: {NUM_WRITES}")
+    print(
+        f"\n{'Batch':>7s} {'Writes/sec':>12s} {'R1 missing':>11s} {'R2 missing':>11s} "
+        f"{'R1 conv ms':>11s} {'R2 conv ms':>11s}"
+    )
+    for run in batch_results:
+        immediate = run['immediate_results']
+        converged_ms = {
+            name: f"{ms:.3f}" if ms is not None else 'timeout'
+            for name, ms in run['time_to_convergence_ms'].items()
+        }
+        print(
+            f"{run['batch_size']:7d} {run['writes_per_sec']:12.2f} "
+            f"{immediate['replica1']['missing']:11d} {immediate['replica2']['missing']:11d} "
+            f"{converged_ms['replica1']:>11s} {converged_ms['replica2']:>11s}"
+        )
+    
+    print("\nLatency per round trip (write = one pipeline/MSET batch, read = one MGET chunk, probe = one INFO):")
+    for run in batch_results:
+        print(f"  Batch {run['batch_size']}:")
+        for name, summary in run['latency'].items():
+            print(f"    {name:6s} {format_summary(summary)}")
+    
+    # The wait/re-check below applies to the last batch size run
+    print(f"\nLast run (batch size {batch_sizes[-1]}):")
     print(f"Write Duration: {write_duration:.2f} seconds")
     print(f"Read Duration: {read_duration:.2f} seconds")
     
-    for replica_name, stats in results.items():
-        print(f"\n{replica_name.upper()}:")
-        print(f"  ✓ Synced:      {stats['synced']:4d} ({stats['synced']/NUM_WRITES*100:.1f}%)")
-        print(f"  ✗ Missing:     {stats['missing']:4d} ({stats['missing']/NUM_WRITES*100:.1f}%)")
-        print(f"  ⚠ Mismatched:  {stats['mismatched']:4d} ({stats['mismatched']/NUM_WRITES*100:.1f}%)")
+    print_consistency(results, NUM_WRITES)
     
-    # Wait and re-check after some time
+    # Re-check once the offset tracker has seen every replica catch up
     print("\n" + "-"*70)
-    print("Waiting 5 seconds for replication to complete...")
-    time.sleep(5)
+    print("REPLICATION CONVERGENCE (offset based):")
+    print_convergence(convergence)
     
-    print("\nRe-checking consistency after wait...\n")
+    print("\nRe-checking consistency after convergence...\n")
     
-    results_after = {
-        'replica1': {'synced': 0, 'missing': 0, 'mismatched': 0},
-        'replica2': {'synced': 0, 'missing': 0, 'mismatched': 0}
-    }
+    if EXECUTION_MODE == 'async':
+        results_after = asyncio.run(recheck_async())
+    else:
+        results_after = check_consistency(master, replica1, replica2, NUM_WRITES)
     
-    for i in range(NUM_WRITES):
-        key = f"test_key:{i}"
-        master_value = master.get(key)
-        
-        # Check replica 1
-        replica1_value = replica1.get(key)
-        if replica1_value is None:
-            results_after['replica1']['missing'] += 1
-        elif replica1_value != master_value:
-            results_after['replica1']['mismatched'] += 1
-        else:
-            results_after['replica1']['synced'] += 1
-        
-        # Check replica 2
-        replica2_value = replica2.get(key)
-        if replica2_value is None:
-            results_after['replica2']['missing'] += 1
-        elif replica2_value != master_value:
-            results_after['replica2']['mismatched'] += 1
-        else:
-            results_after['replica2']['synced'] += 1
-    
-    print("HASIL SETELAH 5 DETIK:")
+    print("HASIL SETELAH KONVERGENSI:")
     print("="*70)
     
-    for replica_name, stats in results_after.items():
-        print(f"\n{replica_name.upper()}:")
-        print(f"  ✓ Synced:      {stats['synced']:4d} ({stats['synced']/NUM_WRITES*100:.1f}%)")
-        print(f"  ✗ Missing:     {stats['missing']:4d} ({stats['missing']/NUM_WRITES*100:.1f}%)")
-        print(f"  ⚠ Mismatched:  {stats['mismatched']:4d} ({stats['mismatched']/NUM_WRITES*100:.1f}%)")
+    print_consistency(results_after, NUM_WRITES)
+    
+    wait_sweep = None
+    if WAIT_NUMREPLICAS:
+        # Every WAIT point flushes and rewrites test_key:*, so it runs once the batch runs are reported
+        print("\n" + "="*70)
+        print("CONSISTENCY COST (WAIT)")
+        print("="*70 + "\n")
+        print(f"{NUM_WRITES} writes per point, WAIT timeout {WAIT_TIMEOUT_MS} ms")
+        wait_sweep = run_wait_sweep(master, replicas)
+        for run in wait_sweep:
+            sink.write('wait_run', **run)
+        print_wait_sweep(wait_sweep)
+        print()
+    
+    payload = None
+    if PAYLOAD_SWEEP_SIZES:
+        # Runs after the re-check: the sweep flushes the keyspace the batch runs left behind
+        print("\n" + "="*70)
+        print("VALUE SIZE SWEEP")
+        print("="*70 + "\n")
+        master.flushdb()
+        payload = run_payload_sweep(master, replicas)
+        print_payload_sweep(payload, [
+            ('Catch-up ms', 'replication_ms', '.3f'),
+            ('Replicated MB/s', 'replicated_mb_per_sec', '.2f')
+        ])
+        sink.write('payload_sweep', **payload)
+        print()
+    
+    server_metrics = finish_sampling(sampler, sink)
     
     # Save results to JSON
     result_data = {
@@ -169,20 +711,32 @@ def run_scenario_1():
         'timestamp': datetime.now().isoformat(),
         'config': {
             'num_writes': NUM_WRITES,
+            'execution_mode': EXECUTION_MODE,
+            'write_mode': WRITE_MODE,
+            'transactional': TRANSACTIONAL,
+            'value_size': VALUE_SIZE,
+            'payload_sweep_sizes': PAYLOAD_SWEEP_SIZES,
+            'wait_numreplicas': WAIT_NUMREPLICAS,
+            'wait_batch_sizes': WAIT_BATCH_SIZES,
+            'wait_timeout_ms': WAIT_TIMEOUT_MS,
+            'batch_sizes': batch_sizes,
+            'verify_chunk_size': VERIFY_CHUNK_SIZE,
+            'convergence_timeout': CONVERGENCE_TIMEOUT,
+            'metrics_sample_interval': METRICS_SAMPLE_INTERVAL,
             'write_duration': write_duration,
             'read_duration': read_duration
         },
+        'batch_size_results': batch_results,
+        'wait_sweep': wait_sweep,
+        'payload_sweep': payload,
         'immediate_results': results,
+        'convergence': convergence,
         'after_wait_results': results_after,
-        'missing_keys_sample': {
-            'replica1': missing_keys['replica1'][:10],
-            'replica2': missing_keys['replica2'][:10]
-        }
+        'missing_keys_sample': {name: collector.sample for name, collector in missing_keys.items()},
+        'server_metrics': server_metrics
     }
     
-    output_file = f"scenario1_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-    with open(output_file, 'w') as f:
-        json.dump(result_data, f, indent=2)
+    sink.close(result_data)
     
     print(f"\n✓ Results saved to {output_file}")
     print("="*70 + "\n")
@@ -5,29 +5,59 @@ Tujuan: Menguji leader election otomatis
 Aspek: Leader election, availability, CAP trade-off
 """
 
+import os
 import redis
 from redis.sentinel import Sentinel
 import time
 from datetime import datetime
-import json
+import asyncio
+import redis.asyncio as aioredis
+from async_engine import snapshot, close_all
+from sentinel_events import SentinelEventWatcher, FAILOVER_CHANNELS
+from failover_load import FailoverLoadGenerator, print_load_report
+from sentinel_pool import SentinelConnectionManager
+from failover_buffer import FailoverWriteBuffer, BUFFER_CAPACITY, BUFFER_MAX_AGE, print_buffer_report
+from metrics_sampler import SAMPLE_INTERVAL, start_sampling, finish_sampling
+from latency_histogram import LatencyHistogram, format_summary
+from result_sink import ResultSink
 
 # Configuration
+VPS2_HOST = os.environ.get('REPLICATION_HOST', '134.209.106.37')  # 127.0.0.1 with python -m resp_emulator
 SENTINEL_HOSTS = [
-    ('134.209.106.37', 26379), 
-    ('134.209.106.37', 26380),
-    ('134.209.106.37', 26381)
+    (VPS2_HOST, 26379), 
+    (VPS2_HOST, 26380),
+    (VPS2_HOST, 26381)
 ]
 MASTER_NAME = 'mymaster'
 CHECK_INTERVAL = 2  # seconds
-VPS2_HOST = '134.209.106.37'
+
+# 'sync' polls sentinels one at a time; 'async' snapshots all sentinels and nodes concurrently
+EXECUTION_MODE = 'sync'
+
+# 'poll' checks the master every CHECK_INTERVAL; 'events' subscribes to sentinel pub/sub channels
+MONITOR_MODE = 'poll'
+MONITOR_TIMEOUT = 600  # seconds, same 10 minute cap as the polling loop
+
+# Background sequence-numbered writes during monitoring, 0 disables the load generator
+WRITE_LOAD_RATE = 100  # writes per second
+POOL_SOCKET_TIMEOUT = 1  # seconds, short so an unreachable master surfaces as errors quickly
+
+# 'direct' reports writes that hit a dead master as errors; 'buffered' queues them and replays
+# them to the new master (see failover_buffer.py)
+WRITE_PATH = 'direct'
+WRITE_BUFFER_CAPACITY = BUFFER_CAPACITY
+WRITE_BUFFER_MAX_AGE = BUFFER_MAX_AGE  # seconds
+
+# Server-side INFO timeline (see metrics_sampler.py), exported with the results; 0 disables it
+METRICS_SAMPLE_INTERVAL = SAMPLE_INTERVAL  # seconds
 
 IP_PORT_MAPPING = {
-    '172.18.0.2': ('134.209.106.37', 6379),  # redis-master
-    '172.18.0.3': ('134.209.106.37', 6380),  # redis-replica-1
-    '172.18.0.4': ('134.209.106.37', 6381),  # redis-replica-2
-    '172.18.0.5': ('134.209.106.37', 6379),  # Possible IP after restart
-    '172.18.0.6': ('134.209.106.37', 6380),  # Possible IP after restart
-    '172.18.0.7': ('134.209.106.37', 6381),  # Possible IP after restart
+    '172.18.0.2': (VPS2_HOST, 6379),  # redis-master
+    '172.18.0.3': (VPS2_HOST, 6380),  # redis-replica-1
+    '172.18.0.4': (VPS2_HOST, 6381),  # redis-replica-2
+    '172.18.0.5': (VPS2_HOST, 6379),  # Possible IP after restart
+    '172.18.0.6': (VPS2_HOST, 6380),  # Possible IP after restart
+    '172.18.0.7': (VPS2_HOST, 6381),  # Possible IP after restart
 }
 
 def connect_sentinel():
@@ -65,23 +95,24 @@ def map_internal_to_external(internal_ip, internal_port):
     # Fallback to original if not in mapping
     return (internal_ip, internal_port)
 
-def test_write(sentinel):
+def connect_master_pool():
+    """Pooled master/replica connections that follow failovers (see sentinel_pool)"""
+    return SentinelConnectionManager(
+        SENTINEL_HOSTS, MASTER_NAME,
+        address_map=map_internal_to_external,
+        socket_timeout=POOL_SOCKET_TIMEOUT,
+        socket_connect_timeout=POOL_SOCKET_TIMEOUT
+    )
+
+def test_write(connections, write_buffer=None):
     """Test writing to master"""
     try:
-        # Get master address from sentinel
-        master_addr = sentinel.discover_master(MASTER_NAME)
-        internal_ip, internal_port = master_addr
-        
-        # Map to external accessible address
-        external_ip, external_port = map_internal_to_external(internal_ip, internal_port)
-        
-        # Connect directly using external address
-        master = redis.Redis(host=external_ip, port=external_port, socket_timeout=10)
-        master.ping()  # Test connection
-        
+        # Pooled client for the cached master, rediscovered only after a failover
         test_key = f"failover_test_{datetime.now().timestamp()}"
-        master.set(test_key, "test_value")
-        master.close()
+        if write_buffer:
+            write_buffer.set(test_key, "test_value").result(timeout=WRITE_BUFFER_MAX_AGE + 1)
+        else:
+            connections.execute(lambda master: master.set(test_key, "test_value"))
         return True, test_key
     except Exception as e:
         return False, str(e)
@@ -98,46 +129,35 @@ def monitor_cluster_state(sentinel):
     
     return master, replicas
 
-def run_scenario_2():
-    """Run failover test scenario"""
-    print("\n" + "="*70)
-    print("SKENARIO 2: REDIS SENTINEL FAILOVER TEST")
-    print("="*70 + "\n")
+def failover_completed_event(timestamp, old_master, new_master, failover_start_time, failover_end_time):
+    """Print the failover banner and build its event record"""
+    failover_duration_ns = failover_end_time - failover_start_time if failover_start_time else 0
+    failover_duration_sec = failover_duration_ns / 1_000_000_000  # Convert to seconds
+    failover_duration_ms = failover_duration_ns / 1_000_000  # Convert to milliseconds
     
-    # Connect to Sentinel
-    sentinel = connect_sentinel()
-    if not sentinel:
-        print("✗ Cannot proceed: Failed to connect to Sentinel")
-        return
-    
-    print(f"\nTest started at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-    
-    # Display initial state
-    print("INITIAL CLUSTER STATE:")
-    print("-"*70)
-    initial_master, initial_replicas = monitor_cluster_state(sentinel)
-    
-    # Test initial write
-    print("\nTesting initial write to master...")
-    success, result = test_write(sentinel)
-    if success:
-        print(f"✓ Write successful: {result}")
-    else:
-        print(f"✗ Write failed: {result}")
-    
-    # Monitoring setup
-    print("\n" + "="*70)
-    print("FAILOVER MONITORING")
-    print("="*70)
-    print("\n⚠ INSTRUCTIONS:")
-    print("  1. The script is now monitoring the cluster")
-    print("  2. Open another terminal and run:")
-    print("     docker stop redis-master")
-    print("  3. Watch the failover happen automatically")
-    print("  4. Press Ctrl+C to stop monitoring\n")
-    print("-"*70)
+    print(f"\n{'='*70}")
+    print(f"[{timestamp}] 🔄 FAILOVER DETECTED!")
+    print(f"{'='*70}")
+    print(f"  Old Master: {old_master[0]}:{old_master[1]}")
+    print(f"  New Master: {new_master[0]}:{new_master[1]}")
+    print(f"  Failover Duration:")
+    print(f"    - {failover_duration_sec:.9f} seconds")
+    print(f"    - {failover_duration_ms:.6f} milliseconds")
+    print(f"    - {failover_duration_ns:,} nanoseconds")
+    print(f"{'='*70}\n")
     
-    # Monitoring loop
+    return {
+        'timestamp': timestamp,
+        'event': 'Failover completed',
+        'old_master': f"{old_master[0]}:{old_master[1]}",
+        'new_master': f"{new_master[0]}:{new_master[1]}",
+        'duration_seconds': failover_duration_sec,
+        'duration_milliseconds': failover_duration_ms,
+        'duration_nanoseconds': failover_duration_ns
+    }
+
+def monitor_failover(sentinel, initial_master, probe_latency=None):
+    """Poll sentinel for master changes until Ctrl+C, return failover events"""
     failover_events = []
     current_master = initial_master
     failover_detected = False
@@ -155,7 +175,10 @@ def run_scenario_2():
             timestamp = datetime.now().strftime('%H:%M:%S')
             
             # Get current master
+            probe_start = time.perf_counter_ns()
             new_master = get_master_info(sentinel)
+            if probe_latency is not None:
+                probe_latency.record_ns(time.perf_counter_ns() - probe_start)
             
             if new_master is None:
                 print(f"[{timestamp}] ⚠ Cannot detect master - Possible failover in progress...")
@@ -173,30 +196,9 @@ def run_scenario_2():
             if new_master != current_master:
                 if not failover_end_time:
                     failover_end_time = time.perf_counter_ns()
-                    failover_duration_ns = failover_end_time - failover_start_time if failover_start_time else 0
-                    failover_duration_sec = failover_duration_ns / 1_000_000_000  # Convert to seconds
-                    failover_duration_ms = failover_duration_ns / 1_000_000  # Convert to milliseconds
-                    
-                    print(f"\n{'='*70}")
-                    print(f"[{timestamp}] 🔄 FAILOVER DETECTED!")
-                    print(f"{'='*70}")
-                    print(f"  Old Master: {current_master[0]}:{current_master[1]}")
-                    print(f"  New Master: {new_master[0]}:{new_master[1]}")
-                    print(f"  Failover Duration:")
-                    print(f"    - {failover_duration_sec:.9f} seconds")
-                    print(f"    - {failover_duration_ms:.6f} milliseconds")
-                    print(f"    - {failover_duration_ns:,} nanoseconds")
-                    print(f"{'='*70}\n")
-                    
-                    failover_events.append({
-                        'timestamp': timestamp,
-                        'event': 'Failover completed',
-                        'old_master': f"{current_master[0]}:{current_master[1]}",
-                        'new_master': f"{new_master[0]}:{new_master[1]}",
-                        'duration_seconds': failover_duration_sec,
-                        'duration_milliseconds': failover_duration_ms,
-                        'duration_nanoseconds': failover_duration_ns
-                    })
+                    failover_events.append(
+                        failover_completed_event(timestamp, current_master, new_master, failover_start_time, failover_end_time)
+                    )
                     current_master = new_master
             else:
                 # Normal monitoring
@@ -217,12 +219,266 @@ def run_scenario_2():
     except KeyboardInterrupt:
         print("\n\n✓ Monitoring stopped by user")
     
+    return failover_events
+
+async def monitor_failover_async(initial_master, probe_latency=None):
+    """Snapshot every sentinel and data node concurrently each tick, return failover events"""
+    sentinels = {
+        f"sentinel {host}:{port}": aioredis.Redis(host=host, port=port, socket_timeout=5, decode_responses=True)
+        for host, port in SENTINEL_HOSTS
+    }
+    nodes = {
+        f"{host}:{port}": aioredis.Redis(host=host, port=port, socket_timeout=CHECK_INTERVAL)
+        for host, port in sorted(set(IP_PORT_MAPPING.values()))
+    }
+    quorum = len(sentinels) // 2 + 1
+    
+    failover_events = []
+    current_master = initial_master
+    failover_start_time = None
+    failover_end_time = None
+    
+    iteration = 0
+    max_iterations = 300  # 10 minutes max (2 sec interval)
+    
+    try:
+        while iteration < max_iterations:
+            iteration += 1
+            await asyncio.sleep(CHECK_INTERVAL)
+            
+            timestamp = datetime.now().strftime('%H:%M:%S')
+            
+            calls = {name: client.sentinel_get_master_addr_by_name(MASTER_NAME) for name, client in sentinels.items()}
+            calls.update({name: client.ping() for name, client in nodes.items()})
+            probe_start = time.perf_counter_ns()
+            views, spread_ms = await snapshot(calls)
+            if probe_latency is not None:
+                probe_latency.record_ns(time.perf_counter_ns() - probe_start)
+            
+            # Master address agreed on by a quorum of sentinels, if any
+            sentinel_views = [views[name] for name in sentinels if isinstance(views[name], tuple)]
+            agreed = [view for view in set(sentinel_views) if sentinel_views.count(view) >= quorum]
+            new_master = agreed[0] if agreed else None
+            
+            external_master = map_internal_to_external(*current_master)
+            master_alive = views.get(f"{external_master[0]}:{external_master[1]}") is True
+            
+            if not master_alive and failover_start_time is None:
+                failover_start_time = time.perf_counter_ns()
+                print(f"[{timestamp}] ⚠ Master {external_master[0]}:{external_master[1]} not answering PING")
+                failover_events.append({
+                    'timestamp': timestamp,
+                    'event': 'Master down detected',
+                    'old_master': f"{current_master[0]}:{current_master[1]}",
+                    'snapshot_spread_ms': spread_ms
+                })
+            
+            if new_master is None:
+                print(f"[{timestamp}] ⚠ Sentinels disagree on master - Possible failover in progress...")
+                continue
+            
+            if new_master != current_master and not failover_end_time:
+                failover_end_time = time.perf_counter_ns()
+                event = failover_completed_event(timestamp, current_master, new_master, failover_start_time, failover_end_time)
+                event['sentinel_views'] = {
+                    name: f"{views[name][0]}:{views[name][1]}" if isinstance(views[name], tuple) else str(views[name])
+                    for name in sentinels
+                }
+                failover_events.append(event)
+                current_master = new_master
+            elif iteration % 10 == 0:  # Print every 20 seconds
+                alive = [name for name in nodes if views[name] is True]
+                print(
+                    f"[{timestamp}] Status: "
+                    f"Master={new_master[0]}:{new_master[1]}, "
+                    f"Nodes up={len(alive)}/{len(nodes)}, snapshot spread={spread_ms:.3f} ms"
+                )
+    
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        print("\n\n✓ Monitoring stopped by user")
+    finally:
+        await close_all(list(sentinels.values()) + list(nodes.values()))
+    
+    return failover_events
+
+def monitor_failover_events(initial_master):
+    """Wait for sentinel pub/sub failover events, return events with a phase breakdown"""
+    def print_event(event):
+        if event['for_master']:
+            print(f"[{event['timestamp']}] {event['sentinel']} {event['channel']} {event['data']}")
+    
+    watcher = SentinelEventWatcher(SENTINEL_HOSTS, MASTER_NAME)
+    for channel in FAILOVER_CHANNELS:
+        watcher.on(channel, print_event)
+    watcher.start()
+    print(f"Subscribed to {', '.join(FAILOVER_CHANNELS)} on {len(SENTINEL_HOSTS)} sentinels\n")
+    
+    failover_events = []
+    try:
+        deadline = time.time() + MONITOR_TIMEOUT
+        switch = None
+        while switch is None and time.time() < deadline:
+            # Short waits keep Ctrl+C responsive
+            switch = watcher.wait_for('+switch-master', timeout=1)
+    except KeyboardInterrupt:
+        print("\n\n✓ Monitoring stopped by user")
+    finally:
+        watcher.stop()
+    
+    sdown = watcher.first_seen.get('+sdown')
+    if sdown:
+        failover_events.append({
+            'timestamp': sdown['timestamp'],
+            'event': 'Master down detected',
+            'old_master': f"{initial_master[0]}:{initial_master[1]}",
+            'sentinel': sdown['sentinel']
+        })
+    
+    switch = watcher.first_seen.get('+switch-master')
+    if switch:
+        _, old_ip, old_port, new_ip, new_port = switch['data'].split()
+        event = failover_completed_event(
+            switch['timestamp'], (old_ip, old_port), (new_ip, new_port),
+            sdown['perf_ns'] if sdown else None, switch['perf_ns']
+        )
+        event['phase_breakdown_ms'] = watcher.phase_breakdown()
+        event['sentinel_events_received'] = len(watcher.events)
+        failover_events.append(event)
+        
+        print("Failover phases (first sentinel to report each event):")
+        for phase, duration_ms in event['phase_breakdown_ms'].items():
+            print(f"  {phase:15s} {duration_ms:12.3f} ms")
+        print("  Note: +sdown fires down-after-milliseconds after the master stopped answering\n")
+    
+    return failover_events
+
+def run_scenario_2():
+    """Run failover test scenario"""
+    print("\n" + "="*70)
+    print("SKENARIO 2: REDIS SENTINEL FAILOVER TEST")
+    print("="*70 + "\n")
+    
+    # Connect to Sentinel
+    sentinel = connect_sentinel()
+    if not sentinel:
+        print("✗ Cannot proceed: Failed to connect to Sentinel")
+        return
+    
+    print(f"\nTest started at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Execution mode: {EXECUTION_MODE}, monitor mode: {MONITOR_MODE}\n")
+    
+    # Display initial state
+    print("INITIAL CLUSTER STATE:")
+    print("-"*70)
+    initial_master, initial_replicas = monitor_cluster_state(sentinel)
+    
+    connections = connect_master_pool()
+    write_buffer = None
+    if WRITE_PATH == 'buffered':
+        write_buffer = FailoverWriteBuffer(
+            connections, SENTINEL_HOSTS, MASTER_NAME,
+            capacity=WRITE_BUFFER_CAPACITY, max_age=WRITE_BUFFER_MAX_AGE
+        ).start()
+        print(f"\nWrite path: buffered, {WRITE_BUFFER_CAPACITY} writes / {WRITE_BUFFER_MAX_AGE:g}s max")
+    
+    # Test initial write
+    print("\nTesting initial write to master...")
+    success, result = test_write(connections, write_buffer)
+    if success:
+        print(f"✓ Write successful: {result}")
+    else:
+        print(f"✗ Write failed: {result}")
+    
+    # Monitoring setup
+    print("\n" + "="*70)
+    print("FAILOVER MONITORING")
+    print("="*70)
+    print("\n⚠ INSTRUCTIONS:")
+    print("  1. The script is now monitoring the cluster")
+    print("  2. Open another terminal and run:")
+    print("     docker stop redis-master")
+    print("  3. Watch the failover happen automatically")
+    print("  4. Press Ctrl+C to stop monitoring\n")
+    print("-"*70)
+    
+    # Events are streamed as soon as monitoring ends, the summary is appended as the last record
+    output_file = f"scenario2_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+    sink = ResultSink(output_file, 'Redis Sentinel Failover')
+    # Data nodes known before the failover, so the timeline shows the old master going away
+    sampler = start_sampling(
+        [f"{host}:{port}" for host, port in (map_internal_to_external(*node) for node in [initial_master] + initial_replicas)],
+        METRICS_SAMPLE_INTERVAL
+    )
+    
+    load = None
+    if WRITE_LOAD_RATE:
+        load = FailoverLoadGenerator(connections, rate=WRITE_LOAD_RATE, writer=write_buffer).start()
+        print(f"Write load running at {WRITE_LOAD_RATE} writes/sec (keys {load.key_prefix}:*)\n")
+    
+    # Monitoring loop
+    probe_latency = LatencyHistogram()
+    if MONITOR_MODE == 'events':
+        failover_events = monitor_failover_events(initial_master)
+    elif EXECUTION_MODE == 'async':
+        failover_events = asyncio.run(monitor_failover_async(initial_master, probe_latency))
+    else:
+        failover_events = monitor_failover(sentinel, initial_master, probe_latency)
+    for event in failover_events:
+        sink.write('failover_event', **event)
+    
     # Final state
     print("\n" + "="*70)
     print("FINAL CLUSTER STATE:")
     print("-"*70)
     final_master, final_replicas = monitor_cluster_state(sentinel)
     
+    write_availability = None
+    if load:
+        load.stop()
+        print("\n" + "="*70)
+        print("WRITE AVAILABILITY")
+        print("="*70)
+        audit_client = None
+        try:
+            audit_host, audit_port = map_internal_to_external(*final_master)
+            audit_client = redis.Redis(host=audit_host, port=audit_port, decode_responses=True, socket_timeout=10)
+            audit_client.ping()
+        except Exception as e:
+            print(f"⚠ Cannot audit final master, lost writes unknown: {e}")
+            audit_client = None
+        write_availability = load.report(audit_client)
+        for bucket in write_availability['error_timeline']:
+            sink.write('write_error_rate', **bucket)
+        print_load_report(write_availability)
+        if audit_client:
+            # Failed writes may still have landed, so every seq of the run is deleted
+            try:
+                print(f"  Deleted {load.cleanup(audit_client)} {load.key_prefix}:* keys")
+            except Exception as e:
+                print(f"⚠ Could not delete {load.key_prefix}:* keys: {e}")
+            audit_client.close()
+    
+    write_buffer_stats = None
+    if write_buffer:
+        write_buffer.close()
+        write_buffer_stats = write_buffer.report()
+        print("\n" + "="*70)
+        print("WRITE BUFFER")
+        print("="*70)
+        print_buffer_report(write_buffer_stats)
+    
+    connections.close()
+    connection_stats = connections.stats()
+    print(f"\nMaster connection pool: {connection_stats['discoveries']} sentinel discoveries, "
+          f"{connection_stats['invalidation_count']} invalidations")
+    
+    latency = {'probe': probe_latency.summary()}
+    if write_availability:
+        latency['write'] = write_availability['latency_overall']
+    print("\nLatency per operation:")
+    for name, summary in latency.items():
+        print(f"  {name:6s} {format_summary(summary)}")
+    
     # Summary
     print("\n" + "="*70)
     print("FAILOVER SUMMARY")
@@ -238,10 +494,22 @@ def run_scenario_2():
     else:
         print("\n⚠ No failover events detected")
     
+    server_metrics = finish_sampling(sampler, sink)
+    
     # Save results
     result_data = {
         'scenario': 'Redis Sentinel Failover',
         'timestamp': datetime.now().isoformat(),
+        'config': {
+            'execution_mode': EXECUTION_MODE,
+            'monitor_mode': MONITOR_MODE,
+            'check_interval': CHECK_INTERVAL,
+            'write_load_rate': WRITE_LOAD_RATE,
+            'write_path': WRITE_PATH,
+            'write_buffer_capacity': WRITE_BUFFER_CAPACITY,
+            'write_buffer_max_age': WRITE_BUFFER_MAX_AGE,
+            'metrics_sample_interval': METRICS_SAMPLE_INTERVAL
+        },
         'initial_state': {
             'master': f"{initial_master[0]}:{initial_master[1]}",
             'replicas': [f"{r[0]}:{r[1]}" for r in initial_replicas]
@@ -251,12 +519,15 @@ def run_scenario_2():
             'replicas': [f"{r[0]}:{r[1]}" for r in final_replicas]
         },
         'failover_events': failover_events,
-        'failover_occurred': len(failover_events) > 0
+        'failover_occurred': len(failover_events) > 0,
+        'write_availability': write_availability,
+        'write_buffer': write_buffer_stats,
+        'connection_pool': connection_stats,
+        'latency': latency,
+        'server_metrics': server_metrics
     }
     
-    output_file = f"scenario2_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-    with open(output_file, 'w') as f:
-        json.dump(result_data, f, indent=2)
+    sink.close(result_data)
     
     print(f"\n✓ Results saved to {output_file}")
     print("="*70 + "\n")
@@ -5,22 +5,76 @@ Tujuan: Melihat distribusi key ke hash slot
 Aspek: Partitioning, consistent hashing, scaling out
 """
 
+import os
 import redis
 from redis.cluster import RedisCluster
 import time
 from datetime import datetime
-import json
+import binascii
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+from redis.asyncio.cluster import RedisCluster as AsyncRedisCluster
+from async_engine import ASYNC_CONCURRENCY, run_bounded
+from hash_slot import key_slots
+from slot_map import SlotMap, parse_redirect
+from latency_histogram import LatencyHistogram, merge_all, format_summary
+from cluster_load import scaling_curve, print_scaling_curve
+from workload import generate_workload, run_workload, load_report, print_load_report, slot_counts, top_slots
+from read_routing import compare_read_policies, print_read_policies
+from payload import DEFAULT_VALUE_SIZE, SWEEP_SIZES, PayloadGenerator, payload_sweep, print_payload_sweep
+from result_sink import ResultSink
+from metrics_sampler import SAMPLE_INTERVAL, start_sampling, finish_sampling
+from profiling import PhaseProfiler, profile_phase, print_phase_profile
 
 # Configuration
+VPS1_HOST = os.environ.get('CLUSTER_HOST', '139.59.119.65')  # 127.0.0.1 with python -m resp_emulator
 CLUSTER_NODES = [
-    {'host': '139.59.119.65', 'port': 7001},  # Ganti dengan IP VPS1
-    {'host': '139.59.119.65', 'port': 7002},
-    {'host': '139.59.119.65', 'port': 7003},
+    {'host': VPS1_HOST, 'port': 7001},  # Ganti dengan IP VPS1
+    {'host': VPS1_HOST, 'port': 7002},
+    {'host': VPS1_HOST, 'port': 7003},
 ]
 
 NUM_KEYS = 10000
 
+# 'sync' issues one blocking command at a time; 'async' keeps ASYNC_CONCURRENCY commands in flight
+EXECUTION_MODE = 'sync'
+
+# Sync write path: 'single' (one SET per key) or 'pipeline' (keys grouped by owning node)
+CLUSTER_WRITE_MODE = 'pipeline'
+CLUSTER_BATCH_SIZE = 500  # SETs per node pipeline
+MAX_REDIRECTS = 5  # MOVED/ASK re-routing rounds before a key counts as an error
+VALUE_SIZE = DEFAULT_VALUE_SIZE  # Bytes per value, sequence/timestamp header included
+
+# Value size sweep through cluster pipelines (see payload.py), empty skips it
+PAYLOAD_SWEEP_SIZES = SWEEP_SIZES
+
+# Multi-process load: one RedisCluster client per worker process, e.g. [1, 2, 4, 8]; empty skips it
+SCALING_WORKER_COUNTS = []
+SCALING_KEYS = 100000  # Keys written per scaling point
+SCALING_BATCH_SIZE = 1  # 1 = single SETs per worker, larger values use cluster pipelines
+
+# Skewed workload section: 'uniform', 'zipf', 'hotspot' or 'hashtag' (see workload.py), None skips it
+WORKLOAD_DISTRIBUTION = 'zipf'
+WORKLOAD_KEYS = 10000
+WORKLOAD_OPS = 100000
+WORKLOAD_READ_RATIO = 0.5
+
+# Replica reads: 'master', 'random', 'round_robin', 'lowest_latency' (see read_routing.py), empty skips it
+READ_ROUTING_POLICIES = ['master', 'random', 'round_robin', 'lowest_latency']
+READ_ROUTING_KEYS = 10000  # key0..keyN-1 read once per policy, capped at NUM_KEYS
+READ_ROUTING_THREADS = 4
+READ_ROUTING_INCLUDE_MASTER = False  # Replica policies also send reads to the master
+STALE_READ_PROBES = 1000  # Write-then-read pairs per policy for the stale-read rate
+
+# Server-side INFO timeline (see metrics_sampler.py), exported with the results; 0 disables it
+METRICS_SAMPLE_INTERVAL = SAMPLE_INTERVAL  # seconds
+
+# Per-phase split of wall time into process CPU, server execution and wire wait (see profiling.py)
+PROFILE_PHASES = True
+PROFILE_CPROFILE = False  # Top client functions per phase, slows the client down
+PROFILE_TRACEMALLOC = False  # Allocation peak and top allocation sites per phase, slows it down more
+
 def connect_cluster():
     """Connect to Redis Cluster"""
     try:
@@ -49,8 +103,6 @@ def get_cluster_info(cluster):
 def get_key_slot(key):
     """Calculate hash slot for a key"""
     # Redis uses CRC16 for hash slot calculation
-    import binascii
-    
     # Check for hash tag
     s = key.find('{')
     if s > -1:
@@ -61,6 +113,301 @@ def get_key_slot(key):
     crc = binascii.crc_hqx(key.encode('utf-8'), 0)
     return crc % 16384
 
+def new_node_stats():
+    """Empty per-node counters with a latency histogram"""
+    return {'keys': 0, 'ops': 0, 'duration': 0.0, 'histogram': LatencyHistogram()}
+
+def finish_node_stats(node_stats):
+    """Derive throughput and latency percentiles per node, return (node_stats, overall latency)"""
+    overall = merge_all(stats['histogram'] for stats in node_stats.values())
+    for stats in node_stats.values():
+        stats['keys_per_sec'] = stats['keys'] / stats['duration'] if stats['duration'] else 0.0
+        stats['avg_latency_ms'] = stats['duration'] / stats['ops'] * 1000 if stats['ops'] else 0.0
+        stats['latency'] = stats.pop('histogram').summary()
+    return node_stats, overall.summary()
+
+def write_keys(cluster, slot_map, num_keys, write_errors=None):
+    """Write test keys one SET at a time, return distribution, errors, duration and node stats"""
+    slot_distribution = defaultdict(int)
+    node_distribution = defaultdict(int)
+    if write_errors is None:
+        write_errors = []
+    node_stats = defaultdict(new_node_stats)
+    payload = PayloadGenerator(VALUE_SIZE)
+    
+    start_time = time.time()
+    
+    for i in range(num_keys):
+        key = f"key{i}"
+        value = payload.buffer(i)
+        
+        # Calculate slot
+        slot = get_key_slot(key)
+        
+        try:
+            op_start = time.perf_counter()
+            cluster.set(key, value)
+            op_duration = time.perf_counter() - op_start
+            slot_distribution[slot] += 1
+            
+            # Owning master according to the live slot map
+            node = slot_map.node_for_slot(slot)
+            node_distribution[node] += 1
+            stats = node_stats[node]
+            stats['keys'] += 1
+            stats['ops'] += 1
+            stats['duration'] += op_duration
+            stats['histogram'].record(op_duration)
+        
+        except Exception as e:
+            write_errors.append({'key': key, 'slot': slot, 'error': str(e)})
+        
+        if (i + 1) % 1000 == 0:
+            print(f"  Written {i + 1}/{num_keys} keys...")
+    
+    write_duration = time.time() - start_time
+    node_stats, latency = finish_node_stats(dict(node_stats))
+    write_stats = {'node_stats': node_stats, 'latency': latency}
+    return slot_distribution, node_distribution, write_errors, write_duration, write_stats
+
+def pipeline_to_node(client, items, batch_size, asking=False, latency=None):
+    """Send (key, value, slot) items to one node in pipelines, return (written, redirected, errors, batches)"""
+    written = []
+    redirected = []
+    errors = []
+    batches = 0
+    
+    for start in range(0, len(items), batch_size):
+        chunk = items[start:start + batch_size]
+        pipe = client.pipeline(transaction=False)
+        for key, value, slot in chunk:
+            # ASKING only applies to the command that follows it
+            if asking:
+                pipe.execute_command('ASKING')
+            pipe.set(key, value)
+        
+        try:
+            batches += 1
+            op_start = time.perf_counter_ns()
+            replies = pipe.execute(raise_on_error=False)
+            if latency is not None:
+                latency.record_ns(time.perf_counter_ns() - op_start)
+        except Exception as e:
+            errors.extend({'key': key, 'slot': slot, 'error': str(e)} for key, value, slot in chunk)
+            continue
+        
+        if asking:
+            replies = replies[1::2]
+        
+        for item, reply in zip(chunk, replies):
+            if not isinstance(reply, Exception):
+                written.append(item)
+                continue
+            redirect = parse_redirect(reply)
+            if redirect:
+                redirected.append((item, redirect))
+            else:
+                errors.append({'key': item[0], 'slot': item[2], 'error': str(reply)})
+    
+    return written, redirected, errors, batches
+
+def write_keys_pipelined(slot_map, num_keys, batch_size=CLUSTER_BATCH_SIZE, write_errors=None):
+    """Group keys by owning master and write one pipeline stream per node in parallel"""
+    slot_distribution = defaultdict(int)
+    node_distribution = defaultdict(int)
+    if write_errors is None:
+        write_errors = []
+    node_stats = {}
+    redirects = {'moved': 0, 'ask': 0}
+    node_clients = {}
+    
+    def client_for(host, port):
+        name = f"{host}:{port}"
+        if name not in node_clients:
+            node_clients[name] = redis.Redis(host=host, port=port, decode_responses=True, socket_timeout=30)
+        return node_clients[name]
+    
+    start_time = time.time()
+    
+    # Slots for all keys in one vectorized pass, then owners in one array lookup
+    keys = [f"key{i}" for i in range(num_keys)]
+    slots = key_slots(keys)
+    owners = slot_map.nodes_for_slots(slots)
+    # -1 would silently index the last master, so uncovered slots stop the run instead
+    uncovered = sorted(set(slots[owners < 0].tolist()))
+    if uncovered:
+        raise RuntimeError(f"{len(uncovered)} slots have no owner in the slot map (first: {uncovered[0]})")
+    owners = owners.tolist()
+    pending = defaultdict(list)
+    # Values are queued for every node before any is sent, so each needs its own bytes
+    payload = PayloadGenerator(VALUE_SIZE)
+    for i, (key, slot, owner) in enumerate(zip(keys, slots.tolist(), owners)):
+        value = payload.value(i)
+        host, port = slot_map.masters[owner].rsplit(':', 1)
+        pending[(host, int(port), False)].append((key, value, slot))
+    
+    def flush(target):
+        host, port, asking = target
+        node_start = time.time()
+        latency = LatencyHistogram()
+        outcome = pipeline_to_node(client_for(host, port), pending[target], batch_size, asking, latency)
+        return target, outcome, time.time() - node_start, latency
+    
+    for attempt in range(MAX_REDIRECTS + 1):
+        if not pending:
+            break
+        
+        with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+            outcomes = list(executor.map(flush, list(pending)))
+        
+        next_pending = defaultdict(list)
+        for (host, port, asking), (written, redirected, errors, batches), duration, latency in outcomes:
+            name = f"{host}:{port}"
+            if name not in node_stats:
+                node_stats[name] = new_node_stats()
+            stats = node_stats[name]
+            stats['keys'] += len(written)
+            stats['ops'] += batches
+            stats['duration'] += duration
+            # Per-thread histograms merged into the node's, one sample per pipeline round trip
+            stats['histogram'].merge(latency)
+            
+            for key, value, slot in written:
+                slot_distribution[slot] += 1
+                node_distribution[name] += 1
+            write_errors.extend(errors)
+            
+            # Re-route only the keys that were redirected
+            for item, (kind, slot, new_host, new_port) in redirected:
+                if kind == 'MOVED':
+                    redirects['moved'] += 1
+                    slot_map.apply_moved(slot, new_host, new_port)
+                    next_pending[(new_host, new_port, False)].append(item)
+                else:
+                    redirects['ask'] += 1
+                    next_pending[(new_host, new_port, True)].append(item)
+        
+        pending = next_pending
+    
+    for (host, port, asking), items in pending.items():
+        write_errors.extend(
+            {'key': key, 'slot': slot, 'error': f"Too many redirects (last {host}:{port})"}
+            for key, value, slot in items
+        )
+    
+    write_duration = time.time() - start_time
+    
+    for client in node_clients.values():
+        client.close()
+    
+    node_stats, latency = finish_node_stats(node_stats)
+    write_stats = {
+        'batch_size': batch_size,
+        'node_stats': node_stats,
+        'latency': latency,
+        'redirects': redirects
+    }
+    return slot_distribution, node_distribution, write_errors, write_duration, write_stats
+
+def run_payload_sweep(cluster, sizes=PAYLOAD_SWEEP_SIZES):
+    """Cluster-pipelined SETs of each value size, keys deleted again after every size"""
+    def write_batch(items):
+        pipe = cluster.pipeline()
+        for seq, value in items:
+            pipe.set(f"payload_sweep:{seq}", value)
+        pipe.execute()
+    
+    def after(size, ops, result):
+        # Large values add up quickly, drop them before the next size
+        pipe = cluster.pipeline()
+        for seq in range(ops):
+            pipe.delete(f"payload_sweep:{seq}")
+        pipe.execute(raise_on_error=False)
+    
+    return payload_sweep(write_batch, sizes, after)
+
+def read_keys(cluster, sample_size, latency=None):
+    """Read back the first sample_size keys, return (errors, duration)"""
+    read_errors = 0
+    read_start = time.time()
+    
+    for i in range(sample_size):
+        key = f"key{i}"
+        try:
+            op_start = time.perf_counter_ns()
+            value = cluster.get(key)
+            if latency is not None:
+                latency.record_ns(time.perf_counter_ns() - op_start)
+            if value is None:
+                read_errors += 1
+        except Exception as e:
+            read_errors += 1
+    
+    return read_errors, time.time() - read_start
+
+async def run_cluster_io_async(slot_map, num_keys, sample_size, concurrency=ASYNC_CONCURRENCY, read_latency=None, write_errors=None):
+    """Write then read test keys with `concurrency` commands in flight on redis.asyncio"""
+    cluster = AsyncRedisCluster(
+        host=CLUSTER_NODES[0]['host'],
+        port=CLUSTER_NODES[0]['port'],
+        decode_responses=True,
+        socket_timeout=30
+    )
+    await cluster.initialize()
+    
+    slot_distribution = defaultdict(int)
+    node_distribution = defaultdict(int)
+    if write_errors is None:
+        write_errors = []
+    node_stats = defaultdict(new_node_stats)
+    read_errors = 0
+    payload = PayloadGenerator(VALUE_SIZE)
+    
+    async def write_one(i):
+        key = f"key{i}"
+        slot = get_key_slot(key)
+        try:
+            op_start = time.perf_counter()
+            await cluster.set(key, payload.value(i))
+            op_duration = time.perf_counter() - op_start
+            slot_distribution[slot] += 1
+            node = slot_map.node_for_slot(slot)
+            node_distribution[node] += 1
+            stats = node_stats[node]
+            stats['keys'] += 1
+            stats['ops'] += 1
+            stats['duration'] += op_duration
+            stats['histogram'].record(op_duration)
+        except Exception as e:
+            write_errors.append({'key': key, 'slot': slot, 'error': str(e)})
+    
+    async def read_one(i):
+        nonlocal read_errors
+        try:
+            op_start = time.perf_counter_ns()
+            value = await cluster.get(f"key{i}")
+            if read_latency is not None:
+                read_latency.record_ns(time.perf_counter_ns() - op_start)
+            if value is None:
+                read_errors += 1
+        except Exception:
+            read_errors += 1
+    
+    try:
+        start_time = time.time()
+        await run_bounded((lambda i=i: write_one(i) for i in range(num_keys)), concurrency)
+        write_duration = time.time() - start_time
+        
+        read_start = time.time()
+        await run_bounded((lambda i=i: read_one(i) for i in range(sample_size)), concurrency)
+        read_duration = time.time() - read_start
+    finally:
+        await cluster.aclose()
+    
+    node_stats, latency = finish_node_stats(dict(node_stats))
+    write_stats = {'node_stats': node_stats, 'latency': latency}
+    return (slot_distribution, node_distribution, write_errors, write_duration, write_stats), (read_errors, read_duration)
+
 def run_scenario_3():
     """Run sharding test scenario"""
     print("\n" + "="*70)
@@ -73,7 +420,8 @@ def run_scenario_3():
         print("✗ Cannot proceed: Failed to connect to Redis Cluster")
         return
     
-    print(f"\nTest started at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    print(f"\nTest started at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Execution mode: {EXECUTION_MODE}\n")
     
     # Get cluster information
     print("CLUSTER INFORMATION:")
@@ -89,6 +437,13 @@ def run_scenario_3():
         print("\nCluster Nodes:")
         print(cluster_nodes)
     
+    # Live slot -> master map, used for every per-node figure below
+    slot_map = SlotMap().refresh(CLUSTER_NODES)
+    print(f"\nSlot map ({slot_map.source}):")
+    for start, end, master in slot_map.slot_ranges():
+        replicas = ', '.join(slot_map.replicas.get(master, [])) or '-'
+        print(f"  {start:5d}-{end:5d} → {master} (replicas: {replicas})")
+    
     print("\n" + "="*70)
     print("WRITING KEYS TO CLUSTER")
     print("="*70 + "\n")
@@ -104,43 +459,53 @@ def run_scenario_3():
     # Write keys to cluster
     print(f"Writing {NUM_KEYS} keys to cluster...\n")
     
-    slot_distribution = defaultdict(int)
-    node_distribution = defaultdict(int)
-    write_errors = []
-    
-    start_time = time.time()
-    
-    for i in range(NUM_KEYS):
-        key = f"key{i}"
-        value = f"value_{i}_{datetime.now().timestamp()}"
-        
-        # Calculate slot
-        slot = get_key_slot(key)
-        
-        try:
-            cluster.set(key, value)
-            slot_distribution[slot] += 1
-            
-            # Try to determine which node received the key
-            # This is approximate based on slot ranges
-            if slot < 5461:
-                node_distribution['node1'] += 1
-            elif slot < 10923:
-                node_distribution['node2'] += 1
-            else:
-                node_distribution['node3'] += 1
-                
-        except Exception as e:
-            write_errors.append({'key': key, 'slot': slot, 'error': str(e)})
-        
-        if (i + 1) % 1000 == 0:
-            print(f"  Written {i + 1}/{NUM_KEYS} keys...")
+    # Write errors are streamed as they happen, the summary is appended as the last record
+    output_file = f"scenario3_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+    sink = ResultSink(output_file, 'Redis Cluster Sharding')
+    # Every master and replica in the slot map, replicas included for their replication offsets
+    sampler = start_sampling(
+        slot_map.masters + [replica for replicas in slot_map.replicas.values() for replica in replicas],
+        METRICS_SAMPLE_INTERVAL
+    )
+    sink_errors = sink.collector('write_error')
+    profiler = None
+    if PROFILE_PHASES:
+        profiler = PhaseProfiler(
+            slot_map.masters, [replica for replicas in slot_map.replicas.values() for replica in replicas],
+            cprofile=PROFILE_CPROFILE, tracemalloc_capture=PROFILE_TRACEMALLOC
+        )
     
-    write_duration = time.time() - start_time
+    read_latency = LatencyHistogram()
+    # In async mode the reads run in the same event loop, so both land in this phase
+    with profile_phase(profiler, 'write' if EXECUTION_MODE != 'async' else 'write+read'):
+        if EXECUTION_MODE == 'async':
+            (slot_distribution, node_distribution, write_errors, write_duration, write_stats), (read_errors, read_duration) = \
+                asyncio.run(run_cluster_io_async(
+                    slot_map, NUM_KEYS, min(1000, NUM_KEYS), read_latency=read_latency, write_errors=sink_errors
+                ))
+        elif CLUSTER_WRITE_MODE == 'pipeline':
+            slot_distribution, node_distribution, write_errors, write_duration, write_stats = \
+                write_keys_pipelined(slot_map, NUM_KEYS, write_errors=sink_errors)
+        else:
+            slot_distribution, node_distribution, write_errors, write_duration, write_stats = \
+                write_keys(cluster, slot_map, NUM_KEYS, write_errors=sink_errors)
     
     print(f"\n✓ Completed writing keys in {write_duration:.2f} seconds")
     print(f"  Average: {NUM_KEYS/write_duration:.2f} writes/sec")
-    print(f"  Errors: {len(write_errors)}\n")
+    print(f"  Errors: {len(write_errors)}")
+    print(f"  Latency: {format_summary(write_stats['latency'])}\n")
+    
+    print("Per-node write stats:")
+    for name, stats in sorted(write_stats['node_stats'].items()):
+        print(
+            f"  {name}: {stats['keys']:6d} keys, {stats['keys_per_sec']:.2f} keys/sec, "
+            f"avg latency {stats['avg_latency_ms']:.3f} ms"
+        )
+        print(f"    {format_summary(stats['latency'])}")
+    if 'redirects' in write_stats:
+        print(f"  Pipeline batch size: {write_stats['batch_size']}")
+        print(f"  Redirects: MOVED={write_stats['redirects']['moved']}, ASK={write_stats['redirects']['ask']}")
+    print()
     
     # Analyze distribution
     print("="*70)
@@ -152,22 +517,22 @@ def run_scenario_3():
     print(f"Slot utilization: {len(slot_distribution)/16384*100:.2f}%\n")
     
     # Top 10 slots
-    top_slots = sorted(slot_distribution.items(), key=lambda x: x[1], reverse=True)[:10]
+    # Same ranking as the skewed workload report (workload.top_slots)
+    busiest = top_slots(slot_counts(slot_distribution), 10)
     print("Top 10 slots by key count:")
-    for slot, count in top_slots:
+    for slot, count in busiest:
         print(f"  Slot {slot:5d}: {count:4d} keys")
     
     # Node distribution
-    print(f"\nApproximate node distribution:")
+    print(f"\nNode distribution (live slot map):")
     total_keys = sum(node_distribution.values())
     for node, count in sorted(node_distribution.items()):
         print(f"  {node}: {count:6d} keys ({count/total_keys*100:.1f}%)")
     
     # Slot range statistics
     slot_ranges = {
-        'Range 0-5460 (Node 1)': sum(1 for s in slot_distribution.keys() if 0 <= s <= 5460),
-        'Range 5461-10922 (Node 2)': sum(1 for s in slot_distribution.keys() if 5461 <= s <= 10922),
-        'Range 10923-16383 (Node 3)': sum(1 for s in slot_distribution.keys() if 10923 <= s <= 16383)
+        f"Range {start}-{end} ({master})": sum(1 for s in slot_distribution.keys() if start <= s <= end)
+        for start, end, master in slot_map.slot_ranges()
     }
     
     print(f"\nSlot range coverage:")
@@ -180,25 +545,66 @@ def run_scenario_3():
     print("="*70 + "\n")
     
     print("Testing read consistency...")
-    read_errors = 0
-    read_start = time.time()
-    
     sample_size = min(1000, NUM_KEYS)
-    for i in range(sample_size):
-        key = f"key{i}"
-        try:
-            value = cluster.get(key)
-            if value is None:
-                read_errors += 1
-        except Exception as e:
-            read_errors += 1
-    
-    read_duration = time.time() - read_start
+    if EXECUTION_MODE != 'async':
+        with profile_phase(profiler, 'read'):
+            read_errors, read_duration = read_keys(cluster, sample_size, read_latency)
     
     print(f"✓ Read {sample_size} keys in {read_duration:.2f} seconds")
     print(f"  Average: {sample_size/read_duration:.2f} reads/sec")
+    print(f"  Latency: {format_summary(read_latency.summary())}")
     print(f"  Missing/Error: {read_errors} ({read_errors/sample_size*100:.1f}%)\n")
     
+    read_routing = None
+    if READ_ROUTING_POLICIES:
+        print("="*70)
+        print("REPLICA READ ROUTING")
+        print("="*70 + "\n")
+        routing_keys = [f"key{i}" for i in range(min(READ_ROUTING_KEYS, NUM_KEYS))]
+        routing_slots = key_slots(routing_keys).tolist()
+        with profile_phase(profiler, 'read_routing'):
+            read_routing = compare_read_policies(
+                slot_map, routing_keys, routing_slots, READ_ROUTING_POLICIES,
+                READ_ROUTING_THREADS, STALE_READ_PROBES, READ_ROUTING_INCLUDE_MASTER
+            )
+        print(f"{len(routing_keys)} reads per policy over {READ_ROUTING_THREADS} threads, "
+              f"{STALE_READ_PROBES} write-then-read probes for stale reads:")
+        print_read_policies(read_routing)
+        print()
+    
+    skew = None
+    if WORKLOAD_DISTRIBUTION:
+        print("="*70)
+        print("SKEWED WORKLOAD / HOT SLOTS")
+        print("="*70 + "\n")
+        workload = generate_workload(WORKLOAD_DISTRIBUTION, WORKLOAD_KEYS, WORKLOAD_OPS, WORKLOAD_READ_RATIO)
+        with profile_phase(profiler, 'skewed_workload'):
+            workload_nodes, workload_run = run_workload(workload, slot_map)
+        skew = load_report(workload, slot_map, node_stats=workload_nodes)
+        print_load_report(skew, workload_nodes, workload_run)
+        skew.update({'node_stats': workload_nodes, 'run': workload_run})
+        print()
+    
+    payload = None
+    if PAYLOAD_SWEEP_SIZES:
+        print("="*70)
+        print("VALUE SIZE SWEEP")
+        print("="*70 + "\n")
+        with profile_phase(profiler, 'payload_sweep'):
+            payload = run_payload_sweep(cluster)
+        print_payload_sweep(payload)
+        print()
+    
+    scaling = None
+    if SCALING_WORKER_COUNTS:
+        print("="*70)
+        print("MULTI-PROCESS SCALING CURVE")
+        print("="*70)
+        with profile_phase(profiler, 'scaling_curve'):
+            scaling = scaling_curve(CLUSTER_NODES, SCALING_WORKER_COUNTS, SCALING_KEYS, SCALING_BATCH_SIZE)
+        print_scaling_curve(scaling)
+        print()
+    
     # Key pattern analysis
     print("="*70)
     print("KEY PATTERN ANALYSIS")
@@ -215,27 +621,64 @@ def run_scenario_3():
         print(f"\n{pattern_type.upper()}:")
         for key in keys:
             slot = get_key_slot(key)
-            node = 'node1' if slot < 5461 else ('node2' if slot < 10923 else 'node3')
+            node = slot_map.node_for_slot(slot)
             print(f"  {key:20s} → Slot {slot:5d} → {node}")
     
+    phase_profile = None
+    if profiler:
+        profiler.close()
+        phase_profile = profiler.phases
+        for phase in phase_profile:
+            sink.write('phase_profile', **phase)
+        print("\n" + "="*70)
+        print("PHASE PROFILE (process CPU / server / wire wait)")
+        print("="*70 + "\n")
+        print_phase_profile(phase_profile)
+    
+    server_metrics = finish_sampling(sampler, sink)
+    
     # Save results
     result_data = {
         'scenario': 'Redis Cluster Sharding',
         'timestamp': datetime.now().isoformat(),
         'config': {
             'num_keys': NUM_KEYS,
-            'cluster_nodes': CLUSTER_NODES
+            'execution_mode': EXECUTION_MODE,
+            'cluster_nodes': CLUSTER_NODES,
+            'value_size': VALUE_SIZE,
+            'payload_sweep_sizes': PAYLOAD_SWEEP_SIZES,
+            'scaling_worker_counts': SCALING_WORKER_COUNTS,
+            'scaling_keys': SCALING_KEYS,
+            'scaling_batch_size': SCALING_BATCH_SIZE,
+            'workload_distribution': WORKLOAD_DISTRIBUTION,
+            'workload_keys': WORKLOAD_KEYS,
+            'workload_ops': WORKLOAD_OPS,
+            'workload_read_ratio': WORKLOAD_READ_RATIO,
+            'read_routing_policies': READ_ROUTING_POLICIES,
+            'read_routing_keys': READ_ROUTING_KEYS,
+            'read_routing_threads': READ_ROUTING_THREADS,
+            'read_routing_include_master': READ_ROUTING_INCLUDE_MASTER,
+            'stale_read_probes': STALE_READ_PROBES,
+            'metrics_sample_interval': METRICS_SAMPLE_INTERVAL,
+            'profile_phases': PROFILE_PHASES,
+            'profile_cprofile': PROFILE_CPROFILE,
+            'profile_tracemalloc': PROFILE_TRACEMALLOC
         },
         'write_stats': {
             'duration': write_duration,
             'keys_per_sec': NUM_KEYS/write_duration,
-            'errors': len(write_errors)
+            'errors': len(write_errors),
+            'write_mode': CLUSTER_WRITE_MODE if EXECUTION_MODE != 'async' else 'async',
+            'node_stats': write_stats['node_stats'],
+            'latency': write_stats['latency'],
+            'redirects': write_stats.get('redirects')
         },
         'read_stats': {
             'sample_size': sample_size,
             'duration': read_duration,
             'keys_per_sec': sample_size/read_duration,
-            'errors': read_errors
+            'errors': read_errors,
+            'latency': read_latency.summary()
         },
         'distribution': {
             'unique_slots': len(slot_distribution),
@@ -243,15 +686,20 @@ def run_scenario_3():
             'slot_utilization': len(slot_distribution)/16384,
             'node_distribution': dict(node_distribution),
             'slot_range_coverage': slot_ranges,
-            'top_10_slots': [{'slot': s, 'count': c} for s, c in top_slots]
+            'top_10_slots': [{'slot': s, 'count': c} for s, c in busiest]
         },
+        'topology': slot_map.to_dict(),
+        'read_routing': read_routing,
+        'payload_sweep': payload,
+        'skewed_workload': skew,
+        'scaling_curve': scaling,
+        'server_metrics': server_metrics,
+        'phase_profile': phase_profile,
         'cluster_info': cluster_info if cluster_info else 'Not available',
-        'write_errors_sample': write_errors[:10] if write_errors else []
+        'write_errors_sample': write_errors.sample
     }
     
-    output_file = f"scenario3_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-    with open(output_file, 'w') as f:
-        json.dump(result_data, f, indent=2)
+    sink.close(result_data)
     
     print(f"\n✓ Results saved to {output_file}")
     print("="*70 + "\n")
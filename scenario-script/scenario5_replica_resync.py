@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+Skenario 5: Partial vs Full Resync pada Replica
+Tujuan: Mengukur biaya pemulihan replica yang terputus saat beban tulis berjalan
+Aspek: PSYNC partial/full, replication backlog, catch-up time, throughput dip pada master
+"""
+
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import redis
+from latency_histogram import LatencyHistogram, merge_all, format_summary
+from payload import PayloadGenerator
+from result_sink import ResultSink
+from metrics_sampler import SAMPLE_INTERVAL, start_sampling, finish_sampling
+
+# Configuration
+VPS2_HOST = os.environ.get('REPLICATION_HOST', '134.209.106.37')  # 127.0.0.1 with python -m resp_emulator
+REDIS_MASTER_HOST = VPS2_HOST  # IP VPS2
+REDIS_MASTER_PORT = 6379
+RESYNC_REPLICA_HOST = VPS2_HOST  # IP VPS2, the replica that gets disconnected
+RESYNC_REPLICA_PORT = 6381
+
+# Dataset the master holds: a full resync has to ship all of it
+DATASET_KEYS = 100000
+VALUE_SIZE = 1024  # Bytes per value (see payload.py)
+PRELOAD_BATCH_SIZE = 1000
+
+# Write load on the master during every run
+LOAD_THREADS = 2  # Closed-loop SET threads
+
+# Sweep: every backlog size is tried with every outage length
+BACKLOG_SIZES = [1024 * 1024, 16 * 1024 * 1024, 64 * 1024 * 1024]  # CONFIG SET repl-backlog-size
+OUTAGE_SECONDS = [1, 5]  # How long the replica stays disconnected
+
+# While disconnected the replica follows an address nobody listens on, keeping its replication state
+UNREACHABLE_MASTER = ('127.0.0.1', 1)
+
+BASELINE_SECONDS = 3  # Load before the replica is disconnected
+RECOVERY_SECONDS = 3  # Load after the replica caught up
+SYNC_TIMEOUT = 120  # seconds to wait for the replica to reconnect and catch up
+POLL_INTERVAL = 0.01  # seconds between INFO replication polls while resyncing
+TIMELINE_INTERVAL = 0.5  # seconds per throughput bucket
+
+# Server-side INFO timeline (see metrics_sampler.py), exported with the results; 0 disables it
+METRICS_SAMPLE_INTERVAL = SAMPLE_INTERVAL  # seconds
+
+KEY_PREFIX = 'resync_key'
+
+def connect_redis(host, port, name):
+    """Connect to Redis instance"""
+    try:
+        client = redis.Redis(host=host, port=port, decode_responses=True, socket_timeout=30)
+        client.ping()
+        print(f"✓ Connected to {name} at {host}:{port}")
+        return client
+    except Exception as e:
+        print(f"✗ Failed to connect to {name}: {e}")
+        return None
+
+def preload_dataset(master):
+    """Write DATASET_KEYS values of VALUE_SIZE bytes, return the dataset size in bytes"""
+    payload = PayloadGenerator(VALUE_SIZE, ring=PRELOAD_BATCH_SIZE)
+    for start in range(0, DATASET_KEYS, PRELOAD_BATCH_SIZE):
+        pipe = master.pipeline(transaction=False)
+        for i in range(start, min(start + PRELOAD_BATCH_SIZE, DATASET_KEYS)):
+            pipe.set(f"{KEY_PREFIX}{i}", payload.buffer(i))
+        pipe.execute()
+    return DATASET_KEYS * (VALUE_SIZE + len(f"{KEY_PREFIX}{DATASET_KEYS}"))
+
+def delete_dataset(master):
+    """Remove the preloaded keys so the shared master is left as found"""
+    for start in range(0, DATASET_KEYS, PRELOAD_BATCH_SIZE):
+        master.delete(*[f"{KEY_PREFIX}{i}" for i in range(start, min(start + PRELOAD_BATCH_SIZE, DATASET_KEYS))])
+
+def sync_counters(master):
+    """sync_full / sync_partial_ok / sync_partial_err from the master's INFO stats"""
+    stats = master.info('stats')
+    return {field: int(stats.get(field, 0)) for field in ('sync_full', 'sync_partial_ok', 'sync_partial_err')}
+
+def wait_until_synced(master, replica, timeout=SYNC_TIMEOUT):
+    """Block until the replica's link is up and it reached the master's current offset"""
+    target = int(master.info('replication')['master_repl_offset'])
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        info = replica.info('replication')
+        if info.get('master_link_status') == 'up' and int(info.get('slave_repl_offset', 0)) >= target:
+            return True
+        time.sleep(POLL_INTERVAL)
+    return False
+
+def new_bucket():
+    """Counters for one timeline interval"""
+    return {'writes': 0, 'errors': 0, 'histogram': LatencyHistogram()}
+
+def load_worker(worker_id, t0, stop):
+    """Closed-loop SETs on random dataset keys, return the thread's timeline buckets"""
+    master = redis.Redis(host=REDIS_MASTER_HOST, port=REDIS_MASTER_PORT, decode_responses=True, socket_timeout=30)
+    payload = PayloadGenerator(VALUE_SIZE, seed=worker_id)
+    rng = random.Random(worker_id)
+    timeline = defaultdict(new_bucket)
+    seq = 0
+    
+    try:
+        while not stop.is_set():
+            i = rng.randrange(DATASET_KEYS)
+            bucket = timeline[int((time.perf_counter() - t0) / TIMELINE_INTERVAL)]
+            op_start = time.perf_counter_ns()
+            try:
+                master.set(f"{KEY_PREFIX}{i}", payload.buffer(seq))
+                bucket['histogram'].record_ns(time.perf_counter_ns() - op_start)
+                bucket['writes'] += 1
+            except Exception:
+                bucket['errors'] += 1
+            seq += 1
+    finally:
+        master.close()
+    
+    return dict(timeline)
+
+def merge_timelines(timelines):
+    """Combine per-thread buckets into one sorted list of per-interval summaries"""
+    merged = defaultdict(new_bucket)
+    for timeline in timelines:
+        for index, bucket in timeline.items():
+            total = merged[index]
+            total['writes'] += bucket['writes']
+            total['errors'] += bucket['errors']
+            total['histogram'].merge(bucket['histogram'])
+    
+    return [
+        {
+            'second': index * TIMELINE_INTERVAL,
+            'writes': merged[index]['writes'],
+            'ops_per_sec': merged[index]['writes'] / TIMELINE_INTERVAL,
+            'errors': merged[index]['errors'],
+            'latency': merged[index]['histogram'].summary(),
+            'histogram': merged[index]['histogram']
+        }
+        for index in sorted(merged)
+    ]
+
+def phase_stats(timeline, start, end):
+    """Throughput and latency over [start, end), buckets weighted by the part of them inside
+    
+    A phase can be shorter than a bucket (a partial resync takes a few hundred
+    ms), so counts are scaled by overlap instead of taking whole buckets.
+    Latency and the worst interval come from buckets mostly inside the phase,
+    or the best-covered one when none is.
+    """
+    weighted = []
+    for b in timeline:
+        overlap = min(end, b['second'] + TIMELINE_INTERVAL) - max(start, b['second'])
+        if overlap > 0:
+            weighted.append((b, overlap / TIMELINE_INTERVAL))
+    core = [b for b, weight in weighted if weight >= 0.5]
+    if not core and weighted:
+        core = [max(weighted, key=lambda entry: entry[1])[0]]
+    
+    writes = sum(b['writes'] * weight for b, weight in weighted)
+    seconds = sum(weight for _, weight in weighted) * TIMELINE_INTERVAL
+    return {
+        'seconds': seconds,
+        'writes': round(writes),
+        'ops_per_sec': writes / seconds if seconds else 0.0,
+        'min_bucket_ops_per_sec': min((b['ops_per_sec'] for b in core), default=0.0),
+        'errors': round(sum(b['errors'] * weight for b, weight in weighted)),
+        'latency': merge_all(b['histogram'] for b in core).summary()
+    }
+
+def track_resync(master, replica, t0, reattach_at, target_offset):
+    """Poll the replica after REPLICAOF until it is back online and reached target_offset
+    
+    Returns milliseconds after the REPLICAOF until a full sync was first seen
+    running, the link came up and the replica caught up, plus the lag timeline.
+    """
+    sync_seen = link_up = caught_up = None
+    lag_timeline = []
+    deadline = time.perf_counter() + SYNC_TIMEOUT
+    
+    while time.perf_counter() < deadline:
+        info = replica.info('replication')
+        master_offset = int(master.info('replication')['master_repl_offset'])
+        now = time.perf_counter() - t0
+        offset = int(info.get('slave_repl_offset', 0))
+        
+        if sync_seen is None and int(info.get('master_sync_in_progress', 0)):
+            sync_seen = now
+        if link_up is None and info.get('master_link_status') == 'up':
+            link_up = now
+        lag_timeline.append({
+            'second': round(now, 3),
+            'link': info.get('master_link_status'),
+            'offset': offset,
+            'lag_bytes': max(master_offset - offset, 0)
+        })
+        if link_up is not None and offset >= target_offset:
+            caught_up = now
+            break
+        time.sleep(POLL_INTERVAL)
+    
+    return {
+        'sync_started_ms': (sync_seen - reattach_at) * 1000 if sync_seen is not None else None,
+        'reconnect_ms': (link_up - reattach_at) * 1000 if link_up is not None else None,
+        'catch_up_ms': (caught_up - reattach_at) * 1000 if caught_up is not None else None,
+        'caught_up_at': caught_up,
+        'lag_timeline': lag_timeline
+    }
+
+def run_resync(master, replica, master_addr, backlog_size, outage_seconds):
+    """One run: disconnect the replica under load for outage_seconds, reconnect and measure the resync"""
+    master.config_set('repl-backlog-size', backlog_size)
+    if not wait_until_synced(master, replica):
+        raise RuntimeError("replica is not in sync before the run")
+    counters_before = sync_counters(master)
+    
+    stop = threading.Event()
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=LOAD_THREADS) as executor:
+        futures = [executor.submit(load_worker, worker_id, t0, stop) for worker_id in range(LOAD_THREADS)]
+        try:
+            time.sleep(BASELINE_SECONDS)
+            
+            detached_offset = int(replica.info('replication')['slave_repl_offset'])
+            replica.execute_command('REPLICAOF', *UNREACHABLE_MASTER)
+            detach_at = time.perf_counter() - t0
+            print(f"  [+{detach_at:6.2f}s] Replica disconnected at offset {detached_offset}")
+            time.sleep(outage_seconds)
+            
+            # Whether PSYNC can be partial is decided by the backlog at reconnect time
+            backlog = master.info('replication')
+            target_offset = int(backlog['master_repl_offset'])
+            first_byte = int(backlog['repl_backlog_first_byte_offset'])
+            replica.execute_command('REPLICAOF', *master_addr)
+            reattach_at = time.perf_counter() - t0
+            print(f"  [+{reattach_at:6.2f}s] Replica reconnecting, {target_offset - detached_offset} bytes behind")
+            
+            resync = track_resync(master, replica, t0, reattach_at, target_offset)
+            caught_up_at = resync['caught_up_at']
+            if caught_up_at is not None:
+                print(f"  [+{caught_up_at:6.2f}s] Replica caught up after {resync['catch_up_ms']:.0f} ms")
+            else:
+                print(f"  ✗ Replica did not catch up within {SYNC_TIMEOUT}s")
+            time.sleep(RECOVERY_SECONDS)
+        finally:
+            stop.set()
+        timeline = merge_timelines(future.result() for future in futures)
+    
+    counters_after = sync_counters(master)
+    delta = {field: counters_after[field] - counters_before[field] for field in counters_after}
+    if delta['sync_full']:
+        sync_type = 'full'
+    elif delta['sync_partial_ok']:
+        sync_type = 'partial'
+    else:
+        sync_type = 'none'
+    
+    sync_end = caught_up_at if caught_up_at is not None else float('inf')
+    phases = {
+        'baseline': phase_stats(timeline, 0, detach_at),
+        'outage': phase_stats(timeline, detach_at, reattach_at),
+        'resync': phase_stats(timeline, reattach_at, sync_end),
+        'recovery': phase_stats(timeline, sync_end, float('inf'))
+    }
+    baseline_rate = phases['baseline']['ops_per_sec']
+    resync_rate = phases['resync']
+    
+    return {
+        'backlog_size': backlog_size,
+        'outage_seconds': outage_seconds,
+        'missed_bytes': target_offset - detached_offset,
+        'backlog_covers': detached_offset + 1 >= first_byte,
+        'sync_type': sync_type,
+        'sync_counters': delta,
+        'sync_started_ms': resync['sync_started_ms'],
+        'reconnect_ms': resync['reconnect_ms'],
+        'catch_up_ms': resync['catch_up_ms'],
+        'phases': phases,
+        # Master throughput during the resync relative to the baseline: mean and worst interval
+        'throughput_dip': 1 - resync_rate['ops_per_sec'] / baseline_rate if baseline_rate else None,
+        'worst_interval_dip': 1 - resync_rate['min_bucket_ops_per_sec'] / baseline_rate if baseline_rate else None,
+        'window': {'detach': detach_at, 'reattach': reattach_at, 'caught_up': caught_up_at},
+        'lag_timeline': resync['lag_timeline'],
+        'timeline': [{k: v for k, v in bucket.items() if k != 'histogram'} for bucket in timeline]
+    }
+
+def print_run(run):
+    """Phase summary of one run"""
+    print(f"  Sync: {run['sync_type']} (backlog covered the gap: {'yes' if run['backlog_covers'] else 'no'}), "
+          f"counters {run['sync_counters']}")
+    reconnect = f"{run['reconnect_ms']:.0f} ms" if run['reconnect_ms'] is not None else 'timeout'
+    catch_up = f"{run['catch_up_ms']:.0f} ms" if run['catch_up_ms'] is not None else 'timeout'
+    print(f"  Link up after {reconnect}, caught up after {catch_up}")
+    baseline_rate = run['phases']['baseline']['ops_per_sec']
+    for name, stats in run['phases'].items():
+        change = (stats['ops_per_sec'] / baseline_rate - 1) * 100 if baseline_rate else 0.0
+        print(f"  {name:9s} {stats['ops_per_sec']:8.0f} writes/sec ({change:+6.1f}%)  {format_summary(stats['latency'])}")
+
+def run_scenario_5():
+    """Run partial vs full resync benchmark"""
+    print("\n" + "="*70)
+    print("SKENARIO 5: PARTIAL VS FULL RESYNC")
+    print("="*70 + "\n")
+    
+    master = connect_redis(REDIS_MASTER_HOST, REDIS_MASTER_PORT, "Master")
+    replica = connect_redis(RESYNC_REPLICA_HOST, RESYNC_REPLICA_PORT, "Replica")
+    if not all([master, replica]):
+        print("\n✗ Cannot proceed: Failed to connect to all Redis instances")
+        return
+    
+    # The replica reconnects to the master by the address it already uses (e.g. the docker hostname)
+    info = replica.info('replication')
+    if info.get('role') != 'slave':
+        print(f"\n✗ Cannot proceed: {RESYNC_REPLICA_HOST}:{RESYNC_REPLICA_PORT} is not a replica")
+        return
+    master_addr = (info['master_host'], int(info['master_port']))
+    original_backlog = int(master.config_get('repl-backlog-size').get('repl-backlog-size', 1024 * 1024))
+    
+    print(f"\nTest started at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Replica follows the master as {master_addr[0]}:{master_addr[1]}, backlog is {original_backlog} bytes")
+    print(f"Runs: backlog sizes {BACKLOG_SIZES} x outages {OUTAGE_SECONDS}s, {LOAD_THREADS} writer threads\n")
+    
+    print(f"Preloading {DATASET_KEYS} keys of {VALUE_SIZE} bytes...")
+    dataset_bytes = preload_dataset(master)
+    print(f"✓ Dataset is about {dataset_bytes / 1e6:.1f} MB\n")
+    
+    output_file = f"scenario5_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+    sink = ResultSink(output_file, 'Replica Resync')
+    sampler = start_sampling(
+        [f"{REDIS_MASTER_HOST}:{REDIS_MASTER_PORT}", f"{RESYNC_REPLICA_HOST}:{RESYNC_REPLICA_PORT}"],
+        METRICS_SAMPLE_INTERVAL
+    )
+    
+    runs = []
+    try:
+        for backlog_size in BACKLOG_SIZES:
+            for outage_seconds in OUTAGE_SECONDS:
+                print("-"*70)
+                print(f"Backlog {backlog_size / 1024 / 1024:g} MB, outage {outage_seconds}s")
+                print("-"*70)
+                try:
+                    run = run_resync(master, replica, master_addr, backlog_size, outage_seconds)
+                except Exception as e:
+                    print(f"  ✗ Run failed: {e}")
+                    replica.execute_command('REPLICAOF', *master_addr)
+                    continue
+                print_run(run)
+                print()
+                runs.append(run)
+                sink.write('resync_run', **run)
+    finally:
+        # Leave the replica attached, the backlog as it was found and no dataset behind
+        replica.execute_command('REPLICAOF', *master_addr)
+        master.config_set('repl-backlog-size', original_backlog)
+        delete_dataset(master)
+    
+    server_metrics = finish_sampling(sampler, sink)
+    
+    print("="*70)
+    print("HASIL PENGUJIAN")
+    print("="*70)
+    print(f"\n  {'Backlog':>9} {'Outage':>7} {'Missed MB':>10} {'Sync':>8} {'Link up ms':>11} "
+          f"{'Catch-up ms':>12} {'Dip':>7} {'Worst':>7}")
+    for run in runs:
+        link_up = f"{run['reconnect_ms']:.0f}" if run['reconnect_ms'] is not None else 'timeout'
+        catch_up = f"{run['catch_up_ms']:.0f}" if run['catch_up_ms'] is not None else 'timeout'
+        dip = f"{run['throughput_dip']:.1%}" if run['throughput_dip'] is not None else '-'
+        worst = f"{run['worst_interval_dip']:.1%}" if run['worst_interval_dip'] is not None else '-'
+        print(
+            f"  {run['backlog_size'] / 1024 / 1024:7g}MB {run['outage_seconds']:6g}s "
+            f"{run['missed_bytes'] / 1e6:10.2f} {run['sync_type']:>8} {link_up:>11} {catch_up:>12} {dip:>7} {worst:>7}"
+        )
+    
+    result_data = {
+        'scenario': 'Replica Resync',
+        'timestamp': datetime.now().isoformat(),
+        'config': {
+            'master': f"{REDIS_MASTER_HOST}:{REDIS_MASTER_PORT}",
+            'replica': f"{RESYNC_REPLICA_HOST}:{RESYNC_REPLICA_PORT}",
+            'dataset_keys': DATASET_KEYS,
+            'value_size': VALUE_SIZE,
+            'load_threads': LOAD_THREADS,
+            'backlog_sizes': BACKLOG_SIZES,
+            'outage_seconds': OUTAGE_SECONDS,
+            'baseline_seconds': BASELINE_SECONDS,
+            'recovery_seconds': RECOVERY_SECONDS,
+            'timeline_interval': TIMELINE_INTERVAL,
+            'metrics_sample_interval': METRICS_SAMPLE_INTERVAL
+        },
+        'dataset_bytes': dataset_bytes,
+        'original_backlog_size': original_backlog,
+        'runs': [{k: v for k, v in run.items() if k not in ('lag_timeline', 'timeline')} for run in runs],
+        'server_metrics': server_metrics
+    }
+    
+    sink.close(result_data)
+    
+    print(f"\n✓ Results saved to {output_file}")
+    print("="*70 + "\n")
+    
+    master.close()
+    replica.close()
+
+if __name__ == "__main__":
+    try:
+        run_scenario_5()
+    except KeyboardInterrupt:
+        print("\n\n✗ Test interrupted by user")
+    except Exception as e:
+        print(f"\n✗ Error during test: {e}")
+        import traceback
+        traceback.print_exc()
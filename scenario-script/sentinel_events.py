@@ -0,0 +1,139 @@
+"""
+Sentinel pub/sub event watcher
+Subscribes to the failover channels of every sentinel concurrently (one
+thread per sentinel) and timestamps each event with perf_counter_ns, so
+failover phases can be measured without polling the sentinels.
+"""
+
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+import redis
+
+FAILOVER_CHANNELS = ['+sdown', '+odown', '+try-failover', '+elected-leader', '+switch-master']
+
+# Consecutive phases of a sentinel failover, measured between first sightings
+FAILOVER_PHASES = [
+    ('detection', '+sdown', '+odown'),
+    ('failover_start', '+odown', '+try-failover'),
+    ('election', '+try-failover', '+elected-leader'),
+    ('promotion', '+elected-leader', '+switch-master'),
+    ('total', '+sdown', '+switch-master'),
+]
+
+class SentinelEventWatcher:
+    """Concurrent subscriber to sentinel failover events for one monitored master"""
+    
+    def __init__(self, sentinel_hosts, master_name, channels=FAILOVER_CHANNELS):
+        self.sentinel_hosts = sentinel_hosts
+        self.master_name = master_name
+        self.channels = channels
+        self.events = []  # every event seen by any sentinel, in arrival order
+        self.first_seen = {}  # channel -> first event for the monitored master
+        self._callbacks = defaultdict(list)
+        self._arrived = defaultdict(threading.Event)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self._clients = []
+    
+    def on(self, channel, callback):
+        """Register callback(event) for a channel, called from the listener thread"""
+        self._callbacks[channel].append(callback)
+        return self
+    
+    def start(self):
+        """Subscribe on every sentinel and start one listener thread each"""
+        for host, port in self.sentinel_hosts:
+            client = redis.Redis(host=host, port=port, decode_responses=True, socket_timeout=5)
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(*self.channels)
+            self._clients.append((client, pubsub))
+            
+            thread = threading.Thread(
+                target=self._listen, args=(f"{host}:{port}", pubsub),
+                name=f"sentinel-events-{host}:{port}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        return self
+    
+    def stop(self):
+        """Stop listener threads and close the subscriptions"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=2)
+        for client, pubsub in self._clients:
+            try:
+                pubsub.close()
+                client.close()
+            except Exception:
+                pass
+    
+    def _listen(self, sentinel_name, pubsub):
+        """Listener thread body: timestamp and record every message"""
+        while not self._stop.is_set():
+            try:
+                message = pubsub.get_message(timeout=0.1)
+            except redis.exceptions.TimeoutError:
+                continue
+            except Exception as e:
+                print(f"⚠ Sentinel {sentinel_name} event stream failed: {e}")
+                return
+            if not message or message['type'] != 'message':
+                continue
+            
+            event = {
+                'perf_ns': time.perf_counter_ns(),
+                'timestamp': datetime.now().strftime('%H:%M:%S.%f')[:-3],
+                'sentinel': sentinel_name,
+                'channel': message['channel'],
+                'data': message['data'],
+                'for_master': self._is_master_event(message['channel'], message['data'])
+            }
+            self._record(event)
+    
+    def _is_master_event(self, channel, data):
+        """True when the event concerns the monitored master itself (not a replica/sentinel)"""
+        parts = data.split()
+        if channel == '+switch-master':
+            return bool(parts) and parts[0] == self.master_name
+        return len(parts) >= 2 and parts[0] == 'master' and parts[1] == self.master_name
+    
+    def _record(self, event):
+        """Store an event, remember the first sighting per channel and fire callbacks"""
+        with self._lock:
+            self.events.append(event)
+            first = event['for_master'] and event['channel'] not in self.first_seen
+            if first:
+                self.first_seen[event['channel']] = event
+        
+        if first:
+            self._arrived[event['channel']].set()
+        for callback in self._callbacks[event['channel']]:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"⚠ Sentinel event callback failed: {e}")
+    
+    def wait_for(self, channel, timeout=None):
+        """Block until the monitored master's first event on channel, return it or None"""
+        if self._arrived[channel].wait(timeout):
+            return self.first_seen[channel]
+        return None
+    
+    def reset(self):
+        """Forget first sightings so the next failover can be measured"""
+        with self._lock:
+            self.first_seen = {}
+            self._arrived = defaultdict(threading.Event)
+    
+    def phase_breakdown(self):
+        """Milliseconds between first sightings of consecutive failover phases"""
+        breakdown = {}
+        for phase, start_channel, end_channel in FAILOVER_PHASES:
+            start, end = self.first_seen.get(start_channel), self.first_seen.get(end_channel)
+            if start and end:
+                breakdown[phase] = (end['perf_ns'] - start['perf_ns']) / 1_000_000
+        return breakdown
@@ -0,0 +1,161 @@
+"""
+Failover-aware connection manager for a Sentinel-monitored master
+Caches the resolved master/replica addresses and keeps one connection pool
+per node, so steady-state commands skip both sentinel discovery and the TCP
+handshake. Pools are rebuilt only on +switch-master or on a READONLY /
+connection error.
+"""
+
+import itertools
+from collections import deque
+import threading
+import time
+from datetime import datetime
+import redis
+from redis.sentinel import Sentinel
+from sentinel_events import SentinelEventWatcher
+
+POOL_MAX_CONNECTIONS = 50
+INVALIDATION_HISTORY = 100  # Most recent invalidations kept for stats()
+
+# Errors meaning the cached master is no longer the master
+FAILOVER_ERRORS = (
+    redis.exceptions.ReadOnlyError,
+    redis.exceptions.ConnectionError,
+    redis.exceptions.TimeoutError,
+)
+
+class SentinelConnectionManager:
+    """Pooled master/replica clients that follow sentinel failovers"""
+    
+    def __init__(self, sentinel_hosts, master_name, address_map=None, watch_events=True,
+                 max_connections=POOL_MAX_CONNECTIONS, **connection_kwargs):
+        self.sentinel = Sentinel(sentinel_hosts, socket_timeout=5)
+        self.master_name = master_name
+        self.address_map = address_map or (lambda host, port: (host, port))  # announced -> reachable
+        self.max_connections = max_connections
+        self.connection_kwargs = connection_kwargs
+        self.connection_kwargs.setdefault('decode_responses', True)
+        self.connection_kwargs.setdefault('socket_timeout', 5)
+        
+        self.master_address = None
+        self.discoveries = 0
+        # Every failed write during an outage invalidates, so only the latest are kept
+        self.invalidations = deque(maxlen=INVALIDATION_HISTORY)
+        self.invalidation_count = 0
+        self._master_pool = None
+        self._replica_pools = []
+        self._replica_cycle = None
+        self._replicas_known = False
+        self._lock = threading.Lock()
+        
+        self.watcher = None
+        if watch_events:
+            self.watcher = SentinelEventWatcher(sentinel_hosts, master_name, channels=['+switch-master'])
+            self.watcher.on('+switch-master', self._on_switch_master)
+            self.watcher.start()
+    
+    def _new_pool(self, address):
+        """Connection pool for one (host, port)"""
+        host, port = address
+        return redis.ConnectionPool(host=host, port=port, max_connections=self.max_connections,
+                                    **self.connection_kwargs)
+    
+    def _discover(self):
+        """Ask sentinel for the current topology and build pools (caller holds the lock)"""
+        self.master_address = self.address_map(*self.sentinel.discover_master(self.master_name))
+        self._master_pool = self._new_pool(self.master_address)
+        self._replica_pools = [
+            self._new_pool(self.address_map(*replica))
+            for replica in self.sentinel.discover_slaves(self.master_name)
+        ]
+        self._replica_cycle = itertools.cycle(self._replica_pools) if self._replica_pools else None
+        self._replicas_known = True
+        self.discoveries += 1
+    
+    def _drop_pools(self):
+        """Disconnect every pooled connection (caller holds the lock)"""
+        for pool in [self._master_pool] + self._replica_pools:
+            if pool is not None:
+                pool.disconnect()
+        self._master_pool = None
+        self._replica_pools = []
+        self._replica_cycle = None
+        self._replicas_known = False
+    
+    def master(self):
+        """Client for the current master, discovering it only when nothing is cached"""
+        with self._lock:
+            if self._master_pool is None:
+                self._discover()
+            return redis.Redis(connection_pool=self._master_pool)
+    
+    def replica(self):
+        """Client for the next replica (round robin), falls back to the master"""
+        with self._lock:
+            # A +switch-master rebuild only knows the new master, replicas need a discovery
+            if self._master_pool is None or not self._replicas_known:
+                self._discover()
+            if self._replica_cycle is None:
+                return redis.Redis(connection_pool=self._master_pool)
+            return redis.Redis(connection_pool=next(self._replica_cycle))
+    
+    def invalidate(self, reason):
+        """Forget the cached topology, the next master()/replica() call rediscovers it"""
+        with self._lock:
+            self._record_invalidation(reason)
+            self._drop_pools()
+            self.master_address = None
+    
+    def _record_invalidation(self, reason):
+        """Remember when and why the cached topology was dropped"""
+        self.invalidation_count += 1
+        self.invalidations.append({
+            'timestamp': datetime.now().strftime('%H:%M:%S.%f')[:-3],
+            'perf_ns': time.perf_counter_ns(),
+            'reason': reason
+        })
+    
+    def _on_switch_master(self, event):
+        """+switch-master names the new master, so the pool is rebuilt without discovery"""
+        if not event['for_master']:
+            return
+        _, _, _, new_ip, new_port = event['data'].split()
+        new_address = self.address_map(new_ip, int(new_port))
+        with self._lock:
+            # Every sentinel announces the switch, only the first one rebuilds
+            if new_address == self.master_address:
+                return
+            self._record_invalidation(f"+switch-master from {event['sentinel']}")
+            self._drop_pools()
+            self.master_address = new_address
+            self._master_pool = self._new_pool(self.master_address)
+    
+    def execute(self, operation, retries=1):
+        """Run operation(master_client), invalidating and retrying on failover errors"""
+        for attempt in range(retries + 1):
+            try:
+                return operation(self.master())
+            except FAILOVER_ERRORS as e:
+                self.invalidate(f"{type(e).__name__}: {e}")
+                if attempt == retries:
+                    raise
+    
+    def close(self):
+        """Stop the event watcher and disconnect all pools"""
+        if self.watcher:
+            self.watcher.stop()
+        with self._lock:
+            self._drop_pools()
+    
+    def stats(self):
+        """JSON-friendly counters of how often the topology had to be resolved"""
+        return {
+            'master': f"{self.master_address[0]}:{self.master_address[1]}" if self.master_address else None,
+            'discoveries': self.discoveries,
+            'invalidation_count': self.invalidation_count,
+            'invalidations': [
+                {key: value for key, value in entry.items() if key != 'perf_ns'}
+                for entry in self.invalidations
+            ]
+        }
@@ -0,0 +1,158 @@
+"""
+Live slot -> node map for Redis Cluster
+Built from CLUSTER SHARDS (Redis 7+) with a CLUSTER SLOTS fallback, stored as
+an array indexed by slot so lookups are O(1) and can be vectorized.
+"""
+
+import time
+import numpy as np
+import redis
+from redis.exceptions import AskError, MovedError, ResponseError
+
+TOTAL_SLOTS = 16384
+
+def _pairs_to_dict(value):
+    """CLUSTER SHARDS replies are flat [key, value, ...] lists unless already parsed"""
+    if isinstance(value, dict):
+        return value
+    return {value[i]: value[i + 1] for i in range(0, len(value), 2)}
+
+def parse_redirect(error):
+    """Return ('MOVED'|'ASK', slot, host, port) for a redirection error, else None"""
+    if isinstance(error, MovedError):
+        return 'MOVED', error.slot_id, error.host, error.port
+    if isinstance(error, AskError):
+        return 'ASK', error.slot_id, error.host, error.port
+    
+    # Plain ResponseError text, e.g. "MOVED 3999 127.0.0.1:6381"
+    parts = str(error).split()
+    if len(parts) == 3 and parts[0] in ('MOVED', 'ASK'):
+        host, port = parts[2].rsplit(':', 1)
+        return parts[0], int(parts[1]), host, int(port)
+    return None
+
+class SlotMap:
+    """Array-backed slot ownership cache with incremental MOVED updates"""
+    
+    def __init__(self):
+        self.owners = np.full(TOTAL_SLOTS, -1, dtype=np.int16)
+        self.masters = []  # node index -> "host:port"
+        self.replicas = {}  # master "host:port" -> ["host:port", ...]
+        self.source = None
+        self.refreshed_at = None
+        self.moved_updates = 0
+    
+    def node_index(self, name):
+        """Index of a node in self.masters, registering it if unseen"""
+        try:
+            return self.masters.index(name)
+        except ValueError:
+            self.masters.append(name)
+            return len(self.masters) - 1
+    
+    def refresh(self, seeds):
+        """Rebuild the map from the first reachable seed node ({'host', 'port'} dicts)"""
+        last_error = None
+        for seed in seeds:
+            client = redis.Redis(host=seed['host'], port=seed['port'], decode_responses=True, socket_timeout=10)
+            try:
+                try:
+                    self._load_shards(client.execute_command('CLUSTER', 'SHARDS'))
+                    self.source = 'CLUSTER SHARDS'
+                except ResponseError:
+                    # Redis < 7.0 has no CLUSTER SHARDS
+                    self._load_slots(client.execute_command('CLUSTER', 'SLOTS'))
+                    self.source = 'CLUSTER SLOTS'
+                self.refreshed_at = time.time()
+                return self
+            except Exception as e:
+                last_error = e
+            finally:
+                client.close()
+        raise ConnectionError(f"Could not load slot map from any seed: {last_error}")
+    
+    def _reset(self):
+        """Forget all ownership before a full reload"""
+        self.owners[:] = -1
+        self.masters = []
+        self.replicas = {}
+    
+    def _load_shards(self, shards):
+        """Load ownership and replicas from a CLUSTER SHARDS reply"""
+        self._reset()
+        for shard in shards:
+            shard = _pairs_to_dict(shard)
+            nodes = [_pairs_to_dict(node) for node in shard['nodes']]
+            master = next((node for node in nodes if node.get('role') == 'master'), None)
+            if master is None:
+                continue
+            
+            name = self._node_name(master)
+            index = self.node_index(name)
+            self.replicas[name] = [
+                self._node_name(node) for node in nodes
+                if node.get('role') != 'master' and node.get('health', 'online') == 'online'
+            ]
+            
+            slots = shard['slots']
+            if slots and isinstance(slots[0], (list, tuple)):
+                slots = [bound for pair in slots for bound in pair]
+            for i in range(0, len(slots), 2):
+                self.owners[int(slots[i]):int(slots[i + 1]) + 1] = index
+    
+    def _load_slots(self, slot_ranges):
+        """Load ownership and replicas from a CLUSTER SLOTS reply"""
+        self._reset()
+        for entry in slot_ranges:
+            start, end, master = entry[0], entry[1], entry[2]
+            name = f"{master[0]}:{master[1]}"
+            index = self.node_index(name)
+            self.owners[int(start):int(end) + 1] = index
+            self.replicas.setdefault(name, [])
+            for replica in entry[3:]:
+                replica_name = f"{replica[0]}:{replica[1]}"
+                if replica_name not in self.replicas[name]:
+                    self.replicas[name].append(replica_name)
+    
+    @staticmethod
+    def _node_name(node):
+        """Announced "host:port" of a CLUSTER SHARDS node entry"""
+        host = node.get('endpoint') or node.get('ip')
+        if host in (None, '', '?'):
+            host = node.get('ip')
+        return f"{host}:{node.get('port')}"
+    
+    def node_for_slot(self, slot):
+        """Master "host:port" currently owning slot, or None if uncovered"""
+        index = self.owners[slot]
+        return self.masters[index] if index >= 0 else None
+    
+    def nodes_for_slots(self, slots):
+        """Vectorized lookup: owner index for every slot in a NumPy array"""
+        return self.owners[np.asarray(slots)]
+    
+    def apply_moved(self, slot, host, port):
+        """Point a single slot at the node named in a MOVED reply"""
+        self.owners[slot] = self.node_index(f"{host}:{port}")
+        self.moved_updates += 1
+    
+    def slot_ranges(self):
+        """Contiguous (start, end, master) ranges derived from the owner array"""
+        ranges = []
+        boundaries = np.flatnonzero(np.diff(self.owners)) + 1
+        starts = np.concatenate(([0], boundaries))
+        ends = np.concatenate((boundaries - 1, [TOTAL_SLOTS - 1]))
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            index = self.owners[start]
+            ranges.append((start, end, self.masters[index] if index >= 0 else None))
+        return ranges
+    
+    def to_dict(self):
+        """JSON-friendly snapshot of the topology"""
+        return {
+            'source': self.source,
+            'refreshed_at': self.refreshed_at,
+            'moved_updates': self.moved_updates,
+            'ranges': [{'start': s, 'end': e, 'master': m} for s, e, m in self.slot_ranges()],
+            'replicas': self.replicas
+        }
@@ -0,0 +1,86 @@
+"""
+Array-backed per-key replica sync state
+For every key index and replica, stores how long after its batch was written
+the key was first seen synced (uint32 microseconds, capped at ~71 minutes).
+Batch write times are uint32 microsecond ticks that may wrap on long runs;
+only differences between them and the observation time are ever used. About
+4 bytes per key per replica, so 10M keys on two replicas fit in ~80 MB, and
+re-check passes only touch still-unsynced keys.
+"""
+
+import time
+import numpy as np
+
+UNSYNCED = np.iinfo(np.uint32).max  # Marker for "not observed synced yet" / "write not recorded yet"
+UNTIMED = UNSYNCED - 1  # Synced, but seen before its batch's write time was recorded
+MAX_DELAY_US = UNTIMED - 1  # Longer write-to-synced delays are stored as this
+TICK_MODULUS = 1 << 32
+
+class SyncStateStore:
+    """Write-to-synced delays indexed by (replica, key number)"""
+    
+    def __init__(self, num_keys, replica_names, batch_size=1):
+        self.num_keys = num_keys
+        self.replica_names = list(replica_names)
+        self.batch_size = batch_size
+        self.start_ns = time.perf_counter_ns()
+        self.synced_after_us = np.full((len(self.replica_names), num_keys), UNSYNCED, dtype=np.uint32)
+        # Keys in one batch share a write time, so only one entry per batch is kept
+        self.written_us = np.full(-(-num_keys // batch_size), UNSYNCED, dtype=np.uint32)
+    
+    def _now_us(self, t_ns=None):
+        """Microsecond tick since the store was created, wrapping at 2**32"""
+        return ((t_ns or time.perf_counter_ns()) - self.start_ns) // 1000 % TICK_MODULUS
+    
+    def record_batch_written(self, batch_index, t_ns=None):
+        """Remember when the batch containing keys batch_index * batch_size... was acknowledged"""
+        # A tick that happens to equal the marker is shifted by 1 us
+        self.written_us[batch_index] = min(self._now_us(t_ns), UNSYNCED - 1)
+    
+    def mark_synced(self, replica_name, key_indexes, t_ns=None):
+        """Record key_indexes as synced on a replica, keeping earlier observations"""
+        row = self.synced_after_us[self.replica_names.index(replica_name)]
+        key_indexes = np.asarray(key_indexes, dtype=np.int64)
+        if not len(key_indexes):
+            return
+        key_indexes = key_indexes[row[key_indexes] == UNSYNCED]
+        written = self.written_us[key_indexes // self.batch_size].astype(np.int64)
+        # Modular difference stays correct across a tick wrap as long as the delay is below ~71 minutes
+        delay_us = np.minimum((self._now_us(t_ns) - written) % TICK_MODULUS, MAX_DELAY_US)
+        row[key_indexes] = np.where(written == UNSYNCED, UNTIMED, delay_us)
+    
+    def unsynced(self, replica_name):
+        """Key indexes not yet observed synced on a replica"""
+        return np.flatnonzero(self.synced_after_us[self.replica_names.index(replica_name)] == UNSYNCED)
+    
+    def synced_count(self, replica_name):
+        """Number of keys observed synced on a replica"""
+        return int(np.count_nonzero(self.synced_after_us[self.replica_names.index(replica_name)] != UNSYNCED))
+    
+    def convergence_ms(self, replica_name):
+        """Per-key time from batch write to first synced observation, timed synced keys only"""
+        row = self.synced_after_us[self.replica_names.index(replica_name)]
+        return row[row < UNTIMED] / 1000.0
+    
+    def summary(self):
+        """Synced/unsynced counts and convergence percentiles per replica"""
+        result = {}
+        for name in self.replica_names:
+            times = self.convergence_ms(name)
+            synced = self.synced_count(name)
+            stats = {'synced': synced, 'unsynced': self.num_keys - synced, 'untimed': synced - len(times)}
+            if len(times):
+                p50, p90, p99 = np.percentile(times, [50, 90, 99])
+                stats.update({
+                    'min_ms': float(times.min()),
+                    'p50_ms': float(p50),
+                    'p90_ms': float(p90),
+                    'p99_ms': float(p99),
+                    'max_ms': float(times.max())
+                })
+            result[name] = stats
+        return result
+    
+    def memory_bytes(self):
+        """Bytes held by the state arrays"""
+        return self.synced_after_us.nbytes + self.written_us.nbytes
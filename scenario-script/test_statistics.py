@@ -0,0 +1,61 @@
+"""
+Checks for the statistics in compare_results and the vectorized hash slots
+Run from scenario-script: python -m pytest test_statistics.py (or python -m unittest test_statistics)
+"""
+
+import math
+import unittest
+from compare_results import mann_whitney, median_ci
+from hash_slot import key_slots
+from scenario3_cluster_sharding import get_key_slot
+
+class MannWhitneyTest(unittest.TestCase):
+    def test_exact_distribution(self):
+        """No ties and small samples use the exact U distribution: P(U <= 8) = 53/252 for n = 5/5"""
+        u, p = mann_whitney([1, 2, 3, 7, 10], [4, 5, 6, 8, 9])
+        self.assertEqual(u, 8)
+        self.assertAlmostEqual(p, 2 * 53 / 252)
+        self.assertAlmostEqual(p, 0.421, places=3)
+    
+    def test_ties_use_normal_approximation(self):
+        """Ties take the tie-corrected normal approximation with continuity correction"""
+        u, p = mann_whitney([1, 2, 2, 3, 5], [2, 4, 5, 6, 7])
+        self.assertEqual(u, 4.5)  # ranks 1, 3, 3, 5, 7.5
+        # Tie groups of 3 and 2: sum(t^3 - t) = 24 + 6
+        variance = 5 * 5 / 12 * (11 - 30 / (10 * 9))
+        self.assertAlmostEqual(p, math.erfc((abs(4.5 - 12.5) - 0.5) / math.sqrt(variance) / math.sqrt(2)))
+    
+    def test_identical_samples(self):
+        """Every value equal gives no evidence of a difference"""
+        self.assertEqual(mann_whitney([3, 3, 3], [3, 3, 3])[1], 1.0)
+
+class MedianCITest(unittest.TestCase):
+    def test_ten_values(self):
+        """n = 10: [x(2), x(9)] is the narrowest interval with at least 95% coverage"""
+        low, high, coverage = median_ci(range(10))
+        self.assertEqual((low, high), (1, 8))
+        self.assertAlmostEqual(coverage, 1 - 2 * 11 / 1024)
+    
+    def test_too_few_runs(self):
+        """Below 95% reach the interval is min..max with the coverage it actually has"""
+        self.assertEqual(median_ci([5, 1, 3]), (1, 5, 0.75))
+        self.assertEqual(median_ci([4]), (4, 4, 0.0))
+
+class KeySlotsTest(unittest.TestCase):
+    def test_matches_get_key_slot(self):
+        """Vectorized slots equal the scalar ones, hash tags and multi-byte keys included"""
+        keys = [f"key{i}" for i in range(2000)] + [
+            '', '{', '{}', '{}x', 'a{}{b}', '{user1000}.following', '{user1000}.followers',
+            'foo{bar}{zap}', 'x{', 'ключ', '{ключ}1', 'key😀'
+        ]
+        expected = [get_key_slot(key) for key in keys]
+        self.assertEqual(key_slots(keys).tolist(), expected)
+        self.assertEqual(key_slots(iter(keys), chunk_size=7).tolist(), expected)
+    
+    def test_known_slots(self):
+        """CRC16 check value from the cluster spec, and a hash tag hashing its content only"""
+        self.assertEqual(key_slots(['123456789']).tolist(), [0x31C3])
+        self.assertEqual(key_slots(['{user1000}.following']).tolist(), key_slots(['user1000']).tolist())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,250 @@
+"""
+Skewed key workloads for Redis Cluster
+Generates uniform, Zipfian, hotspot and hash-tag-clustered key streams with
+a read/write mix, then analyses where they land: per-slot and per-node load,
+hot slots, imbalance, and the throughput ceiling the hottest shard imposes.
+"""
+
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import redis
+from hash_slot import key_slots, TOTAL_SLOTS
+from latency_histogram import LatencyHistogram
+from payload import DEFAULT_VALUE_SIZE, PayloadGenerator
+
+DISTRIBUTIONS = ('uniform', 'zipf', 'hotspot', 'hashtag')
+ZIPF_EXPONENT = 0.99  # Same default as YCSB
+HOT_KEY_FRACTION = 0.01  # hotspot: this fraction of the keys...
+HOT_OP_FRACTION = 0.9  # ...receives this fraction of the operations
+HASHTAG_GROUPS = 100  # hashtag: keys are spread over {groupN} tags, groups are picked Zipfian
+HOT_SLOT_FACTOR = 10.0  # A slot is hot when it gets this many times the mean load of the used slots
+WORKLOAD_BATCH_SIZE = 100  # Commands per node pipeline when running a workload
+WORKLOAD_VALUE_SIZE = DEFAULT_VALUE_SIZE  # Bytes per SET value
+KEY_PREFIX = 'skew_key'
+
+class Workload:
+    """A generated operation stream: key number and read/write flag per operation"""
+    
+    def __init__(self, distribution, key_names, key_ids, is_read, seed):
+        self.distribution = distribution
+        self.key_names = key_names  # key number -> key name
+        self.key_ids = key_ids  # operation -> key number
+        self.is_read = is_read  # operation -> True for GET, False for SET
+        self.seed = seed
+        self.key_slots = key_slots(key_names)  # key number -> hash slot
+    
+    @property
+    def slots(self):
+        """Hash slot of every operation"""
+        return self.key_slots[self.key_ids]
+    
+    def __len__(self):
+        return len(self.key_ids)
+
+def zipf_ranks(num_items, num_ops, exponent=ZIPF_EXPONENT, rng=None):
+    """Draw num_ops ranks in [0, num_items) with P(rank) proportional to 1 / (rank + 1) ** exponent"""
+    rng = rng or np.random.default_rng()
+    weights = 1.0 / np.arange(1, num_items + 1) ** exponent
+    cdf = np.cumsum(weights)
+    cdf /= cdf[-1]
+    return np.minimum(np.searchsorted(cdf, rng.random(num_ops)), num_items - 1)
+
+def generate_workload(distribution, num_keys, num_ops, read_ratio=0.5, seed=0):
+    """Build a Workload of num_ops operations over num_keys keys"""
+    if distribution not in DISTRIBUTIONS:
+        raise ValueError(f"Unknown distribution {distribution!r}, expected one of {DISTRIBUTIONS}")
+    rng = np.random.default_rng(seed)
+    key_names = [f"{KEY_PREFIX}{i}" for i in range(num_keys)]
+    
+    if distribution == 'uniform':
+        key_ids = rng.integers(0, num_keys, num_ops)
+    elif distribution == 'zipf':
+        # Popularity ranks are shuffled over key numbers so hot keys are not key0, key1, ...
+        key_ids = rng.permutation(num_keys)[zipf_ranks(num_keys, num_ops, rng=rng)]
+    elif distribution == 'hotspot':
+        hot_keys = rng.choice(num_keys, max(1, int(num_keys * HOT_KEY_FRACTION)), replace=False)
+        cold = rng.integers(0, num_keys, num_ops)
+        hot = hot_keys[rng.integers(0, len(hot_keys), num_ops)]
+        key_ids = np.where(rng.random(num_ops) < HOT_OP_FRACTION, hot, cold)
+    else:
+        # Key i belongs to group i % groups, every key of a group hashes to the same slot
+        groups = min(HASHTAG_GROUPS, num_keys)
+        key_names = [f"{{group{i % groups}}}:{KEY_PREFIX}{i}" for i in range(num_keys)]
+        group_ids = rng.permutation(groups)[zipf_ranks(groups, num_ops, rng=rng)]
+        members = -(-(num_keys - group_ids) // groups)  # keys in each chosen group
+        key_ids = group_ids + groups * (rng.random(num_ops) * members).astype(np.int64)
+    
+    is_read = rng.random(num_ops) < read_ratio
+    return Workload(distribution, key_names, key_ids.astype(np.int64), is_read, seed)
+
+def slot_load(workload):
+    """Operations per hash slot as a TOTAL_SLOTS-long array"""
+    return np.bincount(workload.slots, minlength=TOTAL_SLOTS)
+
+def slot_counts(slot_distribution):
+    """TOTAL_SLOTS-long count array from a {slot: count} dict (scenario3's write distribution)"""
+    counts = np.zeros(TOTAL_SLOTS, dtype=np.int64)
+    if slot_distribution:
+        counts[np.fromiter(slot_distribution.keys(), dtype=np.int64)] = list(slot_distribution.values())
+    return counts
+
+def top_slots(counts, top_n=10):
+    """[(slot, count)] of the busiest slots, ties in slot order"""
+    used = np.flatnonzero(counts)
+    top = used[np.argsort(-counts[used], kind='stable')[:top_n]]
+    return [(int(slot), int(counts[slot])) for slot in top]
+
+def node_load(counts, slot_map):
+    """Count per owning master from a slot count array, None for slots without an owner"""
+    loads = defaultdict(int)
+    used = np.flatnonzero(counts)
+    for slot, owner in zip(used.tolist(), slot_map.nodes_for_slots(used).tolist()):
+        loads[slot_map.masters[owner] if owner >= 0 else None] += int(counts[slot])
+    return dict(loads)
+
+def load_report(workload, slot_map, top_n=10, node_stats=None):
+    """Where the workload lands: hot slots, per-node share and imbalance
+    
+    With node_stats from run_workload(), also the throughput ceiling: each
+    node serves ops at its measured rate, so the cluster saturates when the
+    node with the worst rate/share ratio does, usually the hottest shard.
+    """
+    counts = slot_load(workload)
+    total = int(counts.sum())
+    used = np.flatnonzero(counts)
+    mean_used = counts[used].mean() if len(used) else 0.0
+    
+    busiest = [
+        {'slot': slot, 'count': count, 'share': count / total, 'node': slot_map.node_for_slot(slot)}
+        for slot, count in top_slots(counts, top_n)
+    ]
+    hot = used[counts[used] > HOT_SLOT_FACTOR * mean_used]
+    
+    node_ops = node_load(counts, slot_map)
+    shares = {node: ops / total for node, ops in node_ops.items()}
+    mean_ops = total / len(slot_map.masters) if slot_map.masters else 0.0
+    hottest = max(node_ops, key=node_ops.get) if node_ops else None
+    
+    report = {
+        'distribution': workload.distribution,
+        'operations': total,
+        'unique_keys': int(len(np.unique(workload.key_ids))),
+        'unique_slots': int(len(used)),
+        'top_slots': busiest,
+        'top_slots_share': sum(entry['share'] for entry in busiest),
+        'hot_slot_factor': HOT_SLOT_FACTOR,
+        'hot_slots': [int(slot) for slot in hot[np.argsort(-counts[hot], kind='stable')]],
+        'hot_slots_share': counts[hot].sum() / total if total else 0.0,
+        'node_ops': dict(node_ops),
+        'node_share': shares,
+        'hottest_node': hottest,
+        # max / mean node load: 1.0 is perfectly balanced, N means one node does N times its fair share
+        'imbalance': node_ops[hottest] / mean_ops if hottest and mean_ops else 0.0
+    }
+    
+    if node_stats:
+        limits = {
+            node: stats['ops_per_sec'] / shares[node]
+            for node, stats in node_stats.items() if shares.get(node) and stats['ops_per_sec']
+        }
+        if limits:
+            bottleneck = min(limits, key=limits.get)
+            report['ceiling_ops_per_sec'] = limits[bottleneck]
+            report['bottleneck_node'] = bottleneck
+            # Same nodes with the load split evenly: the slowest node's rate times the node count
+            report['balanced_ops_per_sec'] = min(
+                stats['ops_per_sec'] for stats in node_stats.values() if stats['ops_per_sec']
+            ) * len(node_stats)
+    return report
+
+def run_workload(workload, slot_map, batch_size=WORKLOAD_BATCH_SIZE):
+    """Replay the workload with one pipelined stream per owning master, return per-node stats
+    
+    Commands are grouped by the master owning their slot and each master is
+    driven by its own thread, so every node's rate is measured independently
+    of the others. Redirects are counted as errors, the slot map is not updated.
+    Ops on slots the map has no owner for are not sent and count as errors.
+    """
+    owners = slot_map.nodes_for_slots(workload.slots).tolist()
+    per_node = defaultdict(list)
+    unrouted = 0
+    for op, owner in enumerate(owners):
+        if owner < 0:
+            unrouted += 1
+            continue
+        per_node[slot_map.masters[owner]].append(op)
+    
+    def drive(name):
+        host, port = name.rsplit(':', 1)
+        client = redis.Redis(host=host, port=int(port), decode_responses=True, socket_timeout=30)
+        ops = per_node[name]
+        latency = LatencyHistogram()
+        # Each pipeline is sent before its buffers come round again
+        payload = PayloadGenerator(WORKLOAD_VALUE_SIZE, ring=batch_size)
+        errors = 0
+        start = time.perf_counter()
+        try:
+            for chunk_start in range(0, len(ops), batch_size):
+                pipe = client.pipeline(transaction=False)
+                for op in ops[chunk_start:chunk_start + batch_size]:
+                    key = workload.key_names[workload.key_ids[op]]
+                    if workload.is_read[op]:
+                        pipe.get(key)
+                    else:
+                        pipe.set(key, payload.buffer(op))
+                op_start = time.perf_counter_ns()
+                try:
+                    replies = pipe.execute(raise_on_error=False)
+                except Exception:
+                    errors += len(ops[chunk_start:chunk_start + batch_size])
+                    continue
+                latency.record_ns(time.perf_counter_ns() - op_start)
+                errors += sum(1 for reply in replies if isinstance(reply, Exception))
+        finally:
+            client.close()
+        duration = time.perf_counter() - start
+        return name, {
+            'ops': len(ops),
+            'reads': int(np.count_nonzero(workload.is_read[ops])) if ops else 0,
+            'errors': errors,
+            'duration': duration,
+            'ops_per_sec': len(ops) / duration if duration else 0.0,
+            'latency': latency.summary()
+        }
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, len(per_node))) as executor:
+        node_stats = dict(executor.map(drive, list(per_node)))
+    wall = time.perf_counter() - start
+    sent = len(workload) - unrouted
+    return node_stats, {'duration': wall, 'ops_per_sec': sent / wall if wall else 0.0, 'unrouted_errors': unrouted}
+
+def print_load_report(report, node_stats=None, run=None):
+    """Print the hot slot / imbalance report"""
+    print(f"Distribution: {report['distribution']}, {report['operations']} ops over "
+          f"{report['unique_keys']} keys in {report['unique_slots']} slots")
+    
+    print(f"\nTop {len(report['top_slots'])} slots by operations ({report['top_slots_share']:.1%} of all ops):")
+    for entry in report['top_slots']:
+        print(f"  Slot {entry['slot']:5d}: {entry['count']:7d} ops ({entry['share']:6.2%}) → {entry['node']}")
+    print(f"Hot slots (> {report['hot_slot_factor']:.0f}x mean): {len(report['hot_slots'])}, "
+          f"{report['hot_slots_share']:.1%} of all ops")
+    
+    print("\nPer-node load:")
+    for node, ops in sorted(report['node_ops'].items(), key=lambda item: str(item[0])):
+        line = f"  {node}: {ops:7d} ops ({report['node_share'][node]:6.2%})"
+        if node_stats and node in node_stats:
+            stats = node_stats[node]
+            line += f", {stats['ops_per_sec']:.0f} ops/sec, {stats['errors']} errors"
+        print(line + ("  ← hottest" if node == report['hottest_node'] else ''))
+    print(f"Load imbalance (max/mean): {report['imbalance']:.2f}x")
+    
+    if run:
+        print(f"\nMeasured: {run['ops_per_sec']:.0f} ops/sec over {run['duration']:.2f}s")
+        if run.get('unrouted_errors'):
+            print(f"  {run['unrouted_errors']} ops skipped: their slots have no owner in the slot map")
+    if 'ceiling_ops_per_sec' in report:
+        print(f"Throughput ceiling from {report['bottleneck_node']}: {report['ceiling_ops_per_sec']:.0f} ops/sec "
+              f"(balanced load on the same nodes: {report['balanced_ops_per_sec']:.0f} ops/sec)")